@@ -0,0 +1,69 @@
+"""
+Backtest offline: reproduce un log histórico de sesiones (CSV o Parquet) con una o varias
+configuraciones de clustering y scoring y guarda la distribución de scores de cada una.
+
+    python -m backtest sessions.parquet --config configs.json --output backtest.json
+    python -m backtest sessions.csv --grouped --train-fraction 0.7 --workers 8
+
+--config usa el mismo formato que GEOVELOCITY_TENANT_CONFIG: "default" y cada entrada de
+"tenants" son configuraciones a comparar (cada tenant hereda de "default" lo que no defina).
+"""
+import argparse
+import json
+
+from src.services.backtest_service import BacktestRunner
+from src.utils.session_log_reader import DEFAULT_COLUMNS
+from src.utils.tenant_registry import TenantRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Log de sesiones (.csv, .parquet)")
+    parser.add_argument("--config", help="JSON con las configuraciones a evaluar (sin él, solo la configuración por defecto)")
+    parser.add_argument("--output", default="backtest_results.json")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Formato del log (por defecto, según la extensión)")
+    parser.add_argument("--grouped", action="store_true",
+                        help="Las sesiones de cada usuario están contiguas en el log: no hace falta particionar")
+    parser.add_argument("--train-fraction", type=float, default=0.5,
+                        help="Fracción inicial del historial de cada usuario usada para derivar las zonas (1 = in-sample)")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Filas por bloque de lectura")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, la cantidad de CPUs)")
+    parser.add_argument("--partitions", type=int, default=None)
+    parser.add_argument("--bins", type=int, default=100, help="Intervalos del histograma de scores")
+    parser.add_argument("--tmp-dir", default=None, help="Directorio para las particiones temporales")
+    for key, default in DEFAULT_COLUMNS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}-column", default=default, dest=f"{key}_column")
+    args = parser.parse_args()
+
+    try:
+        configs = TenantRegistry(args.config).stats()["tenants"]
+        runner = BacktestRunner(configs, max_workers=args.workers, chunk_size=args.chunk_size,
+                                train_fraction=args.train_fraction, bins=args.bins,
+                                partitions=args.partitions, tmp_dir=args.tmp_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    columns = {key: getattr(args, f"{key}_column") for key in DEFAULT_COLUMNS}
+    try:
+        result = runner.run(args.input, fmt=args.format, columns=columns, grouped=args.grouped)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    metrics = result["metrics"]
+    print(f"{metrics['rows']} sesiones en {metrics['elapsed_s']} s ({metrics['rows_per_s']:.0f}/s, "
+          f"{metrics['workers']} workers, modo {result['mode']})")
+    for name, summary in result["configs"].items():
+        score = summary["score"]
+        quantiles = score["quantiles"]
+        shown = " ".join(f"{q}={v:.3f}" for q, v in quantiles.items() if q in ("p05", "p50", "p95") and v is not None)
+        mean = f"{score['mean']:.3f}" if score["mean"] is not None else "-"
+        print(f"{name}: usuarios={summary['users']} sesiones={summary['sessions_scored']} "
+              f"en_zona={summary['zone_match_rate']:.1%} media={mean} {shown}")
+    print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark del modo de entrada grande de GeoClusterAnalyzer contra DBSCAN directo.
+
+Cada caso corre en un proceso aparte para medir su pico de memoria (RSS) de forma aislada.
+
+Uso:
+    python -m benchmarks.bench_cluster_large
+    python -m benchmarks.bench_cluster_large --sizes 10000 100000 --eps-km 5 --max-direct 100000
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_coords
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+
+
+def _run_case(mode: str, n: int, eps_km: float, min_samples: int, queue):
+    coords_rad = np.radians(synthetic_coords(n))
+    threshold = None if mode == "direct" else 1
+    analyzer = GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples, large_input_threshold=threshold)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    labels = analyzer.fit_labels_radians(coords_rad)
+    elapsed = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put({
+        "mode": mode,
+        "points": n,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(rss_peak / 1024, 1),  # ru_maxrss está en KB en Linux
+        "rss_growth_mb": round((rss_peak - rss_before) / 1024, 1),
+        "clusters": int(labels.max() + 1),
+        "labels_checksum": int(np.sum(labels * (np.arange(len(labels)) % 7919)))
+    })
+
+
+def run_case(mode: str, n: int, eps_km: float, min_samples: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(mode, n, eps_km, min_samples, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"mode": mode, "points": n, "error": f"exit code {process.exitcode}"}
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--eps-km", type=float, default=5)
+    parser.add_argument("--min-samples", type=int, default=3)
+    parser.add_argument("--max-direct", type=int, default=1_000_000,
+                        help="no ejecutar DBSCAN directo por encima de esta cantidad de puntos")
+    parser.add_argument("--output", help="ruta de un archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        modes = ["large"] + (["direct"] if n <= args.max_direct else [])
+        case = {mode: run_case(mode, n, args.eps_km, args.min_samples) for mode in modes}
+        if "direct" in case and "error" not in case["direct"] and "error" not in case["large"]:
+            case["labels_match"] = case["direct"]["labels_checksum"] == case["large"]["labels_checksum"]
+            case["speedup"] = round(case["direct"]["seconds"] / max(case["large"]["seconds"], 1e-9), 2)
+        results.append(case)
+        print(json.dumps(case))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"eps_km": args.eps_km, "min_samples": args.min_samples, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Micro-benchmarks de GeoMetricsUtils, GeoClusterAnalyzer y GeoScoringEvaluator.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from benchmarks.harness import measure
+from benchmarks.synthetic import synthetic_sessions, synthetic_session_outputs, synthetic_zones
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+
+
+def _result(name: str, params: Dict, timing: Dict) -> Dict:
+    return {"name": name, "group": "micro", "params": params, "metrics": timing}
+
+
+def bench_metrics(quick: bool = False) -> List[Dict]:
+    results = []
+    results.append(_result(
+        "haversine_distance_km", {},
+        measure(lambda: GeoMetricsUtils.haversine_distance_km(-34.6037, -58.3816, 40.4168, -3.7038))
+    ))
+
+    s1 = {"user_id": 1, "session_id": 1, "datetime": datetime(2025, 1, 1, 12), "latitude": -34.6, "longitude": -58.4}
+    s2 = {"user_id": 1, "session_id": 2, "datetime": datetime(2025, 1, 1, 15), "latitude": 40.4, "longitude": -3.7}
+    results.append(_result("compare_sessions", {}, measure(lambda: GeoMetricsUtils.compare_sessions(s1, s2))))
+
+    for n in ([1_000] if quick else [1_000, 100_000]):
+        sessions = synthetic_sessions(n)
+        timestamps = np.array([s["datetime"] for s in sessions], dtype="datetime64[us]")
+        lats = np.array([s["latitude"] for s in sessions])
+        lons = np.array([s["longitude"] for s in sessions])
+        results.append(_result(
+            f"compare_session_arrays[n={n}]", {"sessions": n},
+            measure(lambda: GeoMetricsUtils.compare_session_arrays(timestamps, lats, lons), repeat=3)
+        ))
+    return results
+
+
+def bench_clustering(quick: bool = False) -> List[Dict]:
+    results = []
+    sizes = [100, 1_000] if quick else [100, 1_000, 10_000]
+    eps_values = [1, 20] if quick else [1, 5, 20, 50]
+    for n in sizes:
+        sessions = synthetic_sessions(n, n_places=max(4, n // 100))
+        for eps_km in eps_values:
+            analyzer = GeoClusterAnalyzer(eps_km=eps_km, min_samples=3)
+            results.append(_result(
+                f"analyze_sessions[n={n},eps_km={eps_km}]", {"sessions": n, "eps_km": eps_km},
+                measure(lambda: analyzer.analyze_sessions(sessions), repeat=3, min_time_s=0.02)
+            ))
+    return results
+
+
+def bench_scoring(quick: bool = False) -> List[Dict]:
+    results = []
+    evaluator = GeoScoringEvaluator()
+    early_exit = GeoScoringEvaluator(early_exit=True)
+    lookup = GeoScoringEvaluator(early_exit=True, lookup_cell_km=0.1)
+    outputs = synthetic_session_outputs(50)
+    sessions = [
+        {"lat": o["lat_new"], "lon": o["lon_new"], "velocity_kmh": o["velocity_kmh"],
+         "time_diff_hour": o["time_diff_hour"], "distance_km": o["distance_km"]}
+        for o in outputs
+    ]
+    zone_counts = [10, 100] if quick else [10, 100, 1_000, 10_000]
+    vertex_counts = [8, 64] if quick else [8, 64, 512]
+    for n_zones in zone_counts:
+        for n_vertices in vertex_counts:
+            zones = [
+                {"zone_id": z["zone_id"], "geometry": Polygon(z["polygon"]), "metrics": z["metrics"]}
+                for z in synthetic_zones(n_zones, n_vertices)
+            ]
+            zone_set = evaluator.prepare_zones(zones)
+            params = {"zones": n_zones, "vertices": n_vertices, "sessions_per_call": len(sessions)}
+            # El recorrido lineal sobre miles de zonas tarda minutos y no aporta a la comparación
+            if n_zones <= 1_000:
+                results.append(_result(
+                    f"evaluate_session.linear[zones={n_zones},vertices={n_vertices}]", params,
+                    measure(lambda: [evaluator.evaluate_session(s, zones) for s in sessions], repeat=3, min_time_s=0.02)
+                ))
+            results.append(_result(
+                f"evaluate_session.indexed[zones={n_zones},vertices={n_vertices}]", params,
+                measure(lambda: [evaluator.evaluate_session(s, zone_set) for s in sessions], repeat=3, min_time_s=0.02)
+            ))
+            results.append(_result(
+                f"evaluate_session.early_exit[zones={n_zones},vertices={n_vertices}]", params,
+                measure(lambda: [early_exit.evaluate_session(s, zone_set) for s in sessions], repeat=3, min_time_s=0.02)
+            ))
+            # La tabla se construye fuera de la medición; el error se mide contra el modo exacto
+            if n_zones <= 1_000:
+                table = lookup.lookup_table(zone_set)
+                timing = measure(lambda: [lookup.evaluate_session(s, zone_set) for s in sessions], repeat=3,
+                                 min_time_s=0.02)
+                exact = np.array([early_exit.evaluate_session(s, zone_set)["score"] for s in sessions])
+                approx = np.array([lookup.evaluate_session(s, zone_set)["score"] for s in sessions])
+                results.append(_result(
+                    f"evaluate_session.lookup[zones={n_zones},vertices={n_vertices}]",
+                    {**params, "cell_km": table.cell_km},
+                    {**timing, "max_score_error": float(np.abs(exact - approx).max()),
+                     "score_error_bound": table.max_geo_error * lookup.w_geo,
+                     "table_bytes": table.nbytes, "table_build_s": table.build_s}
+                ))
+    return results
+
+
+def run(quick: bool = False) -> List[Dict]:
+    return bench_metrics(quick) + bench_clustering(quick) + bench_scoring(quick)
@@ -0,0 +1,113 @@
+"""
+Utilidades comunes de los benchmarks: medición de tiempos, resultados en JSON y chequeo de regresiones.
+"""
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Métricas donde un valor más alto es mejor; en el resto (tiempos, latencias) más bajo es mejor
+HIGHER_IS_BETTER = {"requests_per_s", "ops_per_s"}
+# Los máximos son demasiado ruidosos para usarlos como criterio de regresión
+IGNORED_METRICS = {"max_s"}
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, number: Optional[int] = None,
+            min_time_s: float = 0.05) -> Dict[str, float]:
+    """
+    Mide fn() al estilo timeit: cada repetición ejecuta fn number veces y se reporta el tiempo
+    por llamada. Si number es None se calibra para que cada repetición dure al menos min_time_s.
+    """
+    fn()  # calentamiento
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= min_time_s or number >= 1_000_000:
+                break
+            number *= 2
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+
+    return {
+        "median_s": statistics.median(per_call),
+        "min_s": min(per_call),
+        "max_s": max(per_call),
+        "calls_per_repeat": number,
+        "repeat": repeat
+    }
+
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    values = np.asarray(latencies_s)
+    return {
+        "count": int(len(values)),
+        "p50_s": float(np.percentile(values, 50)),
+        "p95_s": float(np.percentile(values, 95)),
+        "p99_s": float(np.percentile(values, 99)),
+        "max_s": float(values.max())
+    }
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def write_results(path: str, results: List[Dict]):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+
+def load_results(path: str) -> List[Dict]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare_to_baseline(results: List[Dict], baseline: List[Dict], tolerance: float = 0.2) -> List[Dict]:
+    """
+    Compara cada métrica contra el baseline (mismo "name") y retorna las que empeoraron más que tolerance.
+    Los benchmarks que no están en ambos lados se ignoran.
+    """
+    previous = {r["name"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get(result["name"])
+        if base is None:
+            continue
+        for metric, value in result["metrics"].items():
+            old = base["metrics"].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            if metric in IGNORED_METRICS:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = value < old * (1 - tolerance)
+            elif metric.endswith("_s"):
+                worse = value > old * (1 + tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append({
+                    "name": result["name"],
+                    "metric": metric,
+                    "baseline": old,
+                    "current": value,
+                    "ratio": value / old
+                })
+    return regressions
@@ -0,0 +1,133 @@
+"""
+Prueba de carga en proceso de la app FastAPI (main.py) con sesiones sintéticas.
+Las requests pasan por todo el stack ASGI (validación, endpoints, executors) sin red de por medio.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.harness import latency_summary
+from benchmarks.synthetic import synthetic_sessions, synthetic_session_outputs, synthetic_zones
+
+
+def _session_payload(session: Dict) -> Dict:
+    return {**session, "datetime": session["datetime"].isoformat()}
+
+
+def _build_workload(n_requests: int, n_users: int, seed: int = 0) -> List[tuple]:
+    """
+    Lista de (endpoint, método, ruta, kwargs) mezclando los endpoints en proporciones parecidas
+    a producción: la mayoría son compare-last y score-val, el clustering completo es ocasional.
+    """
+    rng = np.random.default_rng(seed)
+    per_user = max(1, n_requests // n_users)
+    histories = {u: synthetic_sessions(per_user, user_id=u, seed=seed + u) for u in range(1, n_users + 1)}
+    cursors = defaultdict(int)
+    zones = synthetic_zones(50, 16, seed)
+    outputs = synthetic_session_outputs(max(n_requests, 100), seed)
+
+    def next_session(user_id):
+        history = histories[user_id]
+        session = history[cursors[user_id] % len(history)]
+        cursors[user_id] += 1
+        return session
+
+    mix = [
+        ("velocity/compare-last", 0.35),
+        ("geo/score-val", 0.25),
+        ("geo/score-batch", 0.05),
+        ("velocity/compare-all", 0.05),
+        ("cluster/categorize-session", 0.15),
+        ("zones/session", 0.1),
+        ("cluster/categorize", 0.05)
+    ]
+    names = [m[0] for m in mix]
+    weights = np.array([m[1] for m in mix])
+    choices = rng.choice(len(names), size=n_requests, p=weights / weights.sum())
+
+    workload = []
+    for i, choice in enumerate(choices):
+        name = names[choice]
+        user_id = int(rng.integers(1, n_users + 1))
+        if name == "velocity/compare-last":
+            req = ("POST", "/velocity/compare-last", {"json": _session_payload(next_session(user_id))})
+        elif name == "geo/score-val":
+            req = ("POST", "/geo/score-val", {"json": {"session": outputs[i], "zones": zones, "zone_set_id": "bench"}})
+        elif name == "geo/score-batch":
+            req = ("POST", "/geo/score-batch", {"json": {"sessions": outputs[:100], "zones": zones, "zone_set_id": "bench"}})
+        elif name == "velocity/compare-all":
+            req = ("POST", "/velocity/compare-all", {"json": {"sessions": [_session_payload(s) for s in histories[user_id][:50]]}})
+        elif name == "cluster/categorize-session":
+            s = next_session(user_id)
+            req = ("POST", "/cluster/categorize-session", {"json": {
+                "user_id": user_id, "session_id": s["session_id"], "latitude": s["latitude"], "longitude": s["longitude"]
+            }})
+        elif name == "zones/session":
+            req = ("POST", "/zones/session", {"json": _session_payload(next_session(user_id))})
+        else:
+            req = ("POST", "/cluster/categorize", {"params": {"user_id": user_id}})
+        workload.append((name,) + req)
+    return workload
+
+
+async def _run(workload: List[tuple], concurrency: int) -> Dict:
+    from main import app
+
+    latencies = defaultdict(list)
+    status_counts = defaultdict(lambda: defaultdict(int))
+    queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+
+    async def worker(client):
+        while True:
+            try:
+                name, method, path, kwargs = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies[name].append(time.perf_counter() - start)
+            status_counts[name][str(response.status_code)] += 1
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            # Calentamiento: importaciones perezosas, pools de procesos y caches de zonas
+            for name, method, path, kwargs in workload[:min(20, len(workload))]:
+                await client.request(method, path, **kwargs)
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return {"elapsed_s": elapsed, "latencies": latencies, "status_counts": status_counts}
+
+
+def run(n_requests: int = 2_000, concurrency: int = 32, n_users: int = 50, seed: int = 0) -> List[Dict]:
+    workload = _build_workload(n_requests, n_users, seed)
+    outcome = asyncio.run(_run(workload, concurrency))
+    params = {"requests": n_requests, "concurrency": concurrency, "users": n_users}
+
+    results = [{
+        "name": "load.all",
+        "group": "load",
+        "params": params,
+        "metrics": {
+            "elapsed_s": outcome["elapsed_s"],
+            "requests_per_s": len(workload) / outcome["elapsed_s"],
+            **latency_summary([l for ls in outcome["latencies"].values() for l in ls])
+        }
+    }]
+    for name in sorted(outcome["latencies"]):
+        results.append({
+            "name": f"load.{name}",
+            "group": "load",
+            "params": params,
+            "metrics": latency_summary(outcome["latencies"][name]),
+            "status_counts": dict(outcome["status_counts"][name])
+        })
+    return results
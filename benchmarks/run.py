@@ -0,0 +1,64 @@
+"""
+Ejecuta la suite de benchmarks, guarda los resultados en JSON y compara contra un baseline.
+
+    python -m benchmarks.run --output results.json --baseline benchmarks/baseline.json
+    python -m benchmarks.run --quick --save-baseline benchmarks/baseline.json
+
+Se ejecuta como módulo desde la raíz del repositorio. No hay un baseline versionado (los tiempos
+dependen de la máquina): se genera una vez con --save-baseline en la máquina donde se va a comparar.
+Sale con código 1 si alguna métrica empeora más que --tolerance respecto del baseline.
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import bench_micro, load_test
+from benchmarks.harness import compare_to_baseline, load_results, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior contra el cual comparar")
+    parser.add_argument("--save-baseline", help="Además de --output, guarda los resultados como baseline en esta ruta")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo tolerado (0.2 = 20%%)")
+    parser.add_argument("--quick", action="store_true", help="Tamaños reducidos, útil en CI")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--requests", type=int, default=None, help="Requests de la prueba de carga")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    # Se valida antes de correr la suite, que puede tardar varios minutos
+    if args.baseline and not os.path.isfile(args.baseline):
+        parser.error(f"baseline {args.baseline} does not exist; create it first on this machine with "
+                     f"--save-baseline {args.baseline}")
+
+    results = []
+    if not args.skip_micro:
+        results += bench_micro.run(quick=args.quick)
+    if not args.skip_load:
+        n_requests = args.requests or (300 if args.quick else 2_000)
+        results += load_test.run(n_requests=n_requests, concurrency=args.concurrency)
+
+    for r in results:
+        shown = {k: round(v, 6) if isinstance(v, float) else v for k, v in r["metrics"].items()}
+        print(r["name"], json.dumps(shown))
+
+    write_results(args.output, results)
+    if args.save_baseline:
+        write_results(args.save_baseline, results)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, load_results(args.baseline), args.tolerance)
+        for reg in regressions:
+            print(f"REGRESIÓN {reg['name']} {reg['metric']}: {reg['baseline']:.6g} -> {reg['current']:.6g} "
+                  f"(x{reg['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"Sin regresiones respecto de {args.baseline} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
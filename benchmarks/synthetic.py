@@ -0,0 +1,89 @@
+"""
+Generadores de datos sintéticos para los benchmarks.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+
+def synthetic_coords(n: int, n_sites: int = 5000, jitter_ratio: float = 0.2, seed: int = 0) -> np.ndarray:
+    """
+    Coordenadas [lat, lon] en grados que imitan logins reales: la mayoría cae exactamente sobre
+    un conjunto acotado de ubicaciones (geolocalización por IP) y una fracción tiene ruido GPS.
+    """
+    rng = np.random.default_rng(seed)
+    sites = np.column_stack([rng.uniform(-55, 10, n_sites), rng.uniform(-80, -35, n_sites)])
+    coords = sites[rng.zipf(1.5, n) % n_sites]
+    jittered = rng.random(n) < jitter_ratio
+    coords[jittered] += rng.normal(0, 0.02, (int(jittered.sum()), 2))
+    return coords
+
+
+def synthetic_sessions(n: int, user_id: int = 1, n_places: int = 4, seed: int = 0) -> List[Dict]:
+    """
+    Historial de un usuario ordenado por tiempo: logins alrededor de unos pocos lugares habituales
+    y algún login esporádico lejano.
+    """
+    rng = np.random.default_rng(seed)
+    places = np.column_stack([rng.uniform(-35, -30, n_places), rng.uniform(-65, -57, n_places)])
+    moment = datetime(2025, 1, 1)
+    sessions = []
+    for i in range(n):
+        if rng.random() < 0.95:
+            lat, lon = places[rng.integers(0, n_places)] + rng.normal(0, 0.02, 2)
+        else:
+            lat, lon = rng.uniform(-55, 10), rng.uniform(-80, -35)
+        moment += timedelta(hours=float(rng.exponential(8)))
+        sessions.append({
+            "user_id": user_id,
+            "session_id": i,
+            "datetime": moment,
+            "latitude": float(lat),
+            "longitude": float(lon)
+        })
+    return sessions
+
+
+def synthetic_zones(n_zones: int, n_vertices: int = 16, seed: int = 0) -> List[Dict]:
+    """
+    Zonas con el formato de FrecuentsZone: polígonos regulares de n_vertices vértices
+    repartidos alrededor de Buenos Aires.
+    """
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    zones = []
+    for zone_id in range(n_zones):
+        lat, lon = rng.uniform(-35.0, -34.2), rng.uniform(-58.9, -58.0)
+        radius = rng.uniform(0.002, 0.02)
+        ring = np.column_stack([lon + radius * np.cos(angles), lat + radius * np.sin(angles)])
+        ring = np.vstack([ring, ring[:1]])
+        zones.append({
+            "zone_id": zone_id,
+            "polygon": ring.tolist(),
+            "metrics": {
+                "velocity_mean_kmh": float(rng.uniform(1, 60)),
+                "time_mean_hour": float(rng.uniform(0.5, 12)),
+                "distance_mean_km": float(rng.uniform(0.5, 30))
+            }
+        })
+    return zones
+
+
+def synthetic_session_outputs(n: int, seed: int = 0) -> List[Dict]:
+    """
+    Sesiones con el formato de SessionOutput en la misma región que synthetic_zones.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "from_id": i,
+            "to_id": i + 1,
+            "lat_new": float(rng.uniform(-35.1, -34.1)),
+            "lon_new": float(rng.uniform(-59.0, -57.9)),
+            "velocity_kmh": float(rng.uniform(0, 80)),
+            "time_diff_hour": float(rng.uniform(0, 24)),
+            "distance_km": float(rng.uniform(0, 40))
+        }
+        for i in range(n)
+    ]
@@ -0,0 +1,68 @@
+"""
+Reclasificación nocturna: corre DBSCAN sobre el historial completo de cada usuario guardado en
+GEOVELOCITY_HISTORY_DIR, repartiendo los usuarios en un pool de procesos, y escribe un resultado
+por usuario en NDJSON.
+
+    python -m cluster_batch --history-dir /data/history --output clusters.ndjson
+    python -m cluster_batch --tenant acme --timeout-s 30 --workers 8
+
+Solo ve las sesiones ya volcadas a disco (no las pendientes en memoria de la API).
+Sale con código 1 si algún usuario terminó con error o timeout.
+"""
+import argparse
+import json
+import os
+import sys
+
+from src.services.cluster_batch_service import ClusterBatchRunner
+from src.utils.session_history_store import SessionHistoryStore
+from src.utils.tenant_registry import TenantRegistry
+
+
+def user_groups(store, user_ids):
+    for user_id in user_ids:
+        history = store.get(user_id)
+        if len(history):
+            yield user_id, {"session_id": history.session_id, "latitude": history.latitude,
+                            "longitude": history.longitude}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-dir", default=os.environ.get("GEOVELOCITY_HISTORY_DIR"),
+                        help="Directorio del historial (por defecto, GEOVELOCITY_HISTORY_DIR)")
+    parser.add_argument("--output", default="cluster_results.ndjson")
+    parser.add_argument("--config", default=os.environ.get("GEOVELOCITY_TENANT_CONFIG"),
+                        help="Configuración de tenants (por defecto, GEOVELOCITY_TENANT_CONFIG)")
+    parser.add_argument("--tenant", default=None, help="Tenant cuyos eps_km/min_samples se usan (por defecto, default)")
+    parser.add_argument("--users", type=int, nargs="*", help="Solo estos usuarios")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, la cantidad de CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Usuarios por tarea")
+    parser.add_argument("--timeout-s", type=float, default=None, help="Tiempo máximo de clustering por usuario")
+    args = parser.parse_args()
+
+    if not args.history_dir or not os.path.isdir(args.history_dir):
+        parser.error("--history-dir (or GEOVELOCITY_HISTORY_DIR) must point to an existing history directory")
+    try:
+        profile = TenantRegistry(args.config).get(args.tenant)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    store = SessionHistoryStore(args.history_dir)
+    user_ids = args.users if args.users else store.users().tolist()
+    runner = ClusterBatchRunner(eps_km=profile.eps_km, min_samples=profile.min_samples, max_workers=args.workers,
+                                chunk_size=args.chunk_size, timeout_s=args.timeout_s)
+
+    with open(args.output, "w") as f:
+        for result in runner.run(user_groups(store, user_ids)):
+            f.write(json.dumps(result, separators=(",", ":")) + "\n")
+
+    metrics = runner.metrics()
+    print(json.dumps(metrics))
+    print(f"Resultados en {args.output}")
+    if metrics["failed"] or metrics["timed_out"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
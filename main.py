@@ -1,47 +1,296 @@
-from fastapi import FastAPI, HTTPException
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
 from src.models.schemas import *
-from src.services.velocity_service import compare_with_last_session
-from src.services.cluster_service import categorize_clusters
-from src.services.scoring_service import evaluate_session
+from src.services.velocity_service import compare_with_last_session_async, compare_all_sessions, compare_session_columns, last_session_store, stream_compare_sessions, check_impossible_travel, travel_detector
+from src.services.history_service import compare_user_history
+from src.services.zone_service import update_zones, get_user_zones
+from src.services.cluster_service import categorize_clusters_cached, categorize_new_session, cluster_result_cache
+from src.services.user_state_service import user_states
+from src.services.risk_service import assess_session
+from src.services.scoring_service import evaluate_session, evaluate_sessions, evaluate_session_columns, lookup_table_stats, zone_set_cache
+from src.services.executors import ExecutorBusy, cluster_executor, compute_executor, shutdown_executors
+from src.services.warmup import prewarm, warmup_report
+from src.services.tenant_service import tenant_registry
+from src.services.instrumentation import TimedRoute, render_metrics, slow_request_profiler
+from src.services.negotiation import BINARY_FORMATS, JSON, binary_body, binary_response, columns_to_rows, decode_body, negotiate, parse_json, rows_to_columns
+from src.utils.stage_metrics import stage_metrics
+from src.utils.ndjson_stream import DuplexStreamingResponse
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # scikit-learn y Shapely se importan en el primer uso; con GEOVELOCITY_PREWARM=1 se cargan acá
+    if os.environ.get("GEOVELOCITY_PREWARM") == "1":
+        await prewarm()
+    yield
+    shutdown_executors()
+
+app = FastAPI(lifespan=lifespan)
+# Cada ruta mide validación, handler y serialización por separado (ver /metrics)
+app.router.route_class = TimedRoute
+
+def busy_error(e: ExecutorBusy):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
 
 @app.get("/health")
-def basic_health_check():
+async def basic_health_check():
     return {
         "status": "ok",
         "message": "API funcionando"
     }
 
+@app.get("/health/executors")
+async def executors_health_check():
+    return {
+        "status": "ok",
+        "result": {
+            "cluster": cluster_executor.stats(),
+            "compute": compute_executor.stats()
+        }
+    }
+
+@app.get("/health/warmup")
+async def warmup_health_check():
+    return {"status": "ok", "result": warmup_report}
+
+@app.get("/config/tenants")
+async def tenant_config():
+    return {"status": "ok", "result": tenant_registry.stats()}
+
+# Fuerza la recarga del archivo de configuración sin esperar al chequeo periódico
+@app.post("/config/reload")
+async def tenant_config_reload():
+    if not tenant_registry.reload():
+        raise HTTPException(status_code=400, detail=tenant_registry.last_error)
+    return {"status": "ok", "result": tenant_registry.stats()}
+
+# Formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics((cluster_executor, compute_executor)),
+                             media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/summary")
+async def metrics_summary():
+    return {"status": "ok", "result": stage_metrics.summary()}
+
+@app.get("/metrics/profiles")
+async def metrics_profiles():
+    return {
+        "status": "ok",
+        "result": {
+            "profiler": slow_request_profiler.stats(),
+            "profiles": slow_request_profiler.profiles()
+        }
+    }
+
+# Endpoint liviano: con el almacén en memoria corre directo en el event loop; con SQLite, en el pool de threads
 @app.post("/velocity/compare-last")
-def velocity_endpoint(new_session: SessionInput):
+async def velocity_endpoint(new_session: SessionInput):
+    try:
+        result = await compare_with_last_session_async(new_session)
+        if result is None:
+            return {"status": "ok", "message": "No previous session for user", "result": None}
+        return {"status": "ok", "message": "Comparison successful", "result": result}
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Compara contra toda la ventana reciente del usuario; también corre en el event loop
+@app.post("/velocity/impossible-travel")
+async def impossible_travel_endpoint(new_session: SessionInput):
+    try:
+        result = check_impossible_travel(new_session)
+        return {"status": "ok", "message": "Impossible travel check successful", "result": result}
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/velocity/travel-stats")
+async def impossible_travel_stats():
+    return {"status": "ok", "result": travel_detector.stats()}
+
+@app.get("/velocity/store-stats")
+async def velocity_store_stats():
+    return {"status": "ok", "result": last_session_store.stats()}
+
+# Cuerpo NDJSON (un SessionInput por línea); responde una línea por sesión y un resumen al final
+@app.post("/velocity/stream")
+async def velocity_stream_endpoint(request: Request):
+    return DuplexStreamingResponse(stream_compare_sessions(request.stream()), media_type="application/x-ndjson")
+
+# Acepta JSON, msgpack o Arrow (Content-Type) y responde en el formato pedido en Accept o en el de la request
+@app.post("/velocity/compare-all", openapi_extra=binary_body(SessionListInput))
+async def velocity_all_endpoint(request: Request):
+    request_fmt, response_fmt = negotiate(request)
+    body = await request.body()
     try:
-        result = compare_with_last_session(new_session)
+        if request_fmt == JSON:
+            payload = parse_json(SessionListInput, body)
+            result = await compute_executor.run(compare_all_sessions, payload.sessions)
+            if response_fmt in BINARY_FORMATS:
+                return binary_response(rows_to_columns(result), response_fmt, status="ok")
+        else:
+            tables, _ = decode_body(body, request_fmt, ("sessions",))
+            result = await compute_executor.run(compare_session_columns, tables["sessions"])
+            if response_fmt in BINARY_FORMATS:
+                return binary_response(result, response_fmt, status="ok")
+            result = columns_to_rows(result)
         return {"status": "ok", "message": "Comparison successful", "result": result}
+    except (HTTPException, RequestValidationError):
+        raise
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/velocity/history/{user_id}")
+async def velocity_history_endpoint(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    try:
+        result = await compute_executor.run(compare_user_history, user_id, start, end)
+        return {"status": "ok", "message": "Comparison successful", "result": result}
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Sin body: el formato de la respuesta sale solo de Accept
 @app.post("/cluster/categorize")
-def cluster_endpoint(user_id: int):
+async def cluster_endpoint(request: Request, user_id: int, tenant_id: Optional[str] = None):
+    _, response_fmt = negotiate(request)
+    try:
+        result = await categorize_clusters_cached(user_id, tenant_id)
+        if response_fmt in BINARY_FORMATS:
+            return binary_response(rows_to_columns(result), response_fmt, status="ok")
+        return {
+            "status": "ok",
+            "message": "Clustering successful",
+            "result": result
+        }
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cluster/cache-stats")
+async def cluster_cache_stats():
+    return {"status": "ok", "result": {**cluster_result_cache.stats(), "incremental_states": user_states.stats()}}
+
+# El estado incremental vive en este proceso, así que usa el pool de threads
+@app.post("/cluster/categorize-session")
+async def cluster_session_endpoint(session: ClusterSessionInput):
     try:
-        print(user_id)
-        result = categorize_clusters(user_id)
+        result = await compute_executor.run(categorize_new_session, session)
         return {
             "status": "ok",
             "message": "Clustering successful",
             "result": result
         }
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/zones/session")
+async def zones_session_endpoint(session: SessionInput, tenant_id: Optional[str] = None):
+    try:
+        result = await compute_executor.run(update_zones, session, tenant_id)
+        return {"status": "ok", "message": "Zones updated", "result": result}
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/zones/{user_id}")
+async def zones_endpoint(user_id: int, tenant_id: Optional[str] = None):
+    try:
+        result = await compute_executor.run(get_user_zones, user_id, tenant_id)
+        return {"status": "ok", "message": "Zones derived", "result": result}
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/geo/score-val")
-def scoring_endpoint(payload: ScoreRequest):
+async def scoring_endpoint(payload: ScoreRequest):
     try:
-        result = evaluate_session(payload.session, payload.zones)
+        result = await compute_executor.run(evaluate_session, payload.session, payload.zones, payload.zone_set_id,
+                                            payload.tenant_id)
         return result
+    except ExecutorBusy as e:
+        raise busy_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# En binario van dos tablas: "sessions" y "zones" (ver README); zone_set_id y tenant_id como escalares
+@app.post("/geo/score-batch", openapi_extra=binary_body(BatchScoreRequest))
+async def batch_scoring_endpoint(request: Request):
+    request_fmt, response_fmt = negotiate(request)
+    body = await request.body()
+    try:
+        if request_fmt == JSON:
+            payload = parse_json(BatchScoreRequest, body)
+            result = await compute_executor.run(evaluate_sessions, payload.sessions, payload.zones,
+                                                payload.zone_set_id, payload.tenant_id)
+            if response_fmt in BINARY_FORMATS:
+                result["zone_val"] = [-1 if z is None else z for z in result["zone_val"]]
+        else:
+            tables, meta = decode_body(body, request_fmt, ("sessions", "zones"))
+            result = await compute_executor.run(evaluate_session_columns, tables["sessions"], tables["zones"],
+                                                meta.get("zone_set_id"), meta.get("tenant_id"))
+            if response_fmt == JSON:
+                zone_val = result["zone_val"].tolist()
+                result = {k: v.tolist() for k, v in result.items()}
+                result["zone_val"] = [None if z < 0 else z for z in zone_val]
+        if response_fmt in BINARY_FORMATS:
+            return binary_response(result, response_fmt)
+        return result
+    except (HTTPException, RequestValidationError):
+        raise
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Velocidad, clustering incremental y scoring de un login en una sola request
+@app.post("/risk/assess")
+async def risk_assess_endpoint(payload: RiskAssessRequest):
+    try:
+        result = await assess_session(payload.session, payload.zones, payload.zone_set_id, payload.tenant_id)
+        return {"status": "ok", "message": "Risk assessment successful", "result": result}
+    except ExecutorBusy as e:
+        raise busy_error(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/geo/zone-cache-stats")
+async def zone_cache_stats():
+    return {"status": "ok", "result": zone_set_cache.stats()}
+
+@app.get("/geo/lookup-stats")
+async def lookup_stats():
+    return {"status": "ok", "result": lookup_table_stats()}
+
 
 if __name__ == "__main__":
     import uvicorn
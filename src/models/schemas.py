@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 class MetricsZone(BaseModel):
     velocity_mean_kmh: float
@@ -30,4 +30,28 @@ class SessionOutput(BaseModel):
 
 class ScoreRequest(BaseModel):
     session: SessionOutput
-    zones: List[FrecuentsZone]
\ No newline at end of file
+    zones: List[FrecuentsZone]
+    zone_set_id: Optional[str] = None
+    tenant_id: Optional[str] = None
+
+class SessionListInput(BaseModel):
+    sessions: List[SessionInput]
+
+class BatchScoreRequest(BaseModel):
+    sessions: List[SessionOutput]
+    zones: List[FrecuentsZone]
+    zone_set_id: Optional[str] = None
+    tenant_id: Optional[str] = None
+
+class ClusterSessionInput(BaseModel):
+    user_id: int
+    session_id: int
+    latitude: float
+    longitude: float
+    tenant_id: Optional[str] = None
+
+class RiskAssessRequest(BaseModel):
+    session: SessionInput
+    zones: Optional[List[FrecuentsZone]] = None
+    zone_set_id: Optional[str] = None
+    tenant_id: Optional[str] = None
@@ -0,0 +1,341 @@
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from src.utils.cluster_categories import category_counts
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+from src.utils.geo_zone_builder import GeoZoneBuilder
+from src.utils.geo_zone_index import PreparedZoneSet
+from src.utils.session_log_reader import RECORD, estimate_rows, log_format, read_session_chunks
+from src.utils.tenant_registry import build_profile
+
+QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+class BacktestStats:
+    def __init__(self, upper: float = 1.0, bins: int = 100):
+        """
+        Resultados acumulados de una configuración. El score se guarda como histograma de `bins`
+        intervalos iguales en [0, upper], así que los resultados de distintos workers se suman
+        sin guardar los scores y los cuantiles tienen la resolución de un intervalo.
+        """
+        self.upper = upper
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.sessions = 0
+        self.score_sum = 0.0
+        self.score_min = math.inf
+        self.score_max = -math.inf
+        self.zone_matches = 0
+        self.users = 0
+        self.users_with_zones = 0
+        self.zones = 0
+        self.categories = {"principal": 0, "secundario": 0, "ruido": 0}
+
+    def add_user(self, scores: np.ndarray, zone_match: np.ndarray, n_zones: int, categories: Dict[str, int]):
+        self.users += 1
+        self.zones += n_zones
+        self.users_with_zones += n_zones > 0
+        for category, count in categories.items():
+            self.categories[category] += count
+        if len(scores) == 0:
+            return
+        # Los scores iguales o mayores que upper van al último intervalo
+        index = np.minimum((np.maximum(scores, 0) / self.upper * self.bins).astype(np.int64), self.bins - 1)
+        self.counts += np.bincount(index, minlength=self.bins)
+        self.sessions += len(scores)
+        self.score_sum += float(scores.sum())
+        self.score_min = min(self.score_min, float(scores.min()))
+        self.score_max = max(self.score_max, float(scores.max()))
+        self.zone_matches += int(zone_match.sum())
+
+    def merge(self, other: "BacktestStats"):
+        self.counts += other.counts
+        self.sessions += other.sessions
+        self.score_sum += other.score_sum
+        self.score_min = min(self.score_min, other.score_min)
+        self.score_max = max(self.score_max, other.score_max)
+        self.zone_matches += other.zone_matches
+        self.users += other.users
+        self.users_with_zones += other.users_with_zones
+        self.zones += other.zones
+        for category, count in other.categories.items():
+            self.categories[category] += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Interpolación lineal dentro del intervalo donde cae el cuantil
+        if self.sessions == 0:
+            return None
+        cumulative = np.cumsum(self.counts)
+        target = q * self.sessions
+        i = int(np.searchsorted(cumulative, target))
+        i = min(i, self.bins - 1)
+        before = cumulative[i - 1] if i else 0
+        fraction = (target - before) / self.counts[i] if self.counts[i] else 0.0
+        width = self.upper / self.bins
+        return float(min(self.score_max, max(self.score_min, (i + fraction) * width)))
+
+    def summary(self) -> Dict:
+        edges = np.linspace(0, self.upper, self.bins + 1)
+        return {
+            "users": self.users,
+            "users_with_zones": self.users_with_zones,
+            "zones": self.zones,
+            "clusters": dict(self.categories),
+            "sessions_scored": self.sessions,
+            "zone_match_rate": self.zone_matches / self.sessions if self.sessions else 0.0,
+            "score": {
+                "mean": self.score_sum / self.sessions if self.sessions else None,
+                "min": self.score_min if self.sessions else None,
+                "max": self.score_max if self.sessions else None,
+                "quantiles": {f"p{round(q * 100):02d}": self.quantile(q) for q in QUANTILES},
+                "histogram": {"edges": [round(e, 6) for e in edges.tolist()], "counts": self.counts.tolist()}
+            }
+        }
+
+
+def _score_upper(config: Dict) -> float:
+    # Cota del score: la suma de los pesos (cada componente está entre 0 y 1)
+    return max(1.0, float(sum(config["scoring"]["weights"].values())))
+
+
+def _backtest_block(configs: Tuple[Tuple[str, Dict], ...], train_fraction: float, bins: int,
+                    records: np.ndarray) -> Dict[str, BacktestStats]:
+    # Corre en el proceso worker: cada usuario del bloque se evalúa con todas las configuraciones
+    profiles = [build_profile(name, config) for name, config in configs]
+    stats = {p.tenant_id: BacktestStats(_score_upper(p.config), bins) for p in profiles}
+    # Las configuraciones con los mismos parámetros de clustering comparten clustering y zonas
+    cluster_groups: Dict[Tuple[float, int], List] = {}
+    for p in profiles:
+        cluster_groups.setdefault((p.eps_km, p.min_samples), []).append(p)
+    builder = GeoZoneBuilder(buffer_km=0.5)
+
+    records = records[np.lexsort((records["ts"], records["user"]))]
+    seconds = records["ts"] / 1e6
+    lat, lon = records["lat"], records["lon"]
+    coords_rad = np.radians(np.column_stack([lat, lon]))
+    bounds = np.flatnonzero(np.diff(records["user"])) + 1
+    starts, stops = np.concatenate([[0], bounds]), np.concatenate([bounds, [len(records)]])
+
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        n = stop - start
+        s, la, lo = seconds[start:stop], lat[start:stop], lon[start:stop]
+        pairs = GeoMetricsUtils.compare_session_arrays(s, la, lo)
+        # La primera sesión del usuario no tiene sesión anterior
+        velocity = np.concatenate([[np.nan], pairs["velocity_kmh"]])
+        hours = np.concatenate([[np.nan], pairs["time_diff_hour"]])
+        distance = np.concatenate([[np.nan], pairs["distance_km"]])
+
+        # Zonas con las primeras sesiones y scoring de las siguientes; con train_fraction = 1 se
+        # evalúan las mismas sesiones con las que se derivaron las zonas
+        train = n if train_fraction >= 1 else int(math.ceil(n * train_fraction))
+        test = slice(0, n) if train_fraction >= 1 else slice(train, n)
+
+        for members in cluster_groups.values():
+            try:
+                labels = members[0].analyzer.fit_labels_radians(coords_rad[start:start + train])
+            except ValueError:
+                # Historial demasiado corto para clusterizar: todas las sesiones quedan como ruido
+                labels = np.full(train, -1, dtype=np.int64)
+            categories = category_counts(labels)
+            zones = builder.build_zones(s[:train], la[:train], lo[:train], labels)
+            zone_set = PreparedZoneSet(zones) if zones else None
+
+            for p in members:
+                if zone_set is None:
+                    scores = np.zeros(len(la[test]))
+                    zone_match = np.zeros(len(scores), dtype=bool)
+                else:
+                    result = p.evaluator.evaluate_sessions(la[test], lo[test], velocity[test], hours[test],
+                                                           distance[test], zone_set)
+                    scores, zone_match = result["score"], result["zone_match"]
+                stats[p.tenant_id].add_user(scores, zone_match, len(zones), categories)
+    return stats
+
+
+def _backtest_partition(configs, train_fraction, bins, path) -> Dict[str, BacktestStats]:
+    # La partición se borra apenas se lee: el disco temporal se libera a medida que avanza la corrida
+    records = np.fromfile(path, dtype=RECORD)
+    os.remove(path)
+    return _backtest_block(configs, train_fraction, bins, records)
+
+
+class BacktestRunner:
+    def __init__(self, configs: Dict[str, Dict], max_workers: int = None, chunk_size: int = 200_000,
+                 train_fraction: float = 0.5, bins: int = 100, partitions: int = None,
+                 max_pending_chunks: int = None, tmp_dir: str = None):
+        """
+        Reproduce un log histórico de sesiones fuera de la API y evalúa varias configuraciones
+        (mismo formato que los perfiles de tenant_registry) en una sola pasada sobre los datos.
+        Por usuario, la velocidad se calcula una vez, el clustering y las zonas una vez por cada
+        combinación distinta de eps_km/min_samples y el scoring una vez por configuración.
+        :param configs: {nombre: configuración completa con "cluster" y "scoring"}.
+        :param max_workers: cantidad de procesos (por defecto, la cantidad de CPUs).
+        :param chunk_size: filas leídas por bloque; acota la memoria del lector y, salvo usuarios
+            con más sesiones que eso, la de cada tarea.
+        :param train_fraction: fracción inicial del historial de cada usuario usada para derivar las
+            zonas; el resto se evalúa contra ellas (1 = evaluar el mismo historial).
+        :param bins: intervalos del histograma de scores.
+        :param partitions: particiones por usuario para logs no agrupados (por defecto, filas
+            estimadas / chunk_size y al menos una por worker).
+        :param max_pending_chunks: tareas en vuelo como máximo (por defecto, 2 por worker).
+        :param tmp_dir: directorio para las particiones temporales.
+        """
+        if not 0 < train_fraction <= 1:
+            raise ValueError("train_fraction must be in (0, 1]")
+        if chunk_size < 1 or bins < 1:
+            raise ValueError("chunk_size and bins must be positive")
+        # Se validan acá para fallar antes de leer el log y no en cada worker
+        for name, config in configs.items():
+            build_profile(name, config)
+        self.configs = tuple(configs.items())
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.train_fraction = train_fraction
+        self.bins = bins
+        self.partitions = partitions
+        self.max_pending_chunks = max_pending_chunks or 2 * self.max_workers
+        self.tmp_dir = tmp_dir
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self.rows = 0
+        self.tasks = 0
+        self._start = None
+        self._read_end = None
+        self._end = None
+
+    def _counted(self, chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        for chunk in chunks:
+            self.rows += len(chunk)
+            yield chunk
+        self._read_end = time.perf_counter()
+
+    def _grouped_blocks(self, chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        # Log con las sesiones de cada usuario contiguas: se corta cada bloque en el último cambio de
+        # usuario y las sesiones del último usuario pasan al bloque siguiente. Si un usuario reaparece
+        # después de otro, el log no está agrupado y el resultado sería incorrecto: se corta con error
+        carry = np.empty(0, dtype=RECORD)
+        emitted = set()
+
+        def checked(block):
+            users = block["user"][np.r_[0, np.flatnonzero(np.diff(block["user"])) + 1]].tolist()
+            if len(set(users)) != len(users) or not emitted.isdisjoint(users):
+                raise ValueError("The log is not grouped by user (a user's sessions are not contiguous); "
+                                 "run without --grouped")
+            emitted.update(users)
+            return block
+
+        for chunk in chunks:
+            block = np.concatenate([carry, chunk]) if len(carry) else chunk
+            changes = np.flatnonzero(np.diff(block["user"])) + 1
+            if len(changes) == 0:
+                carry = block
+                continue
+            cut = changes[-1]
+            carry = block[cut:]
+            yield checked(block[:cut])
+        if len(carry):
+            yield checked(carry)
+
+    def _partition(self, chunks: Iterable[np.ndarray], directory: str, n_partitions: int) -> List[str]:
+        # Reparte las sesiones en archivos por hash de usuario: cada usuario queda completo en una
+        # sola partición y cada partición se procesa después por separado
+        paths = [os.path.join(directory, f"part-{i:05d}.bin") for i in range(n_partitions)]
+        for chunk in chunks:
+            part = (chunk["user"] % n_partitions).astype(np.int64)
+            order = np.argsort(part, kind="stable")
+            part, chunk = part[order], chunk[order]
+            bounds = np.searchsorted(part, np.arange(n_partitions + 1))
+            for i in np.flatnonzero(np.diff(bounds)).tolist():
+                with open(paths[i], "ab") as f:
+                    f.write(chunk[bounds[i]:bounds[i + 1]].tobytes())
+        return [p for p in paths if os.path.exists(p)]
+
+    def _execute(self, function, tasks: Iterable) -> Dict[str, BacktestStats]:
+        totals = {name: None for name, _ in self.configs}
+        tasks = iter(tasks)
+        pending = set()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.max_pending_chunks:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(function, self.configs, self.train_fraction, self.bins, task))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.tasks += 1
+                    for name, stats in future.result().items():
+                        if totals[name] is None:
+                            totals[name] = stats
+                        else:
+                            totals[name].merge(stats)
+        return totals
+
+    def run(self, path: str, fmt: Optional[str] = None, columns: Optional[Dict[str, str]] = None,
+            grouped: bool = False) -> Dict:
+        """
+        Evalúa el log y devuelve la distribución de scores de cada configuración.
+        :param grouped: True si las sesiones de cada usuario están contiguas en el archivo (p. ej.
+            ordenado por usuario): los bloques se envían directo a los workers mientras se leen.
+            Si no, primero se particiona el log por usuario en tmp_dir y después se procesa cada partición.
+        """
+        self._reset_metrics()
+        self._start = time.perf_counter()
+        fmt = log_format(path, fmt)
+        chunks = self._counted(read_session_chunks(path, self.chunk_size, fmt, columns))
+
+        n_partitions = None
+        if grouped:
+            totals = self._execute(_backtest_block, self._grouped_blocks(chunks))
+        else:
+            n_partitions = self.partitions or max(self.max_workers,
+                                                  math.ceil(estimate_rows(path, fmt) / self.chunk_size))
+            directory = tempfile.mkdtemp(prefix="backtest-", dir=self.tmp_dir)
+            try:
+                paths = self._partition(chunks, directory, n_partitions)
+                totals = self._execute(_backtest_partition, paths)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        self._end = time.perf_counter()
+
+        return {
+            "input": path,
+            "format": fmt,
+            "mode": "grouped" if grouped else "partitioned",
+            "partitions": n_partitions,
+            "train_fraction": self.train_fraction,
+            "metrics": self.metrics(),
+            "configs": {
+                name: {"config": config, **(totals[name] or BacktestStats(_score_upper(config), self.bins)).summary()}
+                for name, config in self.configs
+            }
+        }
+
+    def metrics(self) -> Dict:
+        """
+        Métricas de throughput de la última ejecución (o de la actual, si sigue en curso).
+        """
+        if self._start is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._end or time.perf_counter()) - self._start
+        read = (self._read_end - self._start) if self._read_end else None
+        return {
+            "rows": self.rows,
+            "tasks": self.tasks,
+            "workers": self.max_workers,
+            "read_s": round(read, 3) if read is not None else None,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": self.rows / elapsed if elapsed else 0.0
+        }
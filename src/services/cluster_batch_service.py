@@ -0,0 +1,212 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from src.utils.cluster_categories import categorize_labels
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.services.warmup import warm_up_clustering
+
+
+def _to_arrays(sessions):
+    # Sesiones como arrays compactos: ids y coordenadas [lat, lon] en float64
+    if isinstance(sessions, dict):
+        session_ids = np.asarray(sessions["session_id"])
+        coords = np.column_stack([
+            np.asarray(sessions["latitude"], dtype=np.float64),
+            np.asarray(sessions["longitude"], dtype=np.float64)
+        ])
+    else:
+        session_ids = np.array([s["session_id"] for s in sessions])
+        coords = np.array([[s["latitude"], s["longitude"]] for s in sessions], dtype=np.float64)
+    return session_ids, coords.reshape(-1, 2)
+
+
+def _cluster_chunk(eps_km, min_samples, chunk):
+    # Corre en el proceso worker: clusteriza cada usuario del bloque por separado
+    analyzer = GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples)
+    results = []
+    for user_id, session_ids, coords in chunk:
+        try:
+            labels = analyzer.fit_labels_radians(np.radians(coords))
+            category = categorize_labels(labels)
+            results.append({
+                "user_id": user_id,
+                "status": "ok",
+                "sessions": len(labels),
+                "result": {
+                    "session_id": [str(s) for s in session_ids.tolist()],
+                    "cluster_id": labels.tolist(),
+                    "cluster_category": category.tolist()
+                }
+            })
+        except Exception as e:
+            results.append({"user_id": user_id, "status": "error", "sessions": len(coords), "error": str(e)})
+    return results
+
+
+class ClusterBatchRunner:
+    def __init__(self, eps_km: float = 20, min_samples: int = 3, max_workers: int = None,
+                 chunk_size: int = 32, timeout_s: float = None, max_pending_chunks: int = None):
+        """
+        Recategoriza muchos usuarios en paralelo repartiendo bloques de usuarios en un ProcessPoolExecutor.
+        :param eps_km, min_samples: parámetros de GeoClusterAnalyzer.
+        :param max_workers: cantidad de procesos (por defecto, la cantidad de CPUs).
+        :param chunk_size: usuarios por tarea enviada a un worker.
+        :param timeout_s: tiempo máximo de clustering por usuario, controlado desde este proceso (DBSCAN
+            corre en código nativo y no se puede interrumpir desde el worker). Un bloque que supera
+            timeout_s × usuarios se abandona terminando los procesos del pool; sus usuarios se
+            reintentan de a uno y el que vuelve a superar timeout_s queda como "timeout". Los demás
+            bloques que estaban en curso se reenvían completos. Con timeout_s hay como mucho un bloque
+            en vuelo por worker, para que el plazo mida ejecución y no espera en cola.
+        :param max_pending_chunks: bloques en vuelo como máximo; acota la memoria al consumir el stream.
+        """
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.timeout_s = timeout_s
+        self.max_pending_chunks = max_pending_chunks or 2 * self.max_workers
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self.users = 0
+        self.sessions = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.pool_restarts = 0
+        self._start = None
+        self._end = None
+
+    def _chunks(self, groups):
+        chunk = []
+        for user_id, sessions in groups:
+            session_ids, coords = _to_arrays(sessions)
+            chunk.append((user_id, session_ids, coords))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _new_executor(self):
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        if self.timeout_s is not None:
+            # El arranque de los procesos y la importación de scikit-learn no cuentan para el plazo
+            wait([executor.submit(warm_up_clustering) for _ in range(self.max_workers)])
+        return executor
+
+    @staticmethod
+    def _kill(executor):
+        # Una tarea en curso no se puede cancelar: se terminan los procesos del pool
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        for process in processes:
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.join()
+
+    def _timeout_result(self, user_id, session_ids):
+        return {"user_id": user_id, "status": "timeout", "sessions": len(session_ids),
+                "error": f"Clustering exceeded {self.timeout_s} s"}
+
+    def run(self, groups):
+        """
+        Procesa un iterable de (user_id, sessions) y devuelve los resultados a medida que terminan
+        (no en el orden de entrada). sessions puede ser una lista de dicts con 'session_id',
+        'latitude' y 'longitude', o un dict de columnas con esas mismas claves.
+        """
+        self._reset_metrics()
+        self._start = time.perf_counter()
+        chunks = self._chunks(groups)
+        retry = deque()  # bloques a reenviar antes de leer más del stream
+        pending = {}  # future -> (bloque, plazo)
+        max_in_flight = self.max_workers if self.timeout_s is not None else self.max_pending_chunks
+        executor = self._new_executor()
+
+        try:
+            exhausted = False
+            while pending or retry or not exhausted:
+                while len(pending) < max_in_flight:
+                    if retry:
+                        chunk = retry.popleft()
+                    elif not exhausted:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            exhausted = True
+                            continue
+                    else:
+                        break
+                    deadline = (time.monotonic() + self.timeout_s * len(chunk)
+                                if self.timeout_s is not None else None)
+                    pending[executor.submit(_cluster_chunk, self.eps_km, self.min_samples, chunk)] = (chunk, deadline)
+                if not pending:
+                    break
+
+                wait_s = None
+                if self.timeout_s is not None:
+                    wait_s = max(0.0, min(deadline for _, deadline in pending.values()) - time.monotonic())
+                done, _ = wait(pending, timeout=wait_s, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    for result in future.result():
+                        self._record(result)
+                        yield result
+
+                now = time.monotonic()
+                if not any(deadline is not None and deadline <= now for _, deadline in pending.values()):
+                    continue
+
+                # Algún bloque venció: se abandona el pool entero y se reparten sus bloques
+                finished = {future for future in pending if future.done()}
+                self._kill(executor)
+                executor = self._new_executor()
+                self.pool_restarts += 1
+                for future, (chunk, deadline) in pending.items():
+                    if future in finished:
+                        for result in future.result():
+                            self._record(result)
+                            yield result
+                    elif deadline > now:
+                        retry.append(chunk)
+                    elif len(chunk) > 1:
+                        retry.extend([user] for user in chunk)
+                    else:
+                        result = self._timeout_result(chunk[0][0], chunk[0][1])
+                        self._record(result)
+                        yield result
+                pending = {}
+        finally:
+            if pending:
+                self._kill(executor)
+            else:
+                executor.shutdown()
+
+        self._end = time.perf_counter()
+
+    def _record(self, result):
+        self.users += 1
+        self.sessions += result["sessions"]
+        if result["status"] == "timeout":
+            self.timed_out += 1
+        elif result["status"] != "ok":
+            self.failed += 1
+
+    def metrics(self):
+        """
+        Métricas de throughput de la última ejecución (o de la actual, si sigue en curso).
+        """
+        if self._start is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._end or time.perf_counter()) - self._start
+        return {
+            "users": self.users,
+            "sessions": self.sessions,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "pool_restarts": self.pool_restarts,
+            "elapsed_s": round(elapsed, 3),
+            "users_per_s": self.users / elapsed if elapsed else 0.0,
+            "sessions_per_s": self.sessions / elapsed if elapsed else 0.0
+        }
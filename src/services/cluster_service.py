@@ -1,28 +1,97 @@
+import os
+import numpy as np
+from functools import lru_cache
+from src.utils.cluster_categories import category
 from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.stage_metrics import stage_metrics
+from src.utils.cluster_result_cache import ClusterResultCache
+from src.utils.session_history_store import to_timestamp_us
+from src.services.executors import cluster_executor, compute_executor
+from src.services.history_service import add_session_listener, get_history_snapshot
+from src.services.user_state_service import synced_state, sync_history
+from src.services.tenant_service import get_tenant_profile
 
-def categorize_clusters(user_id: int):
-    # Simulación de consulta a la base de datos para obtener las sesiones del usuario
-    sessions = [
-        {"session_id": 1, "latitude": -34.6037, "longitude": -58.3816},
-        {"session_id": 2, "latitude": -34.6040, "longitude": -58.3820},
-        {"session_id": 3, "latitude": -34.6039, "longitude": -58.3819},
-        {"session_id": 4, "latitude": -34.7000, "longitude": -58.4000}
-    ]
-    analyzer = GeoClusterAnalyzer(eps_km=20, min_samples=3)
-    raw_result = analyzer.analyze_sessions(sessions)
-
-    categorized_result = []
-    for r in raw_result:
-        if r["cluster_id"] == -1:
-            category = "ruido"
-        elif r["is_main_cluster"]:
-            category = "principal"
-        else:
-            category = "secundario"
-
-        categorized_result.append({
-            "session_id": str(r["session_id"]),
-            "cluster_id": int(r["cluster_id"]),
-            "cluster_category": category
-        })
-    return categorized_result
+# Resultados de categorize_clusters por (usuario, versión del historial, parámetros)
+cluster_result_cache = ClusterResultCache(
+    max_entries=int(os.environ.get("GEOVELOCITY_CLUSTER_CACHE_ENTRIES", 10_000)),
+    ttl_seconds=float(os.environ.get("GEOVELOCITY_CLUSTER_CACHE_TTL_S", 3600))
+)
+add_session_listener(cluster_result_cache.invalidate)
+
+def _categorize(r):
+    return {
+        "session_id": str(r["session_id"]),
+        "cluster_id": int(r["cluster_id"]),
+        "cluster_category": category(r["cluster_id"], r["is_main_cluster"])
+    }
+
+@lru_cache(maxsize=64)
+def _analyzer(eps_km: float, min_samples: int):
+    # En los procesos del pool, una instancia por combinación de parámetros (los tenants suelen repetirlas)
+    return GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples)
+
+# Sesiones simuladas para usuarios sin historial guardado (sin GEOVELOCITY_HISTORY_DIR o sin sesiones)
+_SIMULATED_SESSIONS = {
+    "session_id": np.array([1, 2, 3, 4]),
+    "latitude": np.array([-34.6037, -34.6040, -34.6039, -34.7000]),
+    "longitude": np.array([-58.3816, -58.3820, -58.3819, -58.4000])
+}
+
+def cluster_input(user_id: int):
+    """
+    Sesiones a clusterizar de un usuario, leídas en este proceso (el dueño del historial, con las
+    sesiones todavía no volcadas a disco): (versión, (session_id, latitude, longitude)).
+    La versión es la de exactamente esas sesiones. Solo si el usuario no tiene ninguna sesión se
+    usan las sesiones simuladas (versión None: no cambian).
+    """
+    version, history = get_history_snapshot(user_id)
+    if history is not None and len(history) > 0:
+        return version, (history.session_id, history.latitude, history.longitude)
+    return None, (_SIMULATED_SESSIONS["session_id"], _SIMULATED_SESSIONS["latitude"], _SIMULATED_SESSIONS["longitude"])
+
+def categorize_clusters(session_ids, latitudes, longitudes, eps_km: float = 20, min_samples: int = 3):
+    # Corre en el pool de procesos con las columnas ya leídas: DBSCAN las consume directo sin armar dicts
+    raw_result = _analyzer(eps_km, min_samples).analyze_arrays(session_ids, latitudes, longitudes)
+    return [_categorize(r) for r in raw_result]
+
+async def categorize_clusters_cached(user_id: int, tenant_id=None):
+    # DBSCAN solo corre (en el pool de procesos) si el historial del usuario o los parámetros cambiaron.
+    # La clave es la versión de las mismas sesiones que se clusterizan, leídas antes de buscar en cache
+    profile = get_tenant_profile(tenant_id)
+    version, sessions = await compute_executor.run(cluster_input, user_id)
+    return await cluster_result_cache.get_or_compute(
+        user_id, version, (profile.eps_km, profile.min_samples),
+        lambda: cluster_executor.run(categorize_clusters, *sessions, profile.eps_km, profile.min_samples)
+    )
+
+def categorize_new_session(session):
+    # Asigna la sesión nueva con una consulta de vecindario, sin reclusterizar todo el historial. El estado
+    # es el mismo que el de las zonas derivadas y, si no estaba (desalojo o reinicio), se arma desde el
+    # historial guardado antes de agregar la sesión, que no se registra en el historial
+    _, entry, history = synced_state(session.user_id, session.tenant_id, create=True)
+    with entry.lock:
+        sync_history(entry, history)
+        with stage_metrics.span("cluster.incremental_add"):
+            entry.zones.add_sessions([session.session_id], None, [session.latitude], [session.longitude])
+            raw_result = entry.clusters.result(entry.clusters.n - 1)
+
+    return _categorize(raw_result)
+
+def categorize_recorded_session(session, tenant_id=None):
+    """
+    Categoría de una sesión que ya se registró en el historial (p. ej. por la etapa de velocidad de
+    /risk/assess): el estado se pone al día con el historial, que la incluye, y no se agrega dos veces.
+    Sin historial guardado la sesión se agrega directamente.
+    """
+    _, entry, history = synced_state(session.user_id, tenant_id, create=True)
+    with entry.lock:
+        sync_history(entry, history)
+        with stage_metrics.span("cluster.incremental_add"):
+            index = entry.clusters.index_of(session.session_id) if history is not None else None
+            if index is None:
+                entry.zones.add_sessions([session.session_id], [to_timestamp_us(session.datetime)],
+                                         [session.latitude], [session.longitude])
+                index = entry.clusters.n - 1
+            raw_result = entry.clusters.result(index)
+
+    return _categorize(raw_result)
@@ -0,0 +1,156 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from src.utils.stage_metrics import stage_metrics
+
+
+class ExecutorBusy(Exception):
+    def __init__(self, name, retry_after_s):
+        super().__init__(f"{name} executor is at capacity")
+        self.retry_after_s = retry_after_s
+
+
+def _run_with_metrics(fn, args, kwargs):
+    # Corre en el proceso worker: devuelve junto al resultado lo que midieron los spans durante la tarea
+    stage_metrics.drain()
+    result = fn(*args, **kwargs)
+    return result, stage_metrics.drain()
+
+
+class BoundedExecutor:
+    def __init__(self, name, kind, max_workers, max_queue, retry_after_s=1):
+        """
+        Executor dedicado para endpoints pesados, con un límite de trabajos en cola.
+        :param kind: "thread" o "process".
+        :param max_workers: trabajos que corren en paralelo.
+        :param max_queue: trabajos que pueden esperar además de los que corren; por encima
+            de max_workers + max_queue, run() rechaza con ExecutorBusy en lugar de encolar.
+        :param retry_after_s: valor sugerido para el header Retry-After al rechazar.
+        """
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after_s = retry_after_s
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix=self.name)
+            return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Ejecuta fn(*args, **kwargs) en el executor sin bloquear el event loop.
+        """
+        # Solo se modifica desde el event loop, así que no hace falta lock para el contador
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(self.name, self.retry_after_s)
+
+        self.in_flight += 1
+        try:
+            return await self._submit(fn, args, kwargs)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    @contextmanager
+    def reserve(self, slots):
+        """
+        Reserva lugar para `slots` trabajos de una misma request: si no entran, rechaza con ExecutorBusy
+        antes de que la request haga cambios, en lugar de a mitad de camino. Dentro del bloque los
+        trabajos se lanzan con run_reserved(), que no vuelve a pasar por el límite.
+        """
+        if self.in_flight + slots > self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(self.name, self.retry_after_s)
+
+        self.in_flight += slots
+        try:
+            yield
+        finally:
+            self.in_flight -= slots
+
+    async def run_reserved(self, fn, *args, **kwargs):
+        """
+        Como run(), para un trabajo ya contado por reserve().
+        """
+        try:
+            return await self._submit(fn, args, kwargs)
+        finally:
+            self.completed += 1
+
+    async def _submit(self, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            # Los histogramas del worker se suman a los de este proceso, que es el que expone /metrics
+            result, metrics = await loop.run_in_executor(self._get_executor(),
+                                                         partial(_run_with_metrics, fn, args, kwargs))
+            stage_metrics.merge(metrics)
+            return result
+        return await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+
+    async def prewarm(self, fn):
+        """
+        Arranca todos los workers ejecutando fn una vez en cada uno (sin pasar por el límite de cola),
+        para que la primera request real no pague el arranque del proceso ni las importaciones.
+        Retorna lo que devolvió fn en cada worker.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        return list(await asyncio.gather(*(loop.run_in_executor(executor, fn) for _ in range(self.max_workers))))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+# DBSCAN corre en procesos aparte para no competir por el GIL con el resto de la API
+cluster_executor = BoundedExecutor(
+    "cluster", "process",
+    max_workers=_env_int("GEOVELOCITY_CLUSTER_WORKERS", max(1, (os.cpu_count() or 2) // 2)),
+    max_queue=_env_int("GEOVELOCITY_CLUSTER_QUEUE", 32)
+)
+
+# Scoring con Shapely, clustering incremental y comparaciones en lote (NumPy/Shapely liberan el GIL)
+compute_executor = BoundedExecutor(
+    "compute", "thread",
+    max_workers=_env_int("GEOVELOCITY_COMPUTE_THREADS", os.cpu_count() or 4),
+    max_queue=_env_int("GEOVELOCITY_COMPUTE_QUEUE", 64)
+)
+
+
+def shutdown_executors():
+    cluster_executor.shutdown()
+    compute_executor.shutdown()
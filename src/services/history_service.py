@@ -0,0 +1,53 @@
+import os
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+from src.utils.session_history_store import SessionHistoryStore
+
+# Con GEOVELOCITY_HISTORY_DIR se guarda el historial de sesiones de cada usuario en columnas memory-mapped.
+# Los procesos del pool de clustering abren el mismo directorio y ven los segmentos ya volcados a disco.
+# La API es la única que escribe, así que también es la que compacta los segmentos al volcar
+_history_dir = os.environ.get("GEOVELOCITY_HISTORY_DIR")
+history_store = SessionHistoryStore(
+    _history_dir, max_segments=int(os.environ.get("GEOVELOCITY_HISTORY_MAX_SEGMENTS", 64)) or None
+) if _history_dir else None
+
+# Funciones a llamar con el user_id cada vez que se registra una sesión (p. ej. invalidar caches)
+_session_listeners = []
+
+def add_session_listener(listener):
+    _session_listeners.append(listener)
+
+def record_session(session):
+    if history_store is not None:
+        history_store.append(session.user_id, session.session_id, session.datetime,
+                             session.latitude, session.longitude)
+    for listener in _session_listeners:
+        listener(session.user_id)
+
+def get_history_snapshot(user_id):
+    """
+    (versión, sesiones) del usuario leídas juntas, para cachear resultados bajo la versión exacta
+    de las sesiones usadas. Sin historial guardado: (None, None).
+    """
+    if history_store is None:
+        return None, None
+    return history_store.snapshot(user_id)
+
+def get_user_history(user_id, start=None, end=None):
+    if history_store is None:
+        return None
+    return history_store.get(user_id, start, end)
+
+def compare_user_history(user_id, start=None, end=None):
+    # Velocidad entre sesiones consecutivas del historial, directo sobre las columnas
+    history = get_user_history(user_id, start, end)
+    if history is None or len(history) < 2:
+        raise ValueError("At least two sessions are required to compare.")
+
+    metrics = GeoMetricsUtils.compare_session_arrays(history.timestamps, history.latitude, history.longitude)
+    return {
+        "from_id": history.session_id[:-1].tolist(),
+        "to_id": history.session_id[1:].tolist(),
+        "velocity_kmh": metrics["velocity_kmh"].round(2).tolist(),
+        "time_diff_hour": metrics["time_diff_hour"].tolist(),
+        "distance_km": metrics["distance_km"].round(3).tolist()
+    }
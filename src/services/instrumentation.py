@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from fastapi.routing import APIRoute
+from src.utils.request_profiler import SlowRequestProfiler
+from src.utils.stage_metrics import stage_metrics
+
+# Perfiles de requests lentas; desactivado salvo que se configure una tasa de muestreo
+slow_request_profiler = SlowRequestProfiler(
+    sample_rate=float(os.environ.get("GEOVELOCITY_PROFILE_SAMPLE_RATE", 0)),
+    threshold_s=float(os.environ.get("GEOVELOCITY_PROFILE_SLOW_MS", 500)) / 1000
+)
+
+_current_trace = contextvars.ContextVar("geovelocity_request_trace", default=None)
+
+
+class _RequestTrace:
+    __slots__ = ("start", "endpoint_start", "endpoint_end")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.endpoint_start = None
+        self.endpoint_end = None
+
+
+def _timed_endpoint(endpoint):
+    # functools.wraps conserva la firma, así que FastAPI arma la validación igual que con el endpoint original
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.endpoint_start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace.endpoint_end = time.perf_counter()
+        return timed
+
+    @functools.wraps(endpoint)
+    def timed_sync(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.endpoint_start = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            if trace is not None:
+                trace.endpoint_end = time.perf_counter()
+    return timed_sync
+
+
+class TimedRoute(APIRoute):
+    """
+    Ruta que separa el tiempo de cada request en tres etapas:
+        - request.validation: lectura del body, validación de Pydantic y dependencias
+        - request.endpoint: el handler
+        - request.serialization: conversión del resultado y render de la respuesta
+    Si la validación falla (422), todo el tiempo queda en request.validation.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = f"{','.join(sorted(self.methods or []))} {self.path}"
+
+        async def timed_handler(request):
+            trace = _RequestTrace()
+            token = _current_trace.set(trace)
+            profile = slow_request_profiler.start()
+            try:
+                return await handler(request)
+            finally:
+                end = time.perf_counter()
+                _current_trace.reset(token)
+                slow_request_profiler.finish(profile, route, end - trace.start)
+                _record(route, trace, end)
+
+        return timed_handler
+
+
+def _record(route, trace, end):
+    if trace.endpoint_start is None:
+        stage_metrics.observe("request.validation", end - trace.start, route)
+    else:
+        endpoint_end = trace.endpoint_end or end
+        stage_metrics.observe("request.validation", trace.endpoint_start - trace.start, route)
+        stage_metrics.observe("request.endpoint", endpoint_end - trace.endpoint_start, route)
+        stage_metrics.observe("request.serialization", end - endpoint_end, route)
+    stage_metrics.observe("request.total", end - trace.start, route)
+
+
+def render_metrics(executors=()):
+    """
+    Texto para /metrics: histogramas por etapa y el estado de los executors como gauges/counters.
+    """
+    lines = [stage_metrics.render_prometheus()]
+    for name, kind, help_text, key in (
+        ("geovelocity_executor_in_flight", "gauge", "Trabajos corriendo o en cola.", "in_flight"),
+        ("geovelocity_executor_completed_total", "counter", "Trabajos terminados.", "completed"),
+        ("geovelocity_executor_rejected_total", "counter", "Trabajos rechazados por cola llena.", "rejected"),
+    ):
+        lines.append(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n")
+        for executor in executors:
+            lines.append(f'{name}{{executor="{executor.name}"}} {executor.stats()[key]}\n')
+    return "".join(lines)
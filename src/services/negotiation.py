@@ -0,0 +1,78 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from src.utils.binary_codec import (ARROW, JSON, MSGPACK, UnsupportedFormat, decode_tables, encode_table,
+                                    request_format, response_format)
+from src.utils.stage_metrics import stage_metrics
+
+BINARY_FORMATS = (MSGPACK, ARROW)
+
+
+def negotiate(request: Request) -> Tuple[str, str]:
+    """
+    Formatos de la request (Content-Type) y de la respuesta (Accept, o el de la request).
+    415 si el cuerpo llega en un formato binario sin su paquete instalado; 406 si se pide así la respuesta.
+    """
+    try:
+        request_fmt = request_format(request.headers.get("content-type"))
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    try:
+        return request_fmt, response_format(request.headers.get("accept"), request_fmt)
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def parse_json(model: type, body: bytes) -> BaseModel:
+    # Mismo 422 que si FastAPI hubiera validado el body
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)], body=body
+        )
+
+
+def decode_body(body: bytes, fmt: str, names: Tuple[str, ...]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    with stage_metrics.span("codec.decode"):
+        try:
+            return decode_tables(body, fmt, names)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+def binary_response(columns: Dict, fmt: str, **extra) -> Response:
+    with stage_metrics.span("codec.encode"):
+        return Response(content=encode_table(columns, fmt, extra), media_type=fmt)
+
+
+def rows_to_columns(rows: List[Dict]) -> Dict[str, list]:
+    keys = list(rows[0]) if rows else []
+    return {k: [r[k] for r in rows] for k in keys}
+
+
+def columns_to_rows(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    names = list(columns)
+    values = [columns[k].tolist() if isinstance(columns[k], np.ndarray) else list(columns[k]) for k in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def binary_body(model: type) -> Dict:
+    """
+    openapi_extra para endpoints que leen el body a mano: documenta el esquema JSON del modelo
+    y los tipos binarios aceptados.
+    """
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON: {"schema": schema},
+                MSGPACK: {"schema": {"type": "string", "format": "binary"}},
+                ARROW: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
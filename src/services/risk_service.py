@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from src.utils.stage_metrics import stage_metrics
+from src.services.velocity_service import compare_with_last_session_async, last_session_store, travel_detector
+from src.services.cluster_service import categorize_recorded_session
+from src.services.user_state_service import catch_up
+from src.services.scoring_service import get_zone_set, zone_set_cache
+from src.services.zone_service import get_user_zone_set
+from src.services.executors import compute_executor
+from src.services.tenant_service import get_tenant_profile
+
+# Un score por debajo de este umbral cuenta como login fuera de las zonas frecuentes
+MIN_ZONE_SCORE = float(os.environ.get("GEOVELOCITY_RISK_MIN_ZONE_SCORE", 0.5))
+
+def _elapsed_ms(start, end):
+    return round((end - start) * 1000, 3)
+
+async def _timed(stage, timings, awaitable):
+    # Tiempo de pared de la etapa, incluida la espera en el pool
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        end = time.perf_counter()
+        timings[stage] = _elapsed_ms(start, end)
+        stage_metrics.observe(f"pipeline.{stage}", end - start)
+
+def _cluster_stage(session, tenant_id):
+    # La etapa de velocidad ya registró la sesión: el clustering la toma del historial sin agregarla dos veces
+    return categorize_recorded_session(session, tenant_id)
+
+def _zone_stage(session, zones, zone_set_id, zone_set, tenant_id):
+    # Zonas listas antes de registrar la sesión: si el conjunto enviado es inválido, la request falla
+    # sin efectos, y las zonas derivadas son las del historial previo a este login
+    if zone_set is not None:
+        return zone_set, "cached"
+    if zones is not None:
+        return get_zone_set(zones, zone_set_id), "request"
+    # None si el usuario todavía no tiene sesiones: la etapa no aporta señal
+    return get_user_zone_set(session.user_id, tenant_id), "derived"
+
+def _scoring_stage(session, velocity, zone_set, tenant_id):
+    # El scoring solo espera a la velocidad: las zonas ya están preparadas
+    return get_tenant_profile(tenant_id).evaluator.evaluate_session({
+        "lat": session.latitude,
+        "lon": session.longitude,
+        "velocity_kmh": velocity["velocity_kmh"] if velocity else None,
+        "time_diff_hour": velocity["time_diff_hour"] if velocity else None,
+        "distance_km": velocity["distance_km"] if velocity else None
+    }, zone_set)
+
+async def _no_score():
+    # Usuario sin zonas: la etapa de scoring no corre
+    return None
+
+def risk_verdict(velocity, cluster, zone_score):
+    """
+    Combina las tres etapas en un nivel de riesgo:
+        - impossible_velocity: la velocidad desde la sesión anterior supera la del detector de viajes imposibles
+        - outside_clusters: la sesión quedó como ruido en el clustering del usuario
+        - low_zone_score: el score contra las zonas frecuentes es menor que MIN_ZONE_SCORE
+    "high" con impossible_velocity o con dos señales o más, "medium" con una, "low" sin ninguna.
+    Las etapas sin datos (primera sesión, usuario sin zonas) no aportan señales.
+    """
+    reasons = []
+    if velocity is not None and velocity["velocity_kmh"] > travel_detector.max_speed_kmh:
+        reasons.append("impossible_velocity")
+    if cluster["cluster_category"] == "ruido":
+        reasons.append("outside_clusters")
+    if zone_score is not None and zone_score["score"] < MIN_ZONE_SCORE:
+        reasons.append("low_zone_score")
+
+    if "impossible_velocity" in reasons or len(reasons) >= 2:
+        risk = "high"
+    elif reasons:
+        risk = "medium"
+    else:
+        risk = "low"
+    return risk, reasons
+
+async def _all(*awaitables):
+    # Como asyncio.gather, pero espera a que terminen todas antes de propagar el primer error, así ninguna
+    # etapa sigue corriendo fuera de la reserva del pool
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+async def assess_session(session, zones=None, zone_set_id=None, tenant_id=None):
+    """
+    Evalúa un login en una sola pasada sobre la sesión ya validada:
+        1. en paralelo, en el pool de threads: preparación de zonas y puesta al día del clustering
+           incremental del usuario con su historial (ninguna de las dos registra nada)
+        2. velocidad contra la sesión anterior (registra la sesión, como /velocity/compare-last)
+        3. categoría de la sesión en el clustering y scoring, en paralelo en el pool de threads
+    Sin `zones` se usan las zonas ya cacheadas con `zone_set_id` o, sin ninguno de los dos,
+    las zonas derivadas del historial del usuario. Todo lo que puede rechazar la request (zonas
+    inválidas o no cacheadas, pool lleno) se resuelve antes de registrar la sesión, así un
+    reintento no la registra dos veces.
+    """
+    start = time.perf_counter()
+    timings = {}
+
+    zone_set = None
+    if zones is None and zone_set_id is not None:
+        # Zonas enviadas antes con el mismo zone_set_id (por este endpoint o por /geo/score-*)
+        zone_set = zone_set_cache.get(("id", zone_set_id))
+        if zone_set is None:
+            raise ValueError(f"Zone set {zone_set_id!r} is not cached; send the zones again")
+
+    # Lugar en el pool para zonas, puesta al día, clustering, scoring y, con un almacén bloqueante, el swap
+    with compute_executor.reserve(4 + int(last_session_store.blocking)):
+        (zone_set, zone_source), _ = await _all(
+            _timed("zones", timings, compute_executor.run_reserved(
+                _zone_stage, session, zones, zone_set_id, zone_set, tenant_id)),
+            _timed("cluster_sync", timings, compute_executor.run_reserved(catch_up, session.user_id, tenant_id))
+        )
+        if zone_set is None or len(zone_set) == 0:
+            zone_set = zone_source = None
+
+        # Recién con las zonas listas se registra la sesión
+        velocity = await _timed("velocity", timings, compare_with_last_session_async(session, reserved=True))
+
+        if zone_set is not None:
+            scoring = _timed("scoring", timings,
+                             compute_executor.run_reserved(_scoring_stage, session, velocity, zone_set, tenant_id))
+        else:
+            scoring = _no_score()
+        cluster, zone_score = await _all(
+            _timed("cluster", timings, compute_executor.run_reserved(_cluster_stage, session, tenant_id)),
+            scoring
+        )
+
+    risk, reasons = risk_verdict(velocity, cluster, zone_score)
+    timings["total"] = _elapsed_ms(start, time.perf_counter())
+    return {
+        "user_id": session.user_id,
+        "session_id": session.session_id,
+        "risk": risk,
+        "reasons": reasons,
+        "velocity": velocity,
+        "cluster": cluster,
+        "zone_score": zone_score,
+        "zone_source": zone_source,
+        "timings_ms": timings
+    }
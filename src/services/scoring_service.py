@@ -1,10 +1,24 @@
-from shapely.geometry import Polygon
-from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+import os
+import numpy as np
+from src.utils.geo_scoring_evaluator import shapely
+from src.utils.binary_codec import column, ragged_coordinates
+from src.utils.geo_zone_index import PreparedZoneSet
+from src.utils.stage_metrics import stage_metrics
+from src.utils.zone_set_cache import ZoneSetCache
+from src.services.tenant_service import get_tenant_profile
 
-def evaluate_session(session_output, zones):
+# Las zonas preparadas no dependen de los parámetros del evaluador, así que el cache es compartido entre tenants.
+# Las tablas de lookup de cada conjunto cuentan para su presupuesto de memoria
+zone_set_cache = ZoneSetCache(max_bytes=int(os.environ.get("GEOVELOCITY_ZONE_CACHE_MAX_BYTES", 512 * 2**20)))
+
+def _transform_zones(zones):
+    with stage_metrics.span("scoring.polygon_build"):
+        return _build_zones(zones)
+
+def _build_zones(zones):
     zones_transform = []
     for z in zones:
-        geom = Polygon(z.polygon)
+        geom = shapely.Polygon(z.polygon)
         zones_transform.append({
             "zone_id": z.zone_id,
             "geometry": geom,
@@ -14,6 +28,53 @@ def evaluate_session(session_output, zones):
                 "distance_mean_km": z.metrics.distance_mean_km
             }
         })
+    return zones_transform
+
+def get_zone_set(zones, zone_set_id=None):
+    # Con zone_set_id (p. ej. usuario + versión) el conjunto ocupa una sola entrada, que se reemplaza cuando
+    # el contenido de las zonas (vértices o métricas) deja de coincidir con el fingerprint guardado
+    build = lambda: PreparedZoneSet(_transform_zones(zones))
+    fingerprint = ZoneSetCache.fingerprint(zones)
+    if zone_set_id is None:
+        return zone_set_cache.get_or_build(("hash", fingerprint), build)
+    return zone_set_cache.get_or_build(("id", zone_set_id), build, fingerprint)
+
+def _build_zones_from_columns(zone_ids, offsets, coords, velocity, time, distance):
+    # Todos los polígonos se arman en una sola llamada a partir de los vértices contiguos
+    with stage_metrics.span("scoring.polygon_build"):
+        ring_index = np.repeat(np.arange(len(zone_ids)), np.diff(offsets))
+        geometries = shapely.polygons(shapely.linearrings(coords, indices=ring_index))
+        return [
+            {
+                "zone_id": zone_id,
+                "geometry": geom,
+                "metrics": {"velocity_mean_kmh": v, "time_mean_hour": t, "distance_mean_km": d}
+            }
+            for zone_id, geom, v, t, d in zip(zone_ids.tolist(), geometries, velocity.tolist(),
+                                              time.tolist(), distance.tolist())
+        ]
+
+def get_zone_set_from_columns(zones, zone_set_id=None):
+    # Mismo cache que get_zone_set; el fingerprint se calcula sobre los bytes de las columnas
+    offsets, coords = ragged_coordinates(zones)
+    n = len(offsets) - 1
+    zone_ids = column(zones, "zone_id", np.int64, n)
+    velocity = column(zones, "velocity_mean_kmh", np.float64, n)
+    time = column(zones, "time_mean_hour", np.float64, n)
+    distance = column(zones, "distance_mean_km", np.float64, n)
+
+    fingerprint = ZoneSetCache.columns_fingerprint(zone_ids, offsets, coords, velocity, time, distance)
+    if zone_set_id is None:
+        key, signature = ("columns", fingerprint), None
+    else:
+        key, signature = ("id", zone_set_id), fingerprint
+    return zone_set_cache.get_or_build(key, lambda: PreparedZoneSet(
+        _build_zones_from_columns(zone_ids, offsets, coords, velocity, time, distance)), signature)
+
+def evaluate_session(session_output, zones, zone_set_id=None, tenant_id=None):
+    # El conjunto de zonas preparado se reutiliza mientras las zonas no cambien
+    zone_set = get_zone_set(zones, zone_set_id)
+    evaluator = get_tenant_profile(tenant_id).evaluator
 
     sesion_dict = {
         "lat": session_output.lat_new,
@@ -23,5 +84,71 @@ def evaluate_session(session_output, zones):
         "distance_km": session_output.distance_km
     }
 
-    evaluator = GeoScoringEvaluator()
-    return evaluator.evaluate_session(sesion_dict, zones_transform)
+    with stage_metrics.span("scoring.evaluate"):
+        return evaluator.evaluate_session(sesion_dict, zone_set)
+
+def evaluate_sessions(session_outputs, zones, zone_set_id=None, tenant_id=None):
+    # Todas las sesiones se evalúan juntas contra el mismo conjunto de zonas
+    zone_set = get_zone_set(zones, zone_set_id)
+    evaluator = get_tenant_profile(tenant_id).evaluator
+
+    with stage_metrics.span("scoring.evaluate_batch"):
+        result = evaluator.evaluate_sessions(
+            [s.lat_new for s in session_outputs],
+            [s.lon_new for s in session_outputs],
+            [s.velocity_kmh for s in session_outputs],
+            [s.time_diff_hour for s in session_outputs],
+            [s.distance_km for s in session_outputs],
+            zone_set
+        )
+
+    zone_ids = zone_set.zone_ids
+    return {
+        "from_id": [s.from_id for s in session_outputs],
+        "to_id": [s.to_id for s in session_outputs],
+        "score": result["score"].tolist(),
+        "zone_val": [zone_ids[i] if i >= 0 else None for i in result["zone_index"].tolist()],
+        "zone_match": result["zone_match"].tolist()
+    }
+
+def evaluate_session_columns(sessions, zones, zone_set_id=None, tenant_id=None):
+    # Versión columnar de evaluate_sessions para cuerpos binarios: las columnas van directo al evaluador
+    zone_set = get_zone_set_from_columns(zones, zone_set_id)
+    evaluator = get_tenant_profile(tenant_id).evaluator
+    n = len(sessions.get("lat_new", ()))
+    from_id = column(sessions, "from_id", np.int64, n)
+    to_id = column(sessions, "to_id", np.int64, n)
+
+    with stage_metrics.span("scoring.evaluate_batch"):
+        result = evaluator.evaluate_sessions(
+            column(sessions, "lat_new", np.float64, n),
+            column(sessions, "lon_new", np.float64, n),
+            column(sessions, "velocity_kmh", np.float64, n),
+            column(sessions, "time_diff_hour", np.float64, n),
+            column(sessions, "distance_km", np.float64, n),
+            zone_set
+        )
+
+    zone_ids = np.asarray(zone_set.zone_ids, dtype=np.int64)
+    zone_index = result["zone_index"]
+    return {
+        "from_id": from_id,
+        "to_id": to_id,
+        "score": result["score"],
+        # -1 indica que la sesión no coincidió con ninguna zona (None en la respuesta JSON)
+        "zone_val": np.where(zone_index >= 0, zone_ids[np.maximum(zone_index, 0)], -1) if len(zone_ids)
+                    else np.full(n, -1, dtype=np.int64),
+        "zone_match": result["zone_match"]
+    }
+
+def lookup_table_stats():
+    # Memoria, cota de error y tasa de aciertos de las tablas de lookup de cada conjunto cacheado
+    zone_sets = []
+    for key, zone_set in zone_set_cache.items():
+        tables = [table.stats() for derived_key, table in zone_set.derived_items() if derived_key[0] == "lookup"]
+        if tables:
+            zone_sets.append({"key": ":".join(str(k) for k in key), "zones": len(zone_set), "tables": tables})
+    return {
+        "zone_sets": zone_sets,
+        "bytes": sum(t["bytes"] for z in zone_sets for t in z["tables"])
+    }
@@ -0,0 +1,11 @@
+import os
+from src.utils.tenant_registry import TenantRegistry
+
+# Parámetros de clustering y scoring por tenant; el archivo se recarga solo cuando cambia
+tenant_registry = TenantRegistry(
+    os.environ.get("GEOVELOCITY_TENANT_CONFIG"),
+    check_interval_s=float(os.environ.get("GEOVELOCITY_TENANT_CONFIG_CHECK_S", 5))
+)
+
+def get_tenant_profile(tenant_id=None):
+    return tenant_registry.get(tenant_id)
@@ -0,0 +1,79 @@
+import os
+import threading
+from src.utils.geo_zone_builder import GeoZoneBuilder, IncrementalZoneState
+from src.utils.stage_metrics import stage_metrics
+from src.utils.user_state_map import UserStateMap
+from src.services.history_service import get_user_history
+from src.services.tenant_service import get_tenant_profile
+
+zone_builder = GeoZoneBuilder(buffer_km=0.5)
+
+# Estado incremental por (tenant, usuario): un solo clustering, compartido por las categorías de sesión
+# (cluster_service) y las zonas derivadas (zone_service). Un usuario desalojado, o el estado después de un
+# reinicio, se reconstruye desde su historial guardado en la próxima consulta
+user_states = UserStateMap(
+    max_entries=int(os.environ.get("GEOVELOCITY_CLUSTER_STATE_ENTRIES", 100_000)),
+    ttl_seconds=float(os.environ.get("GEOVELOCITY_CLUSTER_STATE_TTL_S", 7 * 24 * 3600))
+)
+
+
+class UserState:
+    def __init__(self, profile):
+        # El lock serializa las actualizaciones del estado de un usuario
+        self.lock = threading.Lock()
+        self.zones = IncrementalZoneState(zone_builder, eps_km=profile.eps_km, min_samples=profile.min_samples)
+        self.history_rows = 0  # Sesiones del historial guardado ya agregadas al estado
+        self.zone_set_key = None  # Clave en zone_set_cache del último conjunto de zonas preparado
+
+    @property
+    def clusters(self):
+        return self.zones.clusters
+
+
+def get_state(user_id, tenant_id=None, create=True):
+    """
+    (clave, estado) del usuario; con create=False, None si no tenía estado.
+    """
+    profile = get_tenant_profile(tenant_id)
+    key = (profile.tenant_id, user_id)
+    entry = user_states.get_or_create(key, lambda: UserState(profile)) if create else user_states.get(key)
+    if entry is not None:
+        clusters = entry.clusters
+        if clusters.eps_km != profile.eps_km or clusters.min_samples != profile.min_samples:
+            # La configuración del tenant cambió: el estado se vuelve a armar desde el historial con los
+            # parámetros nuevos (las sesiones agregadas sin pasar por el historial se pierden)
+            user_states.pop(key)
+            entry = user_states.get_or_create(key, lambda: UserState(profile))
+    return key, entry
+
+def sync_history(entry, history):
+    """
+    Con el lock del usuario tomado: agrega al estado las sesiones del historial que todavía no vio
+    (el historial de un usuario solo crece al final), así que DBSCAN completo corre una sola vez por usuario.
+    """
+    if history is None or len(history) <= entry.history_rows:
+        return
+    new = slice(entry.history_rows, None)
+    with stage_metrics.span("zones.history_sync"):
+        entry.zones.add_sessions(history.session_id[new], history.timestamp_us[new],
+                                 history.latitude[new], history.longitude[new])
+    entry.history_rows = len(history)
+
+def synced_state(user_id, tenant_id=None, create=None):
+    """
+    (clave, estado, historial) del usuario. Por defecto el estado solo se crea si el usuario tiene
+    historial, para no guardar estados vacíos de usuarios desconocidos. El llamador pone el estado al
+    día con sync_history bajo el lock del usuario.
+    """
+    history = get_user_history(user_id)
+    if create is None:
+        create = history is not None and len(history) > 0
+    key, entry = get_state(user_id, tenant_id, create=create)
+    return key, entry, history
+
+def catch_up(user_id, tenant_id=None):
+    # Pone al día el estado del usuario con su historial (reconstruyéndolo si no estaba) sin agregar nada más
+    _, entry, history = synced_state(user_id, tenant_id)
+    if entry is not None:
+        with entry.lock:
+            sync_history(entry, history)
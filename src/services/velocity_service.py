@@ -1,23 +1,28 @@
+import os
+import time
+import numpy as np
+from pydantic import ValidationError
+from src.models.schemas import SessionInput
 from src.utils.geo_metrics_utils import GeoMetricsUtils
-from datetime import datetime
+from src.utils.impossible_travel import ImpossibleTravelDetector
+from src.utils.binary_codec import column, timestamp_column
+from src.services.history_service import record_session
+from src.services.executors import compute_executor
+from src.utils.ndjson_stream import LineTooLong, iter_ndjson_lines, ndjson_line
+from src.utils.last_session_store import InMemoryLastSessionStore, SQLiteLastSessionStore
 
-def compare_with_last_session(new_session):
-    # Simulamos que traemos la ultima sesion del usuario de la base de datos:
-    last_session = {
-        "user_id": 1,
-        "session_id": 1,
-        "datetime": datetime(2025, 5, 15, 12, 30),
-        "latitude": 40.0,
-        "longitude": -74.0
-    }
+# Con GEOVELOCITY_SESSION_DB se persiste la última sesión de cada usuario en SQLite
+_session_db = os.environ.get("GEOVELOCITY_SESSION_DB")
+last_session_store = SQLiteLastSessionStore(_session_db) if _session_db else InMemoryLastSessionStore()
 
-    s1 = {
-        "session_id": last_session["session_id"],
-        "datetime": last_session["datetime"],
-        "latitude": last_session["latitude"],
-        "longitude": last_session["longitude"]
-    }
+# Ventana de sesiones recientes por usuario para detectar viajes imposibles
+travel_detector = ImpossibleTravelDetector(
+    window_hours=float(os.environ.get("GEOVELOCITY_TRAVEL_WINDOW_HOURS", 24)),
+    max_sessions=int(os.environ.get("GEOVELOCITY_TRAVEL_WINDOW_SESSIONS", 32)),
+    max_speed_kmh=float(os.environ.get("GEOVELOCITY_TRAVEL_MAX_SPEED_KMH", 900))
+)
 
+def compare_with_last_session(new_session):
     s2 = {
         "user_id": new_session.user_id,
         "session_id": new_session.session_id,
@@ -26,4 +31,94 @@ def compare_with_last_session(new_session):
         "longitude": new_session.longitude
     }
 
+    # Lectura de la sesión anterior y reemplazo por la nueva en una sola operación atómica
+    s1 = last_session_store.swap(new_session.user_id, s2)
+    record_session(new_session)
+    if s1 is None:
+        return None
+
     return GeoMetricsUtils.compare_sessions(s1, s2)
+
+async def compare_with_last_session_async(new_session, reserved=False):
+    # Con un almacén bloqueante (SQLite) el swap va al pool de threads para no frenar el event loop;
+    # reserved: la request ya reservó ese lugar con compute_executor.reserve()
+    if last_session_store.blocking:
+        run = compute_executor.run_reserved if reserved else compute_executor.run
+        return await run(compare_with_last_session, new_session)
+    return compare_with_last_session(new_session)
+
+def check_impossible_travel(new_session):
+    # Costo constante por evento: la ventana tiene tamaño fijo sin importar el largo del historial
+    return travel_detector.check({
+        "user_id": new_session.user_id,
+        "session_id": new_session.session_id,
+        "datetime": new_session.datetime,
+        "latitude": new_session.latitude,
+        "longitude": new_session.longitude
+    })
+
+def compare_all_sessions(sessions):
+    # Las sesiones se comparan de a pares consecutivos, en el orden recibido
+    return GeoMetricsUtils.compare_session_list([
+        {"user_id": s.user_id, "session_id": s.session_id, "datetime": s.datetime,
+         "latitude": s.latitude, "longitude": s.longitude}
+        for s in sessions
+    ])
+
+def compare_session_columns(sessions):
+    # Versión columnar de compare_all_sessions para cuerpos binarios: sin un objeto por sesión
+    n = len(sessions.get("latitude", ()))
+    if n < 2:
+        raise ValueError("At least two sessions are required to compare.")
+    user_id = column(sessions, "user_id", np.int64, n)
+    session_id = column(sessions, "session_id", np.int64, n)
+    timestamps = timestamp_column(sessions, "datetime", n)
+    lat = column(sessions, "latitude", np.float64, n)
+    lon = column(sessions, "longitude", np.float64, n)
+
+    metrics = GeoMetricsUtils.compare_session_arrays(timestamps, lat, lon)
+    return {
+        "user_id": user_id[1:],
+        "from_id": session_id[:-1],
+        "to_id": session_id[1:],
+        "lat_new": lat[1:],
+        "lon_new": lon[1:],
+        "velocity_kmh": np.round(metrics["velocity_kmh"], 2),
+        "time_diff_hour": metrics["time_diff_hour"],
+        "distance_km": np.round(metrics["distance_km"], 3)
+    }
+
+async def stream_compare_sessions(chunks):
+    # Valida y compara cada sesión apenas llega; la memoria solo depende del almacén de últimas sesiones
+    start = time.perf_counter()
+    counts = {"ok": 0, "no_previous": 0, "error": 0}
+
+    async for line_number, line in iter_ndjson_lines(chunks):
+        try:
+            if isinstance(line, LineTooLong):
+                raise line
+            session = SessionInput.model_validate_json(line)
+            result = await compare_with_last_session_async(session)
+            status = "ok" if result is not None else "no_previous"
+            output = {"line": line_number, "status": status, "result": result}
+        except ValidationError as e:
+            status = "error"
+            output = {"line": line_number, "status": status,
+                      "detail": e.errors(include_url=False, include_context=False, include_input=False)}
+        except Exception as e:
+            status = "error"
+            output = {"line": line_number, "status": status, "detail": str(e)}
+
+        counts[status] += 1
+        yield ndjson_line(output)
+
+    elapsed = time.perf_counter() - start
+    records = sum(counts.values())
+    yield ndjson_line({
+        "summary": {
+            "records": records,
+            **counts,
+            "elapsed_s": round(elapsed, 3),
+            "records_per_s": round(records / elapsed, 1) if elapsed else 0.0
+        }
+    })
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import numpy as np
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.geo_incremental_cluster import IncrementalGeoClusterState
+from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+from src.utils.geo_zone_builder import GeoZoneBuilder
+from src.services.executors import cluster_executor
+
+# Resultado del último pre-calentamiento (lo expone /health/warmup)
+warmup_report = {"status": "not_run"}
+
+# Cinco logins alrededor de Buenos Aires y uno lejano: alcanza para un cluster y un punto de ruido
+_LATS = np.array([-34.6037, -34.6040, -34.6039, -34.6050, -34.6045, 40.4168])
+_LONS = np.array([-58.3816, -58.3820, -58.3819, -58.3830, -58.3825, -3.7038])
+
+
+def warm_up_clustering():
+    """
+    Importa scikit-learn y SciPy y ejecuta una vez cada camino de clustering con datos mínimos:
+    DBSCAN directo, el modo de entrada grande (BallTree + componentes conexas) y el estado incremental.
+    """
+    start = time.perf_counter()
+    coords = np.radians(np.column_stack([_LATS, _LONS]))
+    GeoClusterAnalyzer(eps_km=20, min_samples=3).fit_labels_radians(coords)
+    GeoClusterAnalyzer(eps_km=20, min_samples=3, large_input_threshold=1).fit_labels_radians(coords)
+
+    state = IncrementalGeoClusterState(eps_km=20, min_samples=3, verify_every=None)
+    for i, (lat, lon) in enumerate(zip(_LATS, _LONS)):
+        state.add_session({"session_id": i, "latitude": lat, "longitude": lon})
+    state.verify()
+    return time.perf_counter() - start
+
+
+def warm_up_scoring():
+    """
+    Importa Shapely y ejecuta la construcción de zonas, el STRtree y el scoring con datos mínimos.
+    """
+    start = time.perf_counter()
+    labels = np.array([0, 0, 0, 0, 0, -1])
+    timestamps = np.arange(len(_LATS), dtype=np.float64) * 3600
+    zones = GeoZoneBuilder(buffer_km=0.5).build_zones(timestamps, _LATS, _LONS, labels)
+
+    evaluator = GeoScoringEvaluator(early_exit=True, early_exit_min_candidates=1)
+    zone_set = evaluator.prepare_zones(zones)
+    session = {"lat": _LATS[0], "lon": _LONS[0], "velocity_kmh": 1.0, "time_diff_hour": 1.0, "distance_km": 1.0}
+    evaluator.evaluate_session(session, zones)
+    evaluator.evaluate_session(session, zone_set)
+    evaluator.evaluate_sessions(_LATS, _LONS, _LONS * 0, _LONS * 0, _LONS * 0, zone_set)
+    return time.perf_counter() - start
+
+
+def warm_up():
+    return {"clustering_s": warm_up_clustering(), "scoring_s": warm_up_scoring()}
+
+
+async def prewarm():
+    """
+    Hook de arranque: deja importadas y ejercitadas las dependencias pesadas antes de recibir tráfico,
+    en este proceso (pool de threads) y en los procesos del pool de clustering.
+    """
+    start = time.perf_counter()
+    warmup_report.clear()
+    warmup_report["status"] = "running"
+    local = await asyncio.to_thread(warm_up)
+    workers = await cluster_executor.prewarm(warm_up_clustering)
+    warmup_report.update({
+        "status": "done",
+        "total_s": time.perf_counter() - start,
+        "in_process": local,
+        "cluster_workers_s": workers
+    })
+    return warmup_report
@@ -0,0 +1,50 @@
+from src.utils.geo_zone_builder import GeoZoneBuilder
+from src.utils.geo_zone_index import PreparedZoneSet
+from src.utils.stage_metrics import stage_metrics
+from src.services.scoring_service import zone_set_cache
+from src.services.user_state_service import sync_history, synced_state
+
+def update_zones(session, tenant_id=None):
+    # Agrega la sesión a las zonas del usuario sin recalcular su historial completo
+    _, entry, history = synced_state(session.user_id, tenant_id, create=True)
+    with entry.lock, stage_metrics.span("zones.incremental_update"):
+        sync_history(entry, history)
+        zones = entry.zones.add_session({
+            "session_id": session.session_id,
+            "datetime": session.datetime,
+            "latitude": session.latitude,
+            "longitude": session.longitude
+        })
+    return GeoZoneBuilder.to_payload(zones)
+
+def derive_zones(user_id, tenant_id=None):
+    # Zonas del estado incremental, puesto al día con el historial guardado
+    _, entry, history = synced_state(user_id, tenant_id)
+    if entry is None:
+        return None, 0
+    with entry.lock:
+        sync_history(entry, history)
+        return entry.zones.zones(), entry.clusters.n
+
+def get_user_zones(user_id, tenant_id=None):
+    zones, _ = derive_zones(user_id, tenant_id)
+    if zones is None:
+        raise ValueError(f"No sessions found for user {user_id}")
+    return GeoZoneBuilder.to_payload(zones)
+
+def get_user_zone_set(user_id, tenant_id=None):
+    """
+    Conjunto preparado para scoring de las zonas derivadas del usuario, o None si no tiene sesiones.
+    La versión es la cantidad de sesiones del estado; al cambiar, la versión anterior sale del cache.
+    """
+    key, entry, history = synced_state(user_id, tenant_id)
+    if entry is None:
+        return None
+    with entry.lock:
+        sync_history(entry, history)
+        clusters = entry.clusters
+        zone_set_key = ("derived", *key, clusters.eps_km, clusters.min_samples, clusters.n)
+        if entry.zone_set_key is not None and entry.zone_set_key != zone_set_key:
+            zone_set_cache.pop(entry.zone_set_key)
+        entry.zone_set_key = zone_set_key
+        return zone_set_cache.get_or_build(zone_set_key, lambda: PreparedZoneSet(entry.zones.zones()))
@@ -0,0 +1,271 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from src.utils.lazy_imports import LazyModule
+
+# msgpack y pyarrow son opcionales: solo se importan si llega una request en ese formato
+msgpack = LazyModule("msgpack")
+pa = LazyModule("pyarrow")
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_ALIASES = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/vnd.apache.arrow.stream": ARROW,
+    "application/vnd.apache.arrow.file": ARROW
+}
+_PACKAGES = {MSGPACK: msgpack, ARROW: pa}
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+# Columnas anidadas (una lista de vértices por fila); se leen con ragged_coordinates
+_NESTED = {"polygon"}
+
+
+def _media_type(header: Optional[str]) -> Optional[str]:
+    if not header:
+        return None
+    return header.split(";", 1)[0].strip().lower()
+
+
+def request_format(content_type: Optional[str]) -> str:
+    """
+    Formato del cuerpo según Content-Type; sin header (o uno desconocido) se asume JSON.
+    Lanza UnsupportedFormat si el formato es binario y su paquete no está instalado.
+    """
+    fmt = _ALIASES.get(_media_type(content_type), JSON)
+    _require(fmt)
+    return fmt
+
+
+def response_format(accept: Optional[str], request_fmt: str = JSON) -> str:
+    """
+    Formato de la respuesta: el primer tipo conocido en Accept y, si no hay ninguno (p. ej. */*),
+    el mismo formato de la request. Así un cliente que envía msgpack recibe msgpack sin
+    tener que pedirlo, y un cliente JSON puede pedir la respuesta en Arrow.
+    """
+    for part in (accept or "").split(","):
+        fmt = _ALIASES.get(_media_type(part))
+        if fmt is not None:
+            _require(fmt)
+            return fmt
+    return request_fmt
+
+
+def _require(fmt: str):
+    package = _PACKAGES.get(fmt)
+    if package is None:
+        return
+    try:
+        package.load()
+    except ImportError:
+        raise UnsupportedFormat(f"{fmt} requires the optional package '{package._name}' to be installed")
+
+
+# ---------------------------------------------------------------------------
+# msgpack: un mapa por tabla, cada columna como lista o como array tipado
+#     {"dtype": "<f8", "data": <bin con los bytes little-endian>}
+# Los arrays tipados se leen con np.frombuffer, sin crear un objeto Python por elemento.
+# ---------------------------------------------------------------------------
+
+def _msgpack_column(value) -> np.ndarray:
+    if isinstance(value, dict) and "dtype" in value and "data" in value:
+        dtype = np.dtype(value["dtype"])
+        if dtype.kind not in "biuf":
+            raise ValueError(f"Unsupported column dtype {value['dtype']!r}")
+        return np.frombuffer(value["data"], dtype=dtype)
+    if isinstance(value, list):
+        return np.asarray(value)
+    raise ValueError("Columns must be lists or typed arrays")
+
+
+def _msgpack_value(value):
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "biuf":
+            array = value.astype(value.dtype.newbyteorder("<"), copy=False)
+            return {"dtype": array.dtype.str, "data": array.tobytes()}
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: _msgpack_value(v) for k, v in value.items()}
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Arrow IPC: una tabla por stream; varias tablas van como streams concatenados en el
+# cuerpo, en el orden que define cada endpoint. Los escalares de la request (p. ej.
+# zone_set_id) van en la metadata del esquema del primer stream.
+# ---------------------------------------------------------------------------
+
+def _arrow_column(column) -> np.ndarray:
+    if pa.types.is_timestamp(column.type):
+        # Se descarta la zona horaria: to_numpy devuelve UTC
+        return column.to_numpy(zero_copy_only=False)
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        raise ValueError("Nested columns must be read with ragged_coordinates")
+    return column.to_numpy(zero_copy_only=False)
+
+
+def _read_arrow_streams(body: bytes) -> List:
+    source = pa.BufferReader(body)
+    tables = []
+    while source.tell() < source.size():
+        reader = pa.ipc.open_stream(source)
+        tables.append(reader.read_all())
+    return tables
+
+
+def decode_tables(body: bytes, fmt: str, names: Tuple[str, ...]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """
+    Decodifica un cuerpo binario en tablas columnares.
+    :param names: tablas esperadas, en orden (p. ej. ("sessions", "zones")).
+    :return: ({tabla: {columna: ndarray o pyarrow.Array para las anidadas}}, {escalar: str})
+    """
+    try:
+        if fmt == MSGPACK:
+            payload = msgpack.unpackb(body, raw=False)
+            if not isinstance(payload, dict):
+                raise ValueError("msgpack body must be a map")
+            tables = {}
+            for name in names:
+                table = payload.get(name)
+                if not isinstance(table, dict):
+                    raise ValueError(f"Missing table {name!r}")
+                tables[name] = {column: (value if column in _NESTED else _msgpack_column(value))
+                                for column, value in table.items()}
+            meta = {k: v for k, v in payload.items() if k not in names and v is not None}
+            return tables, meta
+
+        if fmt == ARROW:
+            streams = _read_arrow_streams(body)
+            if len(streams) != len(names):
+                raise ValueError(f"Expected {len(names)} Arrow stream(s) ({', '.join(names)}), got {len(streams)}")
+            tables = {}
+            for name, table in zip(names, streams):
+                tables[name] = {
+                    column: (table.column(column).combine_chunks() if column in _NESTED
+                             else _arrow_column(table.column(column)))
+                    for column in table.column_names
+                }
+            metadata = streams[0].schema.metadata or {}
+            meta = {k.decode(): v.decode() for k, v in metadata.items()}
+            return tables, meta
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid {fmt} body: {str(e) or type(e).__name__}") from e
+    except Exception as e:
+        # Errores propios de msgpack/pyarrow (cuerpo truncado o corrupto)
+        raise ValueError(f"Invalid {fmt} body: {type(e).__name__}: {e}") from e
+
+    raise UnsupportedFormat(f"Cannot decode {fmt}")
+
+
+def ragged_coordinates(table: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Polígonos de una tabla de zonas como (offsets, coords): los vértices de la fila i son
+    coords[offsets[i]:offsets[i + 1]], con coords de forma (V, 2) en orden (lon, lat).
+    Acepta, según el formato:
+        - Arrow: columna "polygon" de tipo list<fixed_size_list<double, 2>> o list<list<double>>
+        - msgpack: columnas "polygon_offsets" (N + 1 enteros) y "polygon_coords" (2V floats intercalados),
+          o una columna "polygon" con una lista de pares por fila.
+    """
+    if "polygon_offsets" in table and "polygon_coords" in table:
+        offsets = np.asarray(table["polygon_offsets"], dtype=np.int64)
+        coords = np.asarray(table["polygon_coords"], dtype=np.float64).reshape(-1, 2)
+    else:
+        polygon = table.get("polygon")
+        if polygon is None:
+            raise ValueError("Zones need a polygon column")
+        if isinstance(polygon, list):
+            offsets = np.zeros(len(polygon) + 1, dtype=np.int64)
+            np.cumsum([len(p) for p in polygon], out=offsets[1:])
+            coords = (np.asarray([xy for p in polygon for xy in p], dtype=np.float64).reshape(-1, 2)
+                      if offsets[-1] else np.empty((0, 2)))
+        else:
+            offsets = polygon.offsets.to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+            vertices = polygon.values
+            if pa.types.is_fixed_size_list(vertices.type):
+                if vertices.type.list_size != 2:
+                    raise ValueError("Polygon vertices must have 2 coordinates")
+            elif not np.all(np.diff(vertices.offsets.to_numpy(zero_copy_only=False)) == 2):
+                raise ValueError("Polygon vertices must have 2 coordinates")
+            coords = vertices.flatten().to_numpy(zero_copy_only=False).astype(np.float64, copy=False).reshape(-1, 2)
+            # Un list array puede ser una porción de otro: los offsets no necesariamente empiezan en 0
+            coords = coords[offsets[0]:offsets[-1]] if len(offsets) else coords[:0]
+            offsets = offsets - (offsets[0] if len(offsets) else 0)
+
+    if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(coords) \
+            or np.any(np.diff(offsets) < 3):
+        raise ValueError("Every polygon needs at least 3 vertices and offsets must match the coordinates")
+    return offsets, coords
+
+
+def column(table: Dict, name: str, dtype, n: Optional[int] = None) -> np.ndarray:
+    """
+    Columna obligatoria convertida a dtype, validando el largo si se pasa n.
+    """
+    if name not in table:
+        raise ValueError(f"Missing column {name!r}")
+    try:
+        values = np.asarray(table[name]).astype(dtype, copy=False)
+    except (TypeError, ValueError):
+        raise ValueError(f"Column {name!r} must be {np.dtype(dtype).name}")
+    if values.ndim != 1:
+        raise ValueError(f"Column {name!r} must be 1-D")
+    if n is not None and len(values) != n:
+        raise ValueError(f"Column {name!r} has {len(values)} rows, expected {n}")
+    return values
+
+
+def timestamp_column(table: Dict, name: str, n: Optional[int] = None) -> np.ndarray:
+    """
+    Timestamps como datetime64[us]. Acepta una columna timestamp de Arrow o enteros con
+    microsegundos desde epoch (UTC).
+    """
+    if name not in table:
+        raise ValueError(f"Missing column {name!r}")
+    values = np.asarray(table[name])
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype("datetime64[us]")
+    elif np.issubdtype(values.dtype, np.integer):
+        values = values.astype(np.int64, copy=False).astype("datetime64[us]")
+    else:
+        raise ValueError(f"Column {name!r} must be a timestamp or int64 epoch microseconds")
+    if values.ndim != 1 or (n is not None and len(values) != n):
+        raise ValueError(f"Column {name!r} must be 1-D with {n} rows")
+    return values
+
+
+def encode_table(columns: Dict, fmt: str, extra: Optional[Dict] = None) -> bytes:
+    """
+    Codifica una tabla columnar (dict de columnas del mismo largo) en msgpack o Arrow IPC.
+    En msgpack los arrays numéricos van como arrays tipados y `extra` se agrega al mapa;
+    en Arrow `extra` va en la metadata del esquema.
+    """
+    if fmt == MSGPACK:
+        payload = {"result": _msgpack_value(columns)}
+        if extra:
+            payload.update(extra)
+        return msgpack.packb(payload, use_bin_type=True)
+
+    if fmt == ARROW:
+        metadata = {k: str(v) for k, v in (extra or {}).items()}
+        table = pa.table({k: _arrow_array(v) for k, v in columns.items()}, metadata=metadata or None)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    raise UnsupportedFormat(f"Cannot encode {fmt}")
+
+
+def _arrow_array(values: Iterable):
+    if isinstance(values, np.ndarray):
+        return pa.array(values)
+    # Listas con None (p. ej. zone_val sin zona) quedan como nulls
+    return pa.array(list(values))
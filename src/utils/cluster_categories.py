@@ -0,0 +1,44 @@
+import numpy as np
+from typing import Dict, Optional
+
+NOISE = "ruido"
+MAIN = "principal"
+SECONDARY = "secundario"
+
+
+def main_cluster(labels: np.ndarray) -> Optional[int]:
+    """
+    Cluster principal: el más frecuente, excluyendo ruido (-1); ante empates, el que aparece primero
+    en labels. None si todas las sesiones son ruido.
+    """
+    labels = np.asarray(labels)
+    clustered = labels[labels != -1]
+    if len(clustered) == 0:
+        return None
+    ids, first, counts = np.unique(clustered, return_index=True, return_counts=True)
+    tied = counts == counts.max()
+    return int(ids[tied][np.argmin(first[tied])])
+
+
+def category(cluster_id: int, is_main_cluster: bool) -> str:
+    # Categoría de una sesión a partir de su cluster
+    if cluster_id == -1:
+        return NOISE
+    return MAIN if is_main_cluster else SECONDARY
+
+
+def categorize_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    Categoría (ruido / principal / secundario) de cada etiqueta, vectorizado.
+    """
+    labels = np.asarray(labels)
+    return np.where(labels == -1, NOISE, np.where(labels == main_cluster(labels), MAIN, SECONDARY))
+
+
+def category_counts(labels: np.ndarray) -> Dict[str, int]:
+    # Cantidad de sesiones por categoría
+    labels = np.asarray(labels)
+    main = main_cluster(labels)
+    noise = int((labels == -1).sum())
+    principal = 0 if main is None else int((labels == main).sum())
+    return {MAIN: principal, SECONDARY: len(labels) - noise - principal, NOISE: noise}
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Union
+
+
+class ClusterResultCache:
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: Optional[float] = 3600):
+        """
+        Cache LRU con TTL de resultados de clustering por usuario, con single-flight: si varias
+        requests piden la misma clave mientras se calcula, todas esperan el mismo cálculo.
+        La clave es (user_id, versión del conjunto de sesiones, parámetros); una sesión nueva cambia
+        la versión, e invalidate(user_id) además descarta lo cacheado y lo que esté en curso.
+        :param max_entries: cantidad máxima de resultados en cache.
+        :param ttl_seconds: tiempo de vida de cada resultado desde que se calculó (None = sin TTL).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, compute_s, result)
+        self._user_keys: Dict[Any, set] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.compute_s = 0.0
+        self.saved_compute_s = 0.0
+
+    async def get_or_compute(self, user_id, version, params: Tuple,
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Devuelve el resultado cacheado para (user_id, version, params) o lo calcula con await compute().
+        Debe llamarse desde el event loop. Los errores de compute() no se cachean y llegan a todos
+        los que esperaban ese cálculo.
+        """
+        key = (user_id, version, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, compute_s, result = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_compute_s += compute_s
+                    return result
+                self._remove(key)
+                self.expirations += 1
+
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                task = asyncio.ensure_future(self._compute(key, compute))
+                self._inflight[key] = task
+
+        # shield: si una request se cancela (cliente desconectado), el cálculo sigue para las demás
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        start = time.monotonic()
+        try:
+            result = await compute()
+        except BaseException:
+            with self._lock:
+                if self._inflight.get(key) is asyncio.current_task():
+                    del self._inflight[key]
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.compute_s += elapsed
+            # Si el usuario se invalidó mientras se calculaba, el resultado se entrega pero no se guarda
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+                expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+                self._entries[key] = (expires_at, elapsed, result)
+                self._user_keys.setdefault(key[0], set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return result
+
+    def _remove(self, key):
+        # Debe llamarse con el lock tomado
+        del self._entries[key]
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def invalidate(self, user_id):
+        """
+        Descarta los resultados del usuario y desvincula los cálculos en curso: quienes ya esperan
+        reciben ese resultado, pero las próximas requests calculan de nuevo.
+        """
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+            for key in [k for k in self._inflight if k[0] == user_id]:
+                del self._inflight[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._inflight.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "compute_s": self.compute_s,
+                "saved_compute_s": self.saved_compute_s
+            }
@@ -1,17 +1,40 @@
-from sklearn.cluster import DBSCAN
 import numpy as np
-from typing import List, Dict, Union
-from collections import Counter
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Union
+from src.utils.cluster_categories import main_cluster
+from src.utils.lazy_imports import LazyModule
+from src.utils.stage_metrics import stage_metrics
+
+if TYPE_CHECKING:
+    from sklearn.neighbors import BallTree
+
+# scikit-learn y SciPy se importan en el primer uso (ver src/services/warmup.py)
+sk_cluster = LazyModule("sklearn.cluster")
+sk_neighbors = LazyModule("sklearn.neighbors")
+sparse = LazyModule("scipy.sparse")
+csgraph = LazyModule("scipy.sparse.csgraph")
 
 
 class GeoClusterAnalyzer:
-    def __init__(self, eps_km: float = 20, min_samples: int = 3):
+    def __init__(self, eps_km: float = 20, min_samples: int = 3,
+                 large_input_threshold: Optional[int] = 50_000, chunk_pairs: int = 2_000_000,
+                 dedup_decimals: Optional[int] = None):
         """
         eps_km: distancia máxima en kilómetros para considerar puntos vecinos
         min_samples: cantidad mínima de puntos para formar un cluster
+        large_input_threshold: a partir de esta cantidad de sesiones se usa el modo de entrada grande
+            (None para usar siempre DBSCAN directo)
+        chunk_pairs: máximo de pares vecinos por bloque de consulta en el modo de entrada grande
+            (acota el pico de memoria)
+        dedup_decimals: si se define, las coordenadas se redondean a esta cantidad de decimales antes
+            de deduplicar (5 decimales ~ 1 m). Con None solo se agrupan coordenadas idénticas y las
+            etiquetas son exactamente las de DBSCAN directo.
         """
+        self.eps_km = eps_km
         self.eps_rad = eps_km / 6371  # Conversión a radianes
         self.min_samples = min_samples
+        self.large_input_threshold = large_input_threshold
+        self.chunk_pairs = chunk_pairs
+        self.dedup_decimals = dedup_decimals
 
     def analyze_sessions(self, sessions: List[Dict[str, Union[str, float]]]) -> List[Dict[str, Union[str, int, bool]]]:
         """
@@ -26,34 +49,171 @@ class GeoClusterAnalyzer:
                 - cluster_id: int
                 - is_main_cluster: bool
         """
-        if len(sessions) < self.min_samples:
-            raise ValueError("Not enough sessions to perform clustering.")
-
-        # Extraer coordenadas geográficas
-        coords = [[s["latitude"], s["longitude"]] for s in sessions]
-        coords_rad = np.radians(coords)
+        labels = self.fit_labels(sessions)
+        return self._build_result([s["session_id"] for s in sessions], labels)
 
-        # Ejecutar DBSCAN con distancia haversine
-        clustering = DBSCAN(
-            eps=self.eps_rad,
-            min_samples=self.min_samples,
-            metric="haversine"
-        ).fit(coords_rad)
-
-        labels = clustering.labels_
+    def analyze_arrays(self, session_ids, latitudes, longitudes) -> List[Dict[str, Union[str, int, bool]]]:
+        """
+        Igual que analyze_sessions pero recibe columnas (arrays de NumPy o listas) en lugar de dicts,
+        por ejemplo las de SessionHistoryStore.
+        """
+        coords = np.column_stack([
+            np.asarray(latitudes, dtype=np.float64),
+            np.asarray(longitudes, dtype=np.float64)
+        ])
+        labels = self.fit_labels_radians(np.radians(coords))
+        return self._build_result(np.asarray(session_ids).tolist(), labels)
 
+    @staticmethod
+    def _build_result(session_ids, labels: np.ndarray) -> List[Dict[str, Union[str, int, bool]]]:
         # Identificar el cluster más frecuente (excluyendo outliers -1)
-        cluster_counts = Counter(label for label in labels if label != -1)
-        main_cluster = cluster_counts.most_common(1)[0][0] if cluster_counts else None
+        main = main_cluster(labels)
 
         # Construir resultado final
         result = []
-        for i, s in enumerate(sessions):
-            cluster_id = int(labels[i])
+        for session_id, cluster_id in zip(session_ids, labels.tolist()):
             result.append({
-                "session_id": str(s["session_id"]),
+                "session_id": str(session_id),
                 "cluster_id": cluster_id,
-                "is_main_cluster": bool(cluster_id == main_cluster)
+                "is_main_cluster": bool(cluster_id == main)
             })
 
         return result
+
+    def fit_labels(self, sessions: List[Dict[str, Union[str, float]]]) -> np.ndarray:
+        """
+        Ejecuta DBSCAN y retorna solo las etiquetas de cluster (-1 para ruido), en el orden de sessions.
+        """
+        if len(sessions) < self.min_samples:
+            raise ValueError("Not enough sessions to perform clustering.")
+
+        # Extraer coordenadas geográficas
+        coords = [[s["latitude"], s["longitude"]] for s in sessions]
+        return self.fit_labels_radians(np.radians(coords))
+
+    def fit_labels_radians(self, coords_rad: np.ndarray) -> np.ndarray:
+        """
+        Igual que fit_labels pero sobre un array (N, 2) de [lat, lon] ya convertido a radianes.
+        """
+        if len(coords_rad) < self.min_samples:
+            raise ValueError("Not enough sessions to perform clustering.")
+
+        if self.large_input_threshold is not None and len(coords_rad) >= self.large_input_threshold:
+            with stage_metrics.span("cluster.dbscan_fit_large"):
+                return self.fit_labels_large(coords_rad)
+
+        # Ejecutar DBSCAN con distancia haversine
+        with stage_metrics.span("cluster.dbscan_fit"):
+            clustering = sk_cluster.DBSCAN(
+                eps=self.eps_rad,
+                min_samples=self.min_samples,
+                metric="haversine"
+            ).fit(coords_rad)
+
+        return clustering.labels_
+
+    def fit_labels_large(self, coords_rad: np.ndarray) -> np.ndarray:
+        """
+        Modo de entrada grande de fit_labels_radians (cientos de miles o millones de puntos):
+            1. Deduplica coordenadas y usa la multiplicidad como peso de cada punto.
+            2. Agrupa los puntos únicos en celdas de grilla de tamaño eps_km y arma bloques de
+               consulta celda por celda, con a lo sumo chunk_pairs pares vecinos por bloque.
+            3. Consulta un BallTree haversine explícito bloque a bloque: primero para marcar los
+               puntos núcleo, luego para unir los núcleos vecinos en clusters y por último para
+               asignar los puntos borde. Nunca se materializa el grafo completo de vecinos.
+        Reproduce el recorrido de DBSCAN (clusters numerados por su primer núcleo y cada punto
+        borde en el menor cluster vecino), así que las etiquetas son las mismas que con DBSCAN
+        directo cuando dedup_decimals es None.
+        """
+        points, weights, inverse = self._deduplicate(np.asarray(coords_rad, dtype=np.float64))
+        n = len(points)
+        tree = sk_neighbors.BallTree(points, metric="haversine")
+        blocks = self._query_blocks(tree, points)
+
+        # Núcleos: peso total del vecindario (incluido el propio punto) >= min_samples
+        core = np.zeros(n, dtype=bool)
+        for block in blocks:
+            starts, cols = self._flatten(tree.query_radius(points[block], r=self.eps_rad))
+            core[block] = np.add.reduceat(weights[cols], starts) >= self.min_samples
+
+        # Componentes conexas entre núcleos vecinos
+        component = np.arange(n)
+        for block in blocks:
+            block_cores = block[core[block]]
+            if len(block_cores) == 0:
+                continue
+            starts, cols = self._flatten(tree.query_radius(points[block_cores], r=self.eps_rad))
+            rows = np.repeat(block_cores, np.diff(np.append(starts, len(cols))))
+            linked = core[cols]
+            edges = sparse.coo_matrix(
+                (np.ones(int(linked.sum()), dtype=np.int8), (component[rows[linked]], component[cols[linked]])),
+                shape=(n, n)
+            )
+            _, merged = csgraph.connected_components(edges, directed=False)
+            component = merged[component]
+
+        # Numeración de DBSCAN: los clusters se ordenan por su primer punto núcleo
+        labels = np.full(n, -1, dtype=np.int64)
+        core_idx = np.flatnonzero(core)
+        first_core = np.full(n, n, dtype=np.int64)
+        np.minimum.at(first_core, component[core_idx], core_idx)
+        roots = np.flatnonzero(first_core < n)
+        cluster_of_root = np.empty(n, dtype=np.int64)
+        cluster_of_root[roots[np.argsort(first_core[roots])]] = np.arange(len(roots))
+        labels[core_idx] = cluster_of_root[component[core_idx]]
+
+        # Puntos borde: el menor cluster entre sus vecinos núcleo
+        for block in blocks:
+            block_border = block[~core[block]]
+            if len(block_border) == 0:
+                continue
+            starts, cols = self._flatten(tree.query_radius(points[block_border], r=self.eps_rad))
+            # Los vecinos no núcleo cuentan como n para que no ganen el mínimo
+            neighbor_labels = np.where(core[cols], labels[cols], n)
+            best = np.minimum.reduceat(neighbor_labels, starts)
+            labels[block_border] = np.where(best < n, best, -1)
+
+        return labels[inverse]
+
+    @staticmethod
+    def _flatten(neighborhoods: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Concatena los vecindarios y devuelve el inicio de cada uno (ninguno es vacío: incluyen al propio punto)
+        lengths = np.fromiter((len(nbrs) for nbrs in neighborhoods), dtype=np.int64, count=len(neighborhoods))
+        starts = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return starts, np.concatenate(neighborhoods)
+
+    def _deduplicate(self, coords_rad: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Puntos únicos en orden de primera aparición (conserva la numeración de DBSCAN),
+        # cantidad de repeticiones e índice inverso
+        keys = coords_rad
+        if self.dedup_decimals is not None:
+            keys = np.round(np.degrees(coords_rad), self.dedup_decimals)
+        _, first, inverse, counts = np.unique(keys, axis=0, return_index=True,
+                                              return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        by_appearance = np.argsort(first)
+        rank = np.empty_like(by_appearance)
+        rank[by_appearance] = np.arange(len(by_appearance))
+        return coords_rad[first[by_appearance]], counts[by_appearance], rank[inverse]
+
+    def _grid_cells(self, coords_rad: np.ndarray) -> np.ndarray:
+        # Celda de grilla de lado eps (en radianes de latitud y longitud) codificada en un entero
+        rows = np.floor((coords_rad[:, 0] + np.pi / 2) / self.eps_rad).astype(np.int64)
+        cols = np.floor((coords_rad[:, 1] + np.pi) / self.eps_rad).astype(np.int64)
+        return rows * (int(2 * np.pi / self.eps_rad) + 2) + cols
+
+    def _query_blocks(self, tree: "BallTree", points: np.ndarray) -> List[np.ndarray]:
+        # Bloques de puntos en orden de celda de grilla, cortados para que ningún bloque
+        # devuelva más de chunk_pairs pares vecinos (un punto solo siempre forma un bloque)
+        n_pairs = tree.query_radius(points, r=self.eps_rad, count_only=True)
+        order = np.argsort(self._grid_cells(points), kind="stable")
+
+        blocks, start, pairs = [], 0, 0
+        for pos, count in enumerate(n_pairs[order].tolist()):
+            if pos > start and pairs + count > self.chunk_pairs:
+                blocks.append(order[start:pos])
+                start, pairs = pos, 0
+            pairs += count
+        blocks.append(order[start:])
+        return blocks
@@ -0,0 +1,257 @@
+import threading
+from typing import Dict, List, Optional, Set, Union
+import numpy as np
+from src.utils.cluster_categories import main_cluster
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer, sk_neighbors
+
+
+class IncrementalGeoClusterState:
+    BULK_THRESHOLD = 32  # Bloques más grandes se agregan reconstruyendo el estado completo
+
+    def __init__(self, eps_km: float = 20, min_samples: int = 3, verify_every: Optional[int] = 1000):
+        """
+        Estado de clustering DBSCAN (haversine) de un usuario, actualizado sesión a sesión.
+        Cada sesión nueva solo consulta su vecindario: actualiza la cantidad de vecinos,
+        detecta los puntos que pasan a ser núcleo y fusiona los clusters que quedan conectados.
+        Como las sesiones solo se agregan, los clusters crecen o se fusionan pero nunca se dividen.
+
+        eps_km: distancia máxima en kilómetros para considerar puntos vecinos
+        min_samples: cantidad mínima de puntos para formar un cluster
+        verify_every: cada cuántas sesiones se recalcula DBSCAN completo para verificar
+            que las etiquetas coinciden (None para desactivar)
+        """
+        self.eps_km = eps_km
+        self.eps_rad = eps_km / 6371  # Conversión a radianes
+        self.min_samples = min_samples
+        self.verify_every = verify_every
+
+        self.n = 0
+        self._coords = np.empty((64, 2), dtype=np.float64)  # [lat, lon] en radianes
+        self._counts = np.zeros(64, dtype=np.int64)
+        self._core = np.zeros(64, dtype=bool)
+        self._parent = np.arange(64)
+        self.session_ids: List[str] = []
+
+        # Para cada punto no núcleo: núcleos a menos de eps (vacío = ruido)
+        self._core_neighbors: Dict[int, Set[int]] = {}
+
+        self.verifications = 0
+        self.mismatches = 0
+        self._lock = threading.RLock()
+
+    def _grow(self):
+        capacity = len(self._counts) * 2
+        self._coords = np.resize(self._coords, (capacity, 2))
+        self._counts = np.resize(self._counts, capacity)
+        self._counts[self.n:] = 0
+        self._core = np.resize(self._core, capacity)
+        self._core[self.n:] = False
+        self._parent = np.resize(self._parent, capacity)
+
+    def _neighbors(self, index: int) -> np.ndarray:
+        # Misma fórmula haversine que usa sklearn para metric="haversine"
+        coords = self._coords[:self.n]
+        lat, lon = self._coords[index]
+        sin_lat = np.sin(0.5 * (lat - coords[:, 0]))
+        sin_lon = np.sin(0.5 * (lon - coords[:, 1]))
+        dist = 2 * np.arcsin(np.sqrt(sin_lat * sin_lat + np.cos(lat) * np.cos(coords[:, 0]) * sin_lon * sin_lon))
+        return np.flatnonzero(dist <= self.eps_rad)
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, a: int, b: int):
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            self._parent[max(ra, rb)] = min(ra, rb)
+
+    def add_session(self, session: Dict[str, Union[str, float]]) -> Dict[str, Union[str, int, bool]]:
+        """
+        Agrega una sesión ('session_id', 'latitude', 'longitude') al estado del usuario.
+        Retorna el resultado de la sesión nueva con el mismo formato que analyze_sessions.
+        """
+        with self._lock:
+            return self._add_session(session)
+
+    def _add_session(self, session: Dict[str, Union[str, float]]) -> Dict[str, Union[str, int, bool]]:
+        if self.n == len(self._counts):
+            self._grow()
+
+        p = self.n
+        self._coords[p] = np.radians([session["latitude"], session["longitude"]])
+        self._parent[p] = p
+        self.session_ids.append(str(session["session_id"]))
+        self.n += 1
+
+        neighbors = self._neighbors(p)
+        self._counts[neighbors] += 1
+        self._counts[p] = len(neighbors)
+
+        new_cores = neighbors[(self._counts[neighbors] >= self.min_samples) & ~self._core[neighbors]]
+        self._core[new_cores] = True
+        for q in new_cores.tolist():
+            self._core_neighbors.pop(q, None)
+
+        if not self._core[p]:
+            self._core_neighbors[p] = set(neighbors[self._core[neighbors]].tolist())
+
+        # Solo cambia la densidad alrededor de los nuevos núcleos: conectar sus vecindarios
+        for q in new_cores.tolist():
+            q_neighbors = neighbors if q == p else self._neighbors(q)
+            for r in q_neighbors.tolist():
+                if self._core[r]:
+                    self._union(q, r)
+                else:
+                    self._core_neighbors[r].add(q)
+
+        if self.verify_every and self.n % self.verify_every == 0:
+            self._verify()
+
+        labels = self.labels()
+        return self._result(labels, p, main_cluster(labels))
+
+    def add_sessions(self, session_ids, latitudes, longitudes):
+        """
+        Agrega un bloque de sesiones (p. ej. el historial de un usuario al crear su estado). Hasta
+        BULK_THRESHOLD sesiones se agregan de a una; con más, el estado se reconstruye con una sola
+        consulta de vecindario, como DBSCAN completo.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        session_ids = np.asarray(session_ids).tolist()
+        with self._lock:
+            if len(session_ids) <= self.BULK_THRESHOLD:
+                for session_id, lat, lon in zip(session_ids, latitudes.tolist(), longitudes.tolist()):
+                    self._add_session({"session_id": session_id, "latitude": lat, "longitude": lon})
+                return
+
+            end = self.n + len(session_ids)
+            while end > len(self._counts):
+                self._grow()
+            self._coords[self.n:end] = np.radians(np.column_stack([latitudes, longitudes]))
+            self.session_ids.extend(str(session_id) for session_id in session_ids)
+            self.n = end
+            self._resync()
+
+    def labels(self) -> np.ndarray:
+        """
+        Etiquetas actuales, numeradas igual que sklearn: los clusters se ordenan por su
+        primer punto núcleo y cada punto borde toma el menor cluster vecino.
+        """
+        n = self.n
+        labels = np.full(n, -1, dtype=np.int64)
+        core_idx = np.flatnonzero(self._core[:n])
+        if len(core_idx) == 0:
+            return labels
+
+        # Compresión de caminos vectorizada: cada núcleo apunta directo a su raíz
+        parent = self._parent[:n]
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent[:] = grandparent
+        roots = parent[core_idx]
+        # Las raíces son el menor índice de cada componente, así que ordenarlas da la numeración de sklearn
+        _, canonical = np.unique(roots, return_inverse=True)
+        labels[core_idx] = canonical
+        for i, cores in self._core_neighbors.items():
+            if cores:
+                labels[i] = min(labels[c] for c in cores)
+        return labels
+
+    def _result(self, labels: np.ndarray, i: int, main: Optional[int]) -> Dict[str, Union[str, int, bool]]:
+        cluster_id = int(labels[i])
+        return {
+            "session_id": self.session_ids[i],
+            "cluster_id": cluster_id,
+            "is_main_cluster": bool(cluster_id == main)
+        }
+
+    def result(self, index: int) -> Dict[str, Union[str, int, bool]]:
+        """
+        Resultado actual de la sesión en la posición index (en orden de llegada), con el mismo formato
+        que analyze_sessions.
+        """
+        with self._lock:
+            labels = self.labels()
+            return self._result(labels, index, main_cluster(labels))
+
+    def index_of(self, session_id) -> Optional[int]:
+        """
+        Posición de la última sesión agregada con session_id, o None. Busca desde el final, así que
+        es inmediato para una sesión recién agregada.
+        """
+        target = str(session_id)
+        with self._lock:
+            for i in range(self.n - 1, -1, -1):
+                if self.session_ids[i] == target:
+                    return i
+        return None
+
+    def results(self) -> List[Dict[str, Union[str, int, bool]]]:
+        """
+        Resultado de todas las sesiones del usuario, con el mismo formato que analyze_sessions.
+        """
+        with self._lock:
+            labels = self.labels()
+            main = main_cluster(labels)
+            return [self._result(labels, i, main) for i in range(self.n)]
+
+    def reconfigure(self, eps_km: float, min_samples: int):
+        """
+        Cambia los parámetros y reconstruye el estado con las sesiones ya agregadas.
+        """
+        with self._lock:
+            self.eps_km = eps_km
+            self.eps_rad = eps_km / 6371
+            self.min_samples = min_samples
+            if self.n > 0:
+                self._resync()
+
+    def verify(self) -> bool:
+        """
+        Recalcula DBSCAN completo sobre todas las sesiones y compara las etiquetas.
+        Si no coinciden (p. ej. por redondeo justo en el límite de eps) se adopta el resultado completo.
+        """
+        with self._lock:
+            return self._verify()
+
+    def _verify(self) -> bool:
+        self.verifications += 1
+        if self.n < self.min_samples:
+            return True
+
+        analyzer = GeoClusterAnalyzer(eps_km=self.eps_km, min_samples=self.min_samples)
+        batch_labels = analyzer.fit_labels_radians(self._coords[:self.n])
+
+        if np.array_equal(batch_labels, self.labels()):
+            return True
+
+        self.mismatches += 1
+        self._resync()
+        return False
+
+    def _resync(self):
+        # Reconstruye vecinos, núcleos y conexiones con la misma consulta de vecindario que usa DBSCAN
+        n = self.n
+        neighborhoods = sk_neighbors.NearestNeighbors(radius=self.eps_rad, metric="haversine").fit(
+            self._coords[:n]
+        ).radius_neighbors(self._coords[:n], return_distance=False)
+
+        self._counts[:n] = [len(nbrs) for nbrs in neighborhoods]
+        self._core[:n] = self._counts[:n] >= self.min_samples
+        self._parent[:n] = np.arange(n)
+        self._core_neighbors = {}
+
+        for i, nbrs in enumerate(neighborhoods):
+            core_nbrs = nbrs[self._core[nbrs]]
+            if self._core[i]:
+                for j in core_nbrs.tolist():
+                    self._union(i, j)
+            else:
+                self._core_neighbors[i] = set(core_nbrs.tolist())
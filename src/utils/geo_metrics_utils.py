@@ -1,21 +1,99 @@
 from math import radians, sin, cos, sqrt, atan2
-from typing import Dict, Union
+from typing import Dict, List, Sequence, Union
 from datetime import datetime, timedelta
+import numpy as np
 
 
 class GeoMetricsUtils:
+    EARTH_RADIUS_KM = 6371  # Radio de la Tierra en km
+
     @staticmethod
     def haversine_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """
         Calcula la distancia entre dos puntos geográficos usando la fórmula de Haversine (en km).
         """
-        R = 6371  # Radio de la Tierra en km
+        R = GeoMetricsUtils.EARTH_RADIUS_KM
         dlat = radians(lat2 - lat1)
         dlon = radians(lon2 - lon1)
         a = sin(dlat / 2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2)**2
         c = 2 * atan2(sqrt(a), sqrt(1 - a))
         return R * c
 
+    @staticmethod
+    def haversine_distance_km_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+        """
+        Versión vectorizada de haversine_distance_km sobre arrays de NumPy (con broadcasting).
+        Usa la misma fórmula que la versión escalar, por lo que los resultados coinciden.
+        """
+        lat1 = np.asarray(lat1, dtype=np.float64)
+        lon1 = np.asarray(lon1, dtype=np.float64)
+        lat2 = np.asarray(lat2, dtype=np.float64)
+        lon2 = np.asarray(lon2, dtype=np.float64)
+
+        dlat = np.radians(lat2 - lat1)
+        dlon = np.radians(lon2 - lon1)
+        a = np.sin(dlat / 2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon / 2)**2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return GeoMetricsUtils.EARTH_RADIUS_KM * c
+
+    @staticmethod
+    def timestamps_to_seconds(timestamps) -> np.ndarray:
+        """
+        Convierte timestamps a segundos (float64) para poder restarlos en bloque.
+        Acepta un array datetime64, un array numérico (segundos epoch) o una secuencia de datetime.
+        Las secuencias de datetime se expresan relativas al primer elemento, de modo que
+        la diferencia entre pares es la misma que con t2 - t1 (con o sin zona horaria).
+        """
+        if isinstance(timestamps, np.ndarray):
+            if np.issubdtype(timestamps.dtype, np.datetime64):
+                return timestamps.astype("datetime64[us]").astype(np.int64) / 1e6
+            if np.issubdtype(timestamps.dtype, np.number):
+                return timestamps.astype(np.float64)
+
+        timestamps = list(timestamps)
+        if not timestamps:
+            return np.empty(0, dtype=np.float64)
+        if not all(isinstance(t, datetime) for t in timestamps):
+            raise ValueError("Timestamps must be datetime.datetime objects")
+
+        t0 = timestamps[0]
+        try:
+            return np.fromiter(((t - t0).total_seconds() for t in timestamps),
+                               dtype=np.float64, count=len(timestamps))
+        except TypeError:
+            raise ValueError("Timestamps must be all naive or all timezone-aware")
+
+    @staticmethod
+    def compare_session_arrays(timestamps, latitudes, longitudes) -> Dict[str, np.ndarray]:
+        """
+        Compara en una sola pasada vectorizada cada par de sesiones consecutivas.
+        Parámetros:
+            timestamps: datetime64, segundos epoch o secuencia de datetime (N elementos)
+            latitudes, longitudes: arrays o listas de N floats
+        Retorna un dict de arrays de N - 1 elementos (sin redondear):
+            - distance_km
+            - time_diff_hour
+            - velocity_kmh (0.0 cuando la diferencia de tiempo no es positiva)
+        """
+        seconds = GeoMetricsUtils.timestamps_to_seconds(timestamps)
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+
+        if not (seconds.shape == lat.shape == lon.shape) or lat.ndim != 1:
+            raise ValueError("timestamps, latitudes and longitudes must be 1-D and of equal length")
+
+        distance = GeoMetricsUtils.haversine_distance_km_array(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        hours = np.diff(seconds) / 3600
+
+        velocity = np.zeros_like(distance)
+        np.divide(distance, hours, out=velocity, where=hours > 0)
+
+        return {
+            "distance_km": distance,
+            "time_diff_hour": hours,
+            "velocity_kmh": velocity
+        }
+
     @staticmethod
     def compare_sessions(session1: Dict[str, Union[str, float, datetime]],
                          session2: Dict[str, Union[str, float, datetime]]) -> Dict[str, Union[str, float, timedelta]]:
@@ -58,4 +136,41 @@ class GeoMetricsUtils:
             "velocity_kmh": round(velocity, 2),
             "time_diff_hour": hours,
             "distance_km": round(distance, 3)
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def compare_session_list(sessions: Sequence[Dict[str, Union[str, float, datetime]]]) -> List[Dict[str, Union[int, float]]]:
+        """
+        Compara cada par de sesiones consecutivas de una lista, en el orden recibido.
+        Cada sesión tiene el mismo formato que en compare_sessions ("user_id" es opcional).
+        Retorna una lista de N - 1 dicts con el mismo formato que compare_sessions.
+        """
+        if len(sessions) < 2:
+            raise ValueError("At least two sessions are required to compare.")
+
+        metrics = GeoMetricsUtils.compare_session_arrays(
+            [s["datetime"] for s in sessions],
+            [s["latitude"] for s in sessions],
+            [s["longitude"] for s in sessions]
+        )
+        velocities = metrics["velocity_kmh"].tolist()
+        hours = metrics["time_diff_hour"].tolist()
+        distances = metrics["distance_km"].tolist()
+
+        result = []
+        for i in range(len(sessions) - 1):
+            s1, s2 = sessions[i], sessions[i + 1]
+            pair = {
+                "from_id": int(s1["session_id"]),
+                "to_id": int(s2["session_id"]),
+                "lat_new": s2["latitude"],
+                "lon_new": s2["longitude"],
+                "velocity_kmh": round(velocities[i], 2),
+                "time_diff_hour": hours[i],
+                "distance_km": round(distances[i], 3)
+            }
+            if "user_id" in s2:
+                pair = {"user_id": int(s2["user_id"]), **pair}
+            result.append(pair)
+
+        return result
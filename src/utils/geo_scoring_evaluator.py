@@ -1,48 +1,101 @@
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 from datetime import timedelta
-from shapely.geometry import Point, Polygon
+import numpy as np
+from src.utils.geo_zone_index import PreparedZoneSet
+from src.utils.zone_lookup_table import ZoneLookupTable
+from src.utils.lazy_imports import LazyModule
+
+if TYPE_CHECKING:
+    from shapely.geometry import Point, Polygon
+
+shapely = LazyModule("shapely")
 
 
 class GeoScoringEvaluator:
-    def __init__(self, max_allowed_distance_km: float = 2.0, relative_tolerance: float = 0.3):
+    # Margen para comparar cotas superiores contra scores exactos sin perder empates por redondeo
+    BOUND_EPSILON = 1e-12
+    DEFAULT_WEIGHTS = {"geo": 0.85, "velocity": 0.05, "time": 0.05, "distance": 0.05}
+
+    def __init__(self, max_allowed_distance_km: float = 2.0, relative_tolerance: float = 0.3,
+                 early_exit: bool = False, early_exit_min_candidates: int = 8,
+                 weights: Optional[Dict[str, float]] = None, lookup_cell_km: Optional[float] = None,
+                 lookup_approximate: bool = True):
         """
         Clase evaluadora de sesiones basada en zonas frecuentes.
         :param max_allowed_distance_km: distancia máxima para considerar una zona como relevante.
         :param relative_tolerance: tolerancia usada para penalizar desviaciones en métricas.
+        :param early_exit: con un PreparedZoneSet, evalúa las zonas candidatas en orden de cota
+            superior del score y corta cuando ninguna de las restantes puede superar a la mejor.
+            El resultado es el mismo que recorriendo todas las zonas.
+        :param early_exit_min_candidates: por debajo de esta cantidad de zonas candidatas se
+            evalúan todas, sin calcular cotas.
+        :param weights: peso de cada componente del score ("geo", "velocity", "time", "distance");
+            por defecto DEFAULT_WEIGHTS. Deben ser no negativos.
+        :param lookup_cell_km: con un PreparedZoneSet, resuelve el score geográfico con una
+            ZoneLookupTable de celdas de este lado (construida una vez por conjunto de zonas) y usa
+            Shapely solo en las celdas de borde. None = desactivado.
+        :param lookup_approximate: si la tabla también resuelve las celdas fuera de las zonas pero
+            dentro del rango, con el score del centro de la celda. El error del score queda acotado
+            por peso "geo" × media diagonal de celda / max_allowed_distance_km (ver ZoneLookupTable).
         """
         self.max_dist_km = max_allowed_distance_km
         self.tolerance = relative_tolerance
+        self.early_exit = early_exit
+        self.early_exit_min_candidates = early_exit_min_candidates
+
+        weights = {**self.DEFAULT_WEIGHTS, **(weights or {})}
+        if set(weights) != set(self.DEFAULT_WEIGHTS) or any(w < 0 for w in weights.values()):
+            raise ValueError("weights must be non-negative and only include geo, velocity, time and distance")
+        self.weights = weights
+        self.w_geo = weights["geo"]
+        self.w_velocity = weights["velocity"]
+        self.w_time = weights["time"]
+        self.w_distance = weights["distance"]
+        if lookup_cell_km is not None and lookup_cell_km <= 0:
+            raise ValueError("lookup_cell_km must be positive")
+        self.lookup_cell_km = lookup_cell_km
+        self.lookup_approximate = lookup_approximate
+
+    def prepare_zones(self, frequent_zones: List[Dict]) -> PreparedZoneSet:
+        """
+        Construye un PreparedZoneSet reutilizable a partir de una lista de zonas frecuentes.
+        """
+        return PreparedZoneSet(frequent_zones)
 
-    def evaluate_session(self, new_session: Dict, frequent_zones: List[Dict]) -> Dict:
+    def evaluate_session(self, new_session: Dict, frequent_zones: Union[List[Dict], PreparedZoneSet]) -> Dict:
         """
         Evalúa la nueva sesión comparándola con zonas frecuentes.
         :param new_session: diccionario con lat, lon, velocity_kmh, time_diff, distance_km
-        :param frequent_zones: lista de zonas con "geometry" (Polygon) y "metrics" (dict)
+        :param frequent_zones: lista de zonas con "geometry" (Polygon) y "metrics" (dict),
+            o un PreparedZoneSet (solo se evalúan las zonas candidatas del índice espacial)
         :return: diccionario con score, zone_val y si se encontró zone_match.
         """
-        point = Point(new_session["lon"], new_session["lat"])
-        best_score = 0.0
-        best_zone_id = None
+        if self.lookup_cell_km is not None and isinstance(frequent_zones, PreparedZoneSet):
+            result = self.evaluate_session_lookup(new_session, frequent_zones)
+            if result is not None:
+                return result
 
-        for zone in frequent_zones:
-            geom: Polygon = zone["geometry"]
-            metrics = zone.get("metrics", {})
+        point = shapely.Point(new_session["lon"], new_session["lat"])
 
-            if geom.contains(point):
-                score_geo = 1.0
-            else:
-                distance_km = geom.distance(point) * 111  # grados a km
-                if distance_km > self.max_dist_km:
-                    continue
-                score_geo = max(0.0, 1 - distance_km / self.max_dist_km)
+        if self.early_exit and isinstance(frequent_zones, PreparedZoneSet):
+            return self.evaluate_session_early_exit(new_session, point, frequent_zones)
 
-            # Comparar métricas individuales
-            score_vel = self.compare_metric(new_session.get("velocity_kmh"), metrics.get("velocity_mean_kmh"))
-            score_time = self.compare_metric(new_session.get("time_diff_hour"), metrics.get("time_mean_hour"))
-            score_dist = self.compare_metric(new_session.get("distance_km"), metrics.get("distance_mean_km"))
+        if isinstance(frequent_zones, PreparedZoneSet):
+            candidates = frequent_zones.candidates(new_session["lon"], new_session["lat"], self.max_dist_km)
+            zones = (frequent_zones.zone(i) for i in candidates)
+        else:
+            zones = frequent_zones
 
-            # Score ponderado
-            total_score = 0.85 * score_geo + 0.05 * score_vel + 0.05 * score_time + 0.05 * score_dist
+        return self._best_zone(new_session, point, zones)
+
+    def _best_zone(self, new_session: Dict, point: "Point", zones) -> Dict:
+        best_score = 0.0
+        best_zone_id = None
+
+        for zone in zones:
+            total_score = self.score_zone(new_session, point, zone)
+            if total_score is None:
+                continue
 
             if total_score > best_score:
                 best_score = total_score
@@ -54,6 +107,241 @@ class GeoScoringEvaluator:
             "zone_match": best_zone_id is not None
         }
 
+    def evaluate_session_early_exit(self, new_session: Dict, point: "Point", zone_set: PreparedZoneSet) -> Dict:
+        """
+        Igual que evaluate_session sobre un PreparedZoneSet, pero sin calcular la distancia exacta
+        a zonas que no pueden ganar:
+            1. Descarta las zonas cuyo rectángulo envolvente queda a más de max_allowed_distance_km.
+            2. Acota el score de las restantes: la distancia al rectángulo es una cota inferior de la
+               distancia al polígono (cota superior del score geográfico) y el score de métricas se
+               calcula exacto, porque es barato.
+            3. Evalúa en orden de cota decreciente y corta cuando la cota siguiente es menor que
+               el mejor score encontrado (una zona que contiene al punto suele cortar enseguida).
+        Los empates se resuelven igual que en el recorrido completo: gana la zona que aparece primero.
+        """
+        lon, lat = new_session["lon"], new_session["lat"]
+        candidates = zone_set.candidates(lon, lat, self.max_dist_km)
+        # Con pocas candidatas calcular las cotas cuesta más que evaluarlas todas
+        if len(candidates) < self.early_exit_min_candidates:
+            return self._best_zone(new_session, point, (zone_set.zone(i) for i in candidates))
+
+        # Distancia (grados planos, la misma métrica que score_zone) del punto al rectángulo de cada zona
+        minx, miny, maxx, maxy = zone_set.bounds[candidates].T
+        dx = np.maximum(np.maximum(minx - lon, lon - maxx), 0.0)
+        dy = np.maximum(np.maximum(miny - lat, lat - maxy), 0.0)
+        box_km = np.hypot(dx, dy) * zone_set.DEG_TO_KM
+
+        reachable = box_km <= self.max_dist_km * (1 + 1e-9)
+        candidates, box_km = candidates[reachable], box_km[reachable]
+        geo_bound = np.where(box_km == 0, 1.0, np.maximum(0.0, 1 - box_km / self.max_dist_km))
+
+        n = len(candidates)
+        score_vel = self.compare_metric_array(np.full(n, _as_float(new_session.get("velocity_kmh"))),
+                                              zone_set.velocity_means[candidates])
+        score_time = self.compare_metric_array(np.full(n, _as_float(new_session.get("time_diff_hour"))),
+                                               zone_set.time_means[candidates])
+        score_dist = self.compare_metric_array(np.full(n, _as_float(new_session.get("distance_km"))),
+                                               zone_set.distance_means[candidates])
+        upper_bound = (self.w_geo * geo_bound + self.w_velocity * score_vel + self.w_time * score_time
+                       + self.w_distance * score_dist)
+
+        best_score = 0.0
+        best_index = None
+        for i in np.lexsort((candidates, -upper_bound)):
+            if upper_bound[i] + self.BOUND_EPSILON < best_score:
+                break
+            zone_index = int(candidates[i])
+            total_score = self.score_zone(new_session, point, zone_set.zone(zone_index))
+            if total_score is None:
+                continue
+            if total_score > best_score or (total_score == best_score and best_index is not None
+                                            and zone_index < best_index):
+                best_score = total_score
+                best_index = zone_index
+
+        best_zone_id = zone_set.zone_ids[best_index] if best_index is not None else None
+        return {
+            "score": best_score,
+            "zone_val": best_zone_id,
+            "zone_match": best_zone_id is not None
+        }
+
+    def lookup_table(self, zone_set: PreparedZoneSet) -> ZoneLookupTable:
+        """
+        Tabla de lookup del conjunto para los parámetros de este evaluador; se construye en el
+        primer uso y queda guardada en el conjunto, compartida con otros evaluadores iguales.
+        """
+        key = ("lookup", self.max_dist_km, self.lookup_cell_km, self.lookup_approximate)
+        return zone_set.derived(key, lambda: ZoneLookupTable(zone_set, self.max_dist_km, self.lookup_cell_km,
+                                                             self.lookup_approximate))
+
+    def evaluate_session_lookup(self, new_session: Dict, zone_set: PreparedZoneSet) -> Optional[Dict]:
+        """
+        evaluate_session resuelto con la tabla de lookup; None si el punto cae en una celda de
+        borde y hay que evaluarlo con Shapely.
+        """
+        exact, zone_indices, geo_scores = self.lookup_table(zone_set).lookup(new_session["lon"], new_session["lat"])
+        if exact:
+            return None
+
+        best_score = 0.0
+        best_index = None
+        # Las entradas de la celda están en el orden original de las zonas: ante empates gana la primera
+        for zone_index, score_geo in zip(zone_indices.tolist(), geo_scores.tolist()):
+            metrics = zone_set.zone(zone_index).get("metrics", {})
+            total_score = (
+                self.w_geo * score_geo
+                + self.w_velocity * self.compare_metric(new_session.get("velocity_kmh"), metrics.get("velocity_mean_kmh"))
+                + self.w_time * self.compare_metric(new_session.get("time_diff_hour"), metrics.get("time_mean_hour"))
+                + self.w_distance * self.compare_metric(new_session.get("distance_km"), metrics.get("distance_mean_km"))
+            )
+            if total_score > best_score:
+                best_score = total_score
+                best_index = zone_index
+
+        return {
+            "score": best_score,
+            "zone_val": zone_set.zone_ids[best_index] if best_index is not None else None,
+            "zone_match": best_index is not None
+        }
+
+    def _score_from_table(self, table: ZoneLookupTable, zone_set: PreparedZoneSet, lats, lons,
+                          velocity_kmh, time_diff_hour, distance_km) -> Dict[str, np.ndarray]:
+        # Mismo cálculo y desempate que evaluate_sessions, con el score geográfico de la tabla
+        exact, s_idx, z_idx, score_geo = table.resolve(lons, lats)
+        n = len(lats)
+        best_score = np.zeros(n, dtype=np.float64)
+        best_zone = np.full(n, -1, dtype=np.int64)
+
+        score_vel = self.compare_metric_array(velocity_kmh[s_idx], zone_set.velocity_means[z_idx])
+        score_time = self.compare_metric_array(time_diff_hour[s_idx], zone_set.time_means[z_idx])
+        score_dist = self.compare_metric_array(distance_km[s_idx], zone_set.distance_means[z_idx])
+        total = (self.w_geo * score_geo + self.w_velocity * score_vel + self.w_time * score_time
+                 + self.w_distance * score_dist)
+
+        keep = total > 0
+        s_idx, z_idx, total = s_idx[keep], z_idx[keep], total[keep]
+        if len(total):
+            order = np.lexsort((z_idx, -total, s_idx))
+            s_sorted = s_idx[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = s_sorted[1:] != s_sorted[:-1]
+            winners = order[first]
+            best_score[s_idx[winners]] = total[winners]
+            best_zone[s_idx[winners]] = z_idx[winners]
+        return {"score": best_score, "zone_index": best_zone, "exact": exact}
+
+    def evaluate_sessions(self, lats, lons, velocity_kmh, time_diff_hour, distance_km,
+                          zone_set: PreparedZoneSet, chunk_size: int = 100_000) -> Dict[str, np.ndarray]:
+        """
+        Evalúa N sesiones contra un mismo conjunto de zonas de forma vectorizada.
+        Las métricas de sesión son arrays de N floats (NaN equivale a None en evaluate_session).
+        Procesa las sesiones en bloques de chunk_size para acotar la memoria.
+        :return: dict columnar con "score" (float), "zone_index" (int, -1 sin zona) y "zone_match" (bool).
+            Los resultados coinciden exactamente con evaluate_session sesión por sesión (con la tabla
+            de lookup aproximada, dentro de la cota de error de ZoneLookupTable).
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        velocity_kmh = np.asarray(velocity_kmh, dtype=np.float64)
+        time_diff_hour = np.asarray(time_diff_hour, dtype=np.float64)
+        distance_km = np.asarray(distance_km, dtype=np.float64)
+        if self.lookup_cell_km is None:
+            return self._evaluate_sessions_exact(lats, lons, velocity_kmh, time_diff_hour, distance_km,
+                                                 zone_set, chunk_size)
+
+        result = self._score_from_table(self.lookup_table(zone_set), zone_set, lats, lons,
+                                        velocity_kmh, time_diff_hour, distance_km)
+        best_score, best_zone = result["score"], result["zone_index"]
+        # Solo los puntos en celdas de borde pasan por Shapely
+        exact = np.flatnonzero(result["exact"])
+        if len(exact):
+            fallback = self._evaluate_sessions_exact(lats[exact], lons[exact], velocity_kmh[exact],
+                                                     time_diff_hour[exact], distance_km[exact], zone_set, chunk_size)
+            best_score[exact] = fallback["score"]
+            best_zone[exact] = fallback["zone_index"]
+        return {
+            "score": best_score,
+            "zone_index": best_zone,
+            "zone_match": best_zone >= 0
+        }
+
+    def _evaluate_sessions_exact(self, lats, lons, velocity_kmh, time_diff_hour, distance_km,
+                                 zone_set: PreparedZoneSet, chunk_size: int) -> Dict[str, np.ndarray]:
+        n = len(lats)
+        best_score = np.zeros(n, dtype=np.float64)
+        best_zone = np.full(n, -1, dtype=np.int64)
+
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            pairs = zone_set.candidate_pairs(lons[start:stop], lats[start:stop], self.max_dist_km)
+            if pairs.shape[1] == 0:
+                continue
+            s_idx = pairs[0] + start
+            z_idx = pairs[1]
+            geoms = zone_set.geometries[z_idx]
+
+            # Score geográfico por par (sesión, zona)
+            inside = shapely.contains_xy(geoms, lons[s_idx], lats[s_idx])
+            points = shapely.points(lons[s_idx], lats[s_idx])
+            distances = shapely.distance(geoms, points) * 111  # grados a km
+            in_range = inside | (distances <= self.max_dist_km)
+            score_geo = np.where(inside, 1.0, np.maximum(0.0, 1 - distances / self.max_dist_km))
+
+            # Comparar métricas individuales
+            score_vel = self.compare_metric_array(velocity_kmh[s_idx], zone_set.velocity_means[z_idx])
+            score_time = self.compare_metric_array(time_diff_hour[s_idx], zone_set.time_means[z_idx])
+            score_dist = self.compare_metric_array(distance_km[s_idx], zone_set.distance_means[z_idx])
+
+            # Score ponderado
+            total = (self.w_geo * score_geo + self.w_velocity * score_vel + self.w_time * score_time
+                     + self.w_distance * score_dist)
+
+            keep = in_range & (total > 0)
+            s_idx, z_idx, total = s_idx[keep], z_idx[keep], total[keep]
+            if len(total) == 0:
+                continue
+
+            # Por sesión: mayor score y, ante empates, la zona que aparece primero
+            order = np.lexsort((z_idx, -total, s_idx))
+            s_sorted = s_idx[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = s_sorted[1:] != s_sorted[:-1]
+            winners = order[first]
+            best_score[s_idx[winners]] = total[winners]
+            best_zone[s_idx[winners]] = z_idx[winners]
+
+        return {
+            "score": best_score,
+            "zone_index": best_zone,
+            "zone_match": best_zone >= 0
+        }
+
+    def score_zone(self, new_session: Dict, point: "Point", zone: Dict) -> Optional[float]:
+        """
+        Calcula el score ponderado de la sesión contra una zona.
+        Retorna None si la zona está más lejos que max_allowed_distance_km.
+        """
+        geom: "Polygon" = zone["geometry"]
+        metrics = zone.get("metrics", {})
+
+        if geom.contains(point):
+            score_geo = 1.0
+        else:
+            distance_km = geom.distance(point) * 111  # grados a km
+            if distance_km > self.max_dist_km:
+                return None
+            score_geo = max(0.0, 1 - distance_km / self.max_dist_km)
+
+        # Comparar métricas individuales
+        score_vel = self.compare_metric(new_session.get("velocity_kmh"), metrics.get("velocity_mean_kmh"))
+        score_time = self.compare_metric(new_session.get("time_diff_hour"), metrics.get("time_mean_hour"))
+        score_dist = self.compare_metric(new_session.get("distance_km"), metrics.get("distance_mean_km"))
+
+        # Score ponderado
+        return (self.w_geo * score_geo + self.w_velocity * score_vel + self.w_time * score_time
+                + self.w_distance * score_dist)
+
     def compare_metric(self, current_value: Optional[float], average_value: Optional[float]) -> float:
         """
         Compara un valor actual contra un promedio esperado y devuelve un score entre 0 y 1.
@@ -67,4 +355,24 @@ class GeoScoringEvaluator:
             return 0.0 if current_value > 0 else 1.0
 
         deviation = abs(current_value - average_value) / average_value
-        return max(0.0, 1 - deviation / self.tolerance)
\ No newline at end of file
+        return max(0.0, 1 - deviation / self.tolerance)
+
+    def compare_metric_array(self, current_values: np.ndarray, average_values: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de compare_metric. NaN en cualquiera de los dos arrays equivale a None.
+        """
+        scores = np.full(current_values.shape, 0.5)
+        valid = ~np.isnan(current_values) & ~np.isnan(average_values)
+
+        zero = valid & (average_values == 0)
+        scores[zero] = np.where(current_values[zero] > 0, 0.0, 1.0)
+
+        nonzero = valid & (average_values != 0)
+        current, average = current_values[nonzero], average_values[nonzero]
+        deviation = np.abs(current - average) / average
+        scores[nonzero] = np.maximum(0.0, 1 - deviation / self.tolerance)
+        return scores
+
+
+def _as_float(value: Optional[float]) -> float:
+    return np.nan if value is None else float(value)
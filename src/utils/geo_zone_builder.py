@@ -0,0 +1,245 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+import numpy as np
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+from src.utils.geo_incremental_cluster import IncrementalGeoClusterState
+from src.utils.session_history_store import to_timestamp_us
+from src.utils.lazy_imports import LazyModule
+
+if TYPE_CHECKING:
+    from shapely.geometry import Polygon
+
+shapely = LazyModule("shapely")
+
+
+class GeoZoneBuilder:
+    DEG_TO_KM = 111  # Mismo factor grados a km que GeoScoringEvaluator
+
+    def __init__(self, buffer_km: float = 0.5, concave_ratio: Optional[float] = None):
+        """
+        Convierte clusters de sesiones en zonas frecuentes listas para GeoScoringEvaluator.
+        :param buffer_km: margen que se agrega alrededor de la envolvente de cada cluster.
+        :param concave_ratio: si se define, usa una envolvente cóncava (shapely.concave_hull) con este
+            ratio (0 = más ajustada, 1 = convexa); con None usa la envolvente convexa.
+        """
+        self.buffer_km = buffer_km
+        self.concave_ratio = concave_ratio
+
+    def zone_polygons(self, latitudes: np.ndarray, longitudes: np.ndarray, labels: np.ndarray,
+                      cluster_ids: Sequence[int]) -> List["Polygon"]:
+        """
+        Polígonos (lon, lat) de los clusters pedidos, construidos en una sola pasada vectorizada.
+        """
+        return [self.buffer(h) for h in self.zone_hulls(latitudes, longitudes, labels, cluster_ids)]
+
+    def buffer(self, hull):
+        return shapely.buffer(hull, self.buffer_km / self.DEG_TO_KM)
+
+    def zone_hulls(self, latitudes: np.ndarray, longitudes: np.ndarray, labels: np.ndarray,
+                   cluster_ids: Sequence[int]) -> list:
+        """
+        Envolventes (sin margen) de los clusters pedidos.
+        """
+        cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+        member = np.isin(labels, cluster_ids)
+        order = np.argsort(labels[member], kind="stable")
+        member_labels = labels[member][order]
+        coords = np.column_stack([longitudes[member], latitudes[member]])[order]
+
+        # Índice de cada punto dentro de cluster_ids, para que shapely arme un MultiPoint por cluster
+        position = np.searchsorted(np.sort(cluster_ids), member_labels)
+        points = shapely.multipoints(coords, indices=position)
+        if self.concave_ratio is not None:
+            hulls = shapely.concave_hull(points, ratio=self.concave_ratio)
+        else:
+            hulls = shapely.convex_hull(points)
+
+        by_id = dict(zip(np.sort(cluster_ids).tolist(), hulls))
+        return [by_id[c] for c in cluster_ids.tolist()]
+
+    @staticmethod
+    def zone_metrics(velocity_kmh: np.ndarray, time_diff_hour: np.ndarray, distance_km: np.ndarray,
+                     labels: np.ndarray) -> Dict[int, Dict[str, Optional[float]]]:
+        """
+        Promedio de las métricas de llegada de cada cluster. Cada sesión aporta las métricas del par
+        (sesión anterior, sesión) y cuenta para el cluster de destino; NaN marca sesiones sin par.
+        """
+        valid = (labels >= 0) & ~np.isnan(velocity_kmh)
+        size = int(labels.max()) + 1 if len(labels) and labels.max() >= 0 else 0
+        counts = np.bincount(labels[valid], minlength=size)
+        sums = {
+            "velocity_mean_kmh": np.bincount(labels[valid], weights=velocity_kmh[valid], minlength=size),
+            "time_mean_hour": np.bincount(labels[valid], weights=time_diff_hour[valid], minlength=size),
+            "distance_mean_km": np.bincount(labels[valid], weights=distance_km[valid], minlength=size)
+        }
+        return {
+            cluster_id: {
+                name: float(total[cluster_id] / counts[cluster_id]) if counts[cluster_id] else None
+                for name, total in sums.items()
+            }
+            for cluster_id in range(size)
+        }
+
+    def build_zones(self, timestamps, latitudes, longitudes, labels) -> List[Dict]:
+        """
+        Zonas de un historial completo ordenado por tiempo, a partir de sus etiquetas de DBSCAN.
+        Retorna zonas con el formato de GeoScoringEvaluator: "zone_id", "geometry" y "metrics".
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.int64)
+
+        pairs = GeoMetricsUtils.compare_session_arrays(timestamps, latitudes, longitudes)
+        # La primera sesión no tiene sesión anterior
+        velocity = np.concatenate([[np.nan], pairs["velocity_kmh"]])
+        hours = np.concatenate([[np.nan], pairs["time_diff_hour"]])
+        distance = np.concatenate([[np.nan], pairs["distance_km"]])
+
+        cluster_ids = np.unique(labels[labels >= 0]).tolist()
+        if not cluster_ids:
+            return []
+        polygons = self.zone_polygons(latitudes, longitudes, labels, cluster_ids)
+        metrics = self.zone_metrics(velocity, hours, distance, labels)
+        return [
+            {"zone_id": cluster_id, "geometry": polygon, "metrics": metrics[cluster_id]}
+            for cluster_id, polygon in zip(cluster_ids, polygons)
+        ]
+
+    @staticmethod
+    def to_payload(zones: List[Dict]) -> List[Dict]:
+        """
+        Zonas en el formato de FrecuentsZone (polygon como lista de [lon, lat]).
+        """
+        return [
+            {
+                "zone_id": z["zone_id"],
+                "polygon": [list(c) for c in z["geometry"].exterior.coords],
+                "metrics": z["metrics"]
+            }
+            for z in zones
+        ]
+
+
+class IncrementalZoneState:
+    def __init__(self, builder: GeoZoneBuilder, eps_km: float = 20, min_samples: int = 3):
+        """
+        Zonas frecuentes de un usuario actualizadas sesión a sesión (las sesiones deben llegar en orden
+        temporal). Por cada sesión solo se calcula el par con la sesión anterior, el clustering se
+        actualiza con IncrementalGeoClusterState y solo se reconstruyen los polígonos de los clusters
+        cuyos miembros cambiaron.
+        """
+        self.builder = builder
+        self.clusters = IncrementalGeoClusterState(eps_km=eps_km, min_samples=min_samples)
+        self._capacity = 64
+        self._lat = np.empty(self._capacity)
+        self._lon = np.empty(self._capacity)
+        self._velocity = np.empty(self._capacity)
+        self._hours = np.empty(self._capacity)
+        self._distance = np.empty(self._capacity)
+        self._last = None  # (timestamp_us, latitud, longitud) de la última sesión
+        self._labels = np.empty(0, dtype=np.int64)
+        self._hulls: Dict[int, object] = {}
+        self._polygons: Dict[int, "Polygon"] = {}
+        self.polygons_rebuilt = 0
+
+    def _grow(self):
+        self._capacity *= 2
+        for name in ("_lat", "_lon", "_velocity", "_hours", "_distance"):
+            setattr(self, name, np.resize(getattr(self, name), self._capacity))
+
+    def add_session(self, session: Dict) -> List[Dict]:
+        """
+        Agrega una sesión ('session_id', 'datetime', 'latitude', 'longitude') y retorna las zonas actuales.
+        """
+        self._append([session["session_id"]], [to_timestamp_us(session["datetime"])],
+                     [session["latitude"]], [session["longitude"]])
+        return self.zones()
+
+    def add_sessions(self, session_ids, timestamp_us, latitudes, longitudes):
+        """
+        Agrega un bloque de sesiones en columnas (timestamps en microsegundos epoch UTC, como el historial
+        guardado), sin recalcular las zonas: se actualizan en la próxima llamada a zones().
+        Con timestamp_us None las sesiones solo cuentan para el clustering y las envolventes: no tienen
+        métricas de llegada y la sesión siguiente se compara con la última sesión con fecha.
+        """
+        if len(session_ids):
+            self._append(session_ids, timestamp_us, latitudes, longitudes)
+
+    def _append(self, session_ids, timestamp_us, latitudes, longitudes):
+        n = self.clusters.n
+        end = n + len(session_ids)
+        while end > self._capacity:
+            self._grow()
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        self._lat[n:end] = lat
+        self._lon[n:end] = lon
+
+        if timestamp_us is None:
+            self._velocity[n:end] = self._hours[n:end] = self._distance[n:end] = np.nan
+            self.clusters.add_sessions(session_ids, lat, lon)
+            return
+        ts = np.asarray(timestamp_us, dtype=np.int64)
+
+        # Cada sesión aporta el par con la anterior; la primera sesión del usuario no tiene par
+        if self._last is not None:
+            last_ts, last_lat, last_lon = self._last
+            ts, lat_pairs, lon_pairs = np.append(last_ts, ts), np.append(last_lat, lat), np.append(last_lon, lon)
+        else:
+            lat_pairs, lon_pairs = lat, lon
+        pairs = GeoMetricsUtils.compare_session_arrays(ts / 1e6, lat_pairs, lon_pairs)
+        first = n if self._last is not None else n + 1
+        if self._last is None:
+            self._velocity[n] = self._hours[n] = self._distance[n] = np.nan
+        self._velocity[first:end] = pairs["velocity_kmh"]
+        self._hours[first:end] = pairs["time_diff_hour"]
+        self._distance[first:end] = pairs["distance_km"]
+        self._last = (int(ts[-1]), float(lat[-1]), float(lon[-1]))
+
+        self.clusters.add_sessions(session_ids, lat, lon)
+
+    def zones(self) -> List[Dict]:
+        n = self.clusters.n
+        labels = self.clusters.labels()
+        previous = self._labels
+        cluster_ids = np.unique(labels[labels >= 0]).tolist()
+
+        # Clusters cuyos miembros anteriores cambiaron de etiqueta (fusiones, bordes reasignados)
+        changed = np.flatnonzero(labels[:len(previous)] != previous)
+        relabeled = set(labels[changed].tolist()) | set(previous[changed].tolist())
+        rebuild = [c for c in cluster_ids if c in relabeled or c not in self._hulls]
+
+        # Clusters que solo sumaron sesiones nuevas: la envolvente convexa se extiende sin recalcularla
+        new_positions = np.arange(len(previous), n)
+        extend = set(labels[new_positions].tolist()) - set(rebuild) - {-1}
+        if self.builder.concave_ratio is not None:
+            rebuild += sorted(extend)
+            extend = set()
+
+        for c in extend:
+            members = new_positions[labels[new_positions] == c]
+            points = shapely.points(self._lon[members], self._lat[members])
+            if shapely.contains(self._hulls[c], points).all():
+                continue
+            hull = shapely.convex_hull(shapely.union_all(np.append(points, self._hulls[c])))
+            self._hulls[c] = hull
+            self._polygons[c] = self.builder.buffer(hull)
+            self.polygons_rebuilt += 1
+
+        if rebuild:
+            hulls = self.builder.zone_hulls(self._lat[:n], self._lon[:n], labels, rebuild)
+            for c, hull in zip(rebuild, hulls):
+                self._hulls[c] = hull
+                self._polygons[c] = self.builder.buffer(hull)
+            self.polygons_rebuilt += len(rebuild)
+
+        for c in list(self._hulls):
+            if c not in cluster_ids:
+                del self._hulls[c]
+                del self._polygons[c]
+        self._labels = labels
+
+        metrics = self.builder.zone_metrics(self._velocity[:n], self._hours[:n], self._distance[:n], labels)
+        return [
+            {"zone_id": c, "geometry": self._polygons[c], "metrics": metrics[c]}
+            for c in cluster_ids
+        ]
@@ -0,0 +1,96 @@
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional
+import numpy as np
+from src.utils.lazy_imports import LazyModule
+
+if TYPE_CHECKING:
+    from shapely.geometry import Polygon
+
+shapely = LazyModule("shapely")
+
+
+class PreparedZoneSet:
+    DEG_TO_KM = 111  # Mismo factor grados a km que GeoScoringEvaluator
+
+    def __init__(self, frequent_zones: List[Dict]):
+        """
+        Conjunto de zonas frecuentes preparado para consultas repetidas.
+        Se construye una sola vez por lista de zonas: prepara cada geometría (contains rápido)
+        y arma un STRtree sobre ellas para obtener solo las zonas candidatas de un punto.
+        :param frequent_zones: lista de zonas con "zone_id", "geometry" (Polygon) y "metrics" (dict)
+        """
+        self.zones = list(frequent_zones)
+        self.geometries = np.array([z["geometry"] for z in self.zones], dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+        self.bounds = shapely.bounds(self.geometries).reshape(-1, 4)  # (minx, miny, maxx, maxy) por zona
+        self.zone_ids = [z["zone_id"] for z in self.zones]
+
+        # Métricas de cada zona como columnas (NaN cuando la métrica no está definida)
+        metrics = [z.get("metrics", {}) for z in self.zones]
+        self.velocity_means = np.array([m.get("velocity_mean_kmh") for m in metrics], dtype=np.float64)
+        self.time_means = np.array([m.get("time_mean_hour") for m in metrics], dtype=np.float64)
+        self.distance_means = np.array([m.get("distance_mean_km") for m in metrics], dtype=np.float64)
+
+        # Estructuras derivadas del conjunto (p. ej. tablas de lookup), construidas en el primer uso
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+        # Avisa al cache que contiene el conjunto cuando crece su memoria (ver ZoneSetCache)
+        self.on_derived: Optional[Callable[["PreparedZoneSet"], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def candidates(self, lon: float, lat: float, max_distance_km: float) -> np.ndarray:
+        """
+        Devuelve los índices (en el orden original de las zonas) de las zonas cuyo
+        rectángulo envolvente, expandido en max_distance_km, contiene al punto.
+        Es un superconjunto de las zonas a menos de max_distance_km del punto.
+        """
+        # Margen relativo mínimo para no perder zonas justo en el límite por redondeo
+        d = max_distance_km / self.DEG_TO_KM * (1 + 1e-9)
+        idx = self.tree.query(shapely.box(lon - d, lat - d, lon + d, lat + d))
+        idx.sort()
+        return idx
+
+    def candidate_pairs(self, lons: np.ndarray, lats: np.ndarray, max_distance_km: float) -> np.ndarray:
+        """
+        Versión vectorizada de candidates para N puntos.
+        Retorna un array (2, K) con pares (índice de punto, índice de zona).
+        """
+        d = max_distance_km / self.DEG_TO_KM * (1 + 1e-9)
+        boxes = shapely.box(lons - d, lats - d, lons + d, lats + d)
+        return self.tree.query(boxes)
+
+    def derived(self, key: Hashable, build: Callable[[], object]):
+        """
+        Devuelve la estructura derivada guardada con key, o la construye una sola vez con build().
+        Vive lo mismo que el conjunto, así que sale del cache de zonas junto con él.
+        """
+        value = self._derived.get(key)
+        built = False
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = self._derived[key] = build()
+                    built = True
+            if built and self.on_derived is not None:
+                self.on_derived(self)
+        return value
+
+    def derived_items(self) -> List:
+        return list(self._derived.items())
+
+    @property
+    def derived_nbytes(self) -> int:
+        """
+        Memoria de las estructuras derivadas que la informan (atributo nbytes, p. ej. ZoneLookupTable).
+        """
+        return sum(getattr(value, "nbytes", 0) for value in list(self._derived.values()))
+
+    def zone(self, index: int) -> Dict:
+        return self.zones[index]
+
+    def geometry(self, index: int) -> "Polygon":
+        return self.geometries[index]
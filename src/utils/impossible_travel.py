@@ -0,0 +1,155 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Union
+import numpy as np
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+
+
+def to_epoch_seconds(moment: datetime) -> float:
+    # Los datetime sin zona horaria se interpretan como UTC, igual para todas las sesiones
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class SessionRingBuffer:
+    def __init__(self, capacity: int):
+        """
+        Últimas `capacity` sesiones de un usuario en arrays de tamaño fijo; al llenarse,
+        cada sesión nueva pisa a la más vieja. La memoria por usuario no crece con el historial.
+        """
+        self.capacity = capacity
+        self.seconds = np.empty(capacity, dtype=np.float64)
+        self.latitudes = np.empty(capacity, dtype=np.float64)
+        self.longitudes = np.empty(capacity, dtype=np.float64)
+        self.session_ids = np.empty(capacity, dtype=np.int64)
+        self.written = 0
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, seconds: float, latitude: float, longitude: float, session_id: int):
+        i = self.written % self.capacity
+        self.seconds[i] = seconds
+        self.latitudes[i] = latitude
+        self.longitudes[i] = longitude
+        self.session_ids[i] = session_id
+        self.written += 1
+
+
+class ImpossibleTravelDetector:
+    def __init__(self, window_hours: float = 24, max_sessions: int = 32, max_speed_kmh: float = 900,
+                 min_time_hours: float = 1 / 60, max_users: int = 200_000, n_shards: int = 64):
+        """
+        Detector de viajes imposibles sobre una ventana de sesiones recientes por usuario.
+        Cada sesión nueva se compara con todas las sesiones de la ventana en una sola pasada
+        vectorizada de haversine, y la mayor velocidad implícita es el score. Así se detectan
+        logins intercalados entre dos ciudades, que la comparación con la sesión anterior no ve.
+
+        :param window_hours: solo se comparan sesiones a menos de esta distancia en el tiempo.
+        :param max_sessions: capacidad del ring buffer por usuario; acota el costo de cada evento.
+        :param max_speed_kmh: velocidad a partir de la cual el viaje se marca como imposible.
+        :param min_time_hours: diferencia de tiempo mínima usada al calcular la velocidad, para
+            que dos sesiones casi simultáneas en lugares distintos den una velocidad alta y finita.
+        :param max_users: usuarios retenidos en memoria (se descarta el usado menos recientemente).
+        :param n_shards: particiones con lock propio, para reducir la contención entre usuarios.
+        """
+        if max_users < n_shards:
+            raise ValueError("max_users must be greater than or equal to n_shards")
+        self.window_s = window_hours * 3600
+        self.max_sessions = max_sessions
+        self.max_speed_kmh = max_speed_kmh
+        self.min_time_hours = min_time_hours
+        self.max_per_shard = max_users // n_shards
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(n_shards)]
+        self._stats_lock = threading.Lock()
+        self.checked = 0
+        self.flagged = 0
+        self.evictions = 0
+
+    def check(self, session: Dict[str, Union[int, float, datetime]]) -> Dict[str, Union[int, float, bool, None]]:
+        """
+        Compara la sesión con la ventana del usuario y después la agrega a la ventana.
+        Espera:
+            session = {"user_id": int, "session_id": int, "datetime": datetime, "latitude": float, "longitude": float}
+        Retorna:
+            - compared_sessions: sesiones de la ventana contra las que se comparó
+            - max_velocity_kmh: mayor velocidad implícita (0.0 si no hubo con qué comparar)
+            - against_session_id, distance_km, time_diff_hour: la sesión que produjo ese máximo
+            - impossible_travel: True si max_velocity_kmh supera max_speed_kmh
+        """
+        user_id = int(session["user_id"])
+        seconds = to_epoch_seconds(session["datetime"])
+        lat = float(session["latitude"])
+        lon = float(session["longitude"])
+
+        lock, buffers = self._shards[hash(user_id) % len(self._shards)]
+        evicted = 0
+        with lock:
+            buffer = buffers.get(user_id)
+            if buffer is None:
+                buffer = buffers[user_id] = SessionRingBuffer(self.max_sessions)
+                while len(buffers) > self.max_per_shard:
+                    buffers.popitem(last=False)
+                    evicted += 1
+            else:
+                buffers.move_to_end(user_id)
+
+            result = self._compare(buffer, seconds, lat, lon)
+            buffer.append(seconds, lat, lon, int(session["session_id"]))
+
+        with self._stats_lock:
+            self.checked += 1
+            self.flagged += result["impossible_travel"]
+            self.evictions += evicted
+
+        return {"user_id": user_id, "session_id": int(session["session_id"]), **result}
+
+    def _compare(self, buffer: SessionRingBuffer, seconds: float, lat: float, lon: float) -> Dict:
+        n = len(buffer)
+        # Las sesiones pueden llegar desordenadas: la ventana se mide hacia ambos lados
+        time_diff_s = np.abs(buffer.seconds[:n] - seconds)
+        in_window = np.flatnonzero(time_diff_s <= self.window_s)
+        if len(in_window) == 0:
+            return {
+                "compared_sessions": 0,
+                "max_velocity_kmh": 0.0,
+                "against_session_id": None,
+                "distance_km": None,
+                "time_diff_hour": None,
+                "impossible_travel": False
+            }
+
+        distance = GeoMetricsUtils.haversine_distance_km_array(
+            lat, lon, buffer.latitudes[in_window], buffer.longitudes[in_window]
+        )
+        hours = time_diff_s[in_window] / 3600
+        velocity = distance / np.maximum(hours, self.min_time_hours)
+        best = int(np.argmax(velocity))
+        max_velocity = float(velocity[best])
+
+        return {
+            "compared_sessions": int(len(in_window)),
+            "max_velocity_kmh": round(max_velocity, 2),
+            "against_session_id": int(buffer.session_ids[in_window[best]]),
+            "distance_km": round(float(distance[best]), 3),
+            "time_diff_hour": float(hours[best]),
+            "impossible_travel": max_velocity > self.max_speed_kmh
+        }
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        users = 0
+        for lock, buffers in self._shards:
+            with lock:
+                users += len(buffers)
+        with self._stats_lock:
+            return {
+                "users": users,
+                "checked": self.checked,
+                "flagged": self.flagged,
+                "evictions": self.evictions,
+                "window_hours": self.window_s / 3600,
+                "max_sessions": self.max_sessions,
+                "max_speed_kmh": self.max_speed_kmh
+            }
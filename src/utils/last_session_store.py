@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+Session = Dict[str, Union[int, float, datetime]]
+
+
+class LastSessionStore(ABC):
+    """
+    Interfaz del almacén de la última sesión conocida de cada usuario.
+    swap() debe ser atómico por user_id: devuelve la sesión anterior y guarda la nueva.
+    `blocking` indica si get/swap hacen I/O bloqueante y no deben llamarse desde el event loop.
+    """
+    blocking = False
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    def swap(self, user_id: int, session: Session) -> Optional[Session]:
+        ...
+
+    def _count(self, hit: Optional[bool] = None, evictions: int = 0):
+        with self._stats_lock:
+            if hit is True:
+                self.hits += 1
+            elif hit is False:
+                self.misses += 1
+            self.evictions += evictions
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # user_id -> (expires_at, session)
+
+
+class InMemoryLastSessionStore(LastSessionStore):
+    def __init__(self, max_entries: int = 1_000_000, ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 n_shards: int = 64):
+        """
+        Almacén en memoria particionado en shards, cada uno con su propio lock y orden LRU.
+        :param max_entries: cantidad máxima de usuarios en memoria (repartida entre shards). Es un límite
+            de entradas, no de bytes: cada entrada es un dict de sesión de ~0.5 KB, así que el
+            valor por defecto equivale a unos 500 MB.
+        :param ttl_seconds: tiempo de vida de cada entrada desde su última escritura (None = sin TTL).
+        :param n_shards: cantidad de shards; reduce la contención entre usuarios distintos.
+        """
+        super().__init__()
+        if max_entries < n_shards:
+            raise ValueError("max_entries must be greater than or equal to n_shards")
+        self.ttl = ttl_seconds
+        self.max_per_shard = max_entries // n_shards
+        self._shards = [_Shard() for _ in range(n_shards)]
+
+    def _shard(self, user_id: int) -> _Shard:
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    def _lookup(self, shard: _Shard, user_id: int, now: float) -> Optional[Session]:
+        # Debe llamarse con el lock del shard tomado
+        entry = shard.entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if expires_at is not None and expires_at <= now:
+            del shard.entries[user_id]
+            self._count(evictions=1)
+            return None
+        shard.entries.move_to_end(user_id)
+        return session
+
+    def get(self, user_id: int) -> Optional[Session]:
+        shard = self._shard(user_id)
+        with shard.lock:
+            session = self._lookup(shard, user_id, time.monotonic())
+        self._count(hit=session is not None)
+        return session
+
+    def swap(self, user_id: int, session: Session) -> Optional[Session]:
+        shard = self._shard(user_id)
+        now = time.monotonic()
+        evicted = 0
+        with shard.lock:
+            previous = self._lookup(shard, user_id, now)
+            shard.entries[user_id] = (now + self.ttl if self.ttl is not None else None, session)
+            shard.entries.move_to_end(user_id)
+            while len(shard.entries) > self.max_per_shard:
+                shard.entries.popitem(last=False)
+                evicted += 1
+        self._count(hit=previous is not None, evictions=evicted)
+        return previous
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+class SQLiteLastSessionStore(LastSessionStore):
+    blocking = True
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = 30 * 24 * 3600):
+        """
+        Almacén persistente en SQLite. Cada swap corre en una transacción BEGIN IMMEDIATE,
+        por lo que también es atómico entre procesos que compartan el archivo.
+        :param path: ruta del archivo de base de datos.
+        :param ttl_seconds: las entradas más viejas que esto se consideran inexistentes.
+        """
+        super().__init__()
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS last_session ("
+            " user_id INTEGER PRIMARY KEY,"
+            " session_id INTEGER NOT NULL,"
+            " datetime TEXT NOT NULL,"
+            " latitude REAL NOT NULL,"
+            " longitude REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def _lookup(self, user_id: int, now: float) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT session_id, datetime, latitude, longitude, updated_at FROM last_session WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        session_id, dt, latitude, longitude, updated_at = row
+        if self.ttl is not None and updated_at + self.ttl <= now:
+            self._conn.execute("DELETE FROM last_session WHERE user_id = ?", (user_id,))
+            self._count(evictions=1)
+            return None
+        return {
+            "user_id": user_id,
+            "session_id": session_id,
+            "datetime": datetime.fromisoformat(dt),
+            "latitude": latitude,
+            "longitude": longitude
+        }
+
+    def get(self, user_id: int) -> Optional[Session]:
+        with self._lock:
+            session = self._lookup(user_id, time.time())
+        self._count(hit=session is not None)
+        return session
+
+    def swap(self, user_id: int, session: Session) -> Optional[Session]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._lookup(user_id, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO last_session"
+                    " (user_id, session_id, datetime, latitude, longitude, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, session["session_id"], session["datetime"].isoformat(),
+                     session["latitude"], session["longitude"], now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._count(hit=previous is not None)
+        return previous
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
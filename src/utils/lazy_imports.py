@@ -0,0 +1,40 @@
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Módulo que se importa recién al acceder al primer atributo:
+
+        shapely = LazyModule("shapely")
+        shapely.points(...)  # acá se importa shapely
+
+    Después de la primera importación, cada acceso es un getattr sobre el módulo real.
+    Sirve para que importar main.py no cargue scikit-learn ni Shapely en workers que no los usan.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -0,0 +1,65 @@
+import json
+from typing import AsyncIterable, AsyncIterator, Tuple
+from starlette.responses import StreamingResponse
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = 64 * 1024
+                            ) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Divide un stream de bytes en líneas NDJSON a medida que llegan, sin acumular el cuerpo completo.
+    Retorna tuplas (número de línea, contenido). Las líneas vacías se ignoran.
+    Una línea de más de max_line_bytes se reporta como LineTooLong en lugar del contenido y se descarta.
+    """
+    buffer = b""
+    line_number = 0
+    discarding = False
+
+    async for chunk in chunks:
+        # Solo se copia lo que quedó sin terminar del fragmento anterior; dentro del fragmento las
+        # líneas se recorren con un offset, sin recortar el buffer en cada una
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            line, start = buffer[start:newline], newline + 1
+            if discarding:
+                discarding = False
+                continue
+            line_number += 1
+            if len(line) > max_line_bytes:
+                yield line_number, LineTooLong(f"Line exceeds {max_line_bytes} bytes")
+            elif line.strip():
+                yield line_number, line
+        buffer = buffer[start:]
+
+        if len(buffer) > max_line_bytes and not discarding:
+            line_number += 1
+            yield line_number, LineTooLong(f"Line exceeds {max_line_bytes} bytes")
+            discarding = True
+        if discarding:
+            buffer = b""
+
+    if buffer.strip() and not discarding:
+        yield line_number + 1, buffer
+
+
+def ndjson_line(obj) -> bytes:
+    return (json.dumps(obj, default=str, separators=(",", ":")) + "\n").encode()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que puede leer el cuerpo del request mientras responde.
+    La versión de Starlette, con ASGI spec < 2.4, consume receive() para detectar desconexiones
+    y se quedaría con los fragmentos del cuerpo; acá la desconexión la detecta request.stream().
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
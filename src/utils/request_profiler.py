@@ -0,0 +1,79 @@
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class SlowRequestProfiler:
+    def __init__(self, sample_rate: float = 0.0, threshold_s: float = 0.5,
+                 max_profiles: int = 20, top_n: int = 40):
+        """
+        Perfila con cProfile una muestra de requests y guarda el reporte de las que superan threshold_s.
+        :param sample_rate: fracción de requests perfiladas (0 = desactivado). cProfile agrega
+            overhead a la request perfilada, por eso se muestrea.
+        :param threshold_s: solo se guardan los perfiles de requests más lentas que esto.
+        :param max_profiles: cantidad de perfiles retenidos (se descartan los más viejos).
+        :param top_n: funciones incluidas en cada reporte, ordenadas por tiempo acumulado.
+
+        Solo puede haber un perfil activo a la vez: si llega otra request muestreada mientras tanto,
+        no se perfila. El perfil cubre el thread que lo inició (el event loop), así que incluye lo que
+        otras corrutinas ejecutaron en ese lapso y no lo que corrió en pools de threads o procesos.
+        """
+        self.sample_rate = sample_rate
+        self.threshold_s = threshold_s
+        self.top_n = top_n
+        self._profiles = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        self._active = False
+        self.sampled = 0
+        self.captured = 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            if self._active:
+                return None
+            self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: Optional[cProfile.Profile], route: str, duration_s: float):
+        if profile is None:
+            return
+        profile.disable()
+        with self._lock:
+            self._active = False
+            self.sampled += 1
+        if duration_s < self.threshold_s:
+            return
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(self.top_n)
+        with self._lock:
+            self.captured += 1
+            self._profiles.append({
+                "route": route,
+                "duration_s": duration_s,
+                "captured_at": time.time(),
+                "report": stream.getvalue()
+            })
+
+    def profiles(self) -> List[Dict]:
+        with self._lock:
+            return list(self._profiles)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "threshold_s": self.threshold_s,
+                "sampled": self.sampled,
+                "captured": self.captured,
+                "retained": len(self._profiles)
+            }
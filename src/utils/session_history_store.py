@@ -0,0 +1,325 @@
+import errno
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+
+COLUMNS = {
+    "user_id": np.int64,
+    "session_id": np.int64,
+    "timestamp_us": np.int64,  # microsegundos desde epoch (UTC)
+    "latitude": np.float32,
+    "longitude": np.float32
+}
+
+
+class SessionColumns(NamedTuple):
+    session_id: np.ndarray
+    timestamp_us: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        # Vista datetime64 de los mismos datos (sin copia)
+        return self.timestamp_us.view("datetime64[us]")
+
+    def __len__(self) -> int:
+        return len(self.session_id)
+
+
+def to_timestamp_us(value: Union[datetime, int]) -> int:
+    """
+    Convierte un datetime a microsegundos desde epoch. Los datetime sin zona horaria se toman como UTC.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+        return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return int(value)
+
+
+class _Segment:
+    def __init__(self, path: str):
+        # Columnas mapeadas en memoria, ordenadas por (user_id, timestamp_us)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        self.users = np.load(os.path.join(path, "users.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        # Segmentos que este reemplaza (solo en los escritos por compact)
+        replaces_path = os.path.join(path, "replaces.json")
+        self.replaces = set()
+        if os.path.exists(replaces_path):
+            with open(replaces_path) as f:
+                self.replaces = set(json.load(f))
+
+    def user_range(self, user_id: int):
+        i = np.searchsorted(self.users, user_id)
+        if i == len(self.users) or self.users[i] != user_id:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+
+class SessionHistoryStore:
+    def __init__(self, root: str, flush_threshold: int = 100_000, max_segments: Optional[int] = None):
+        """
+        Historial de sesiones por usuario guardado como columnas tipadas (int64 / float32).
+        Las escrituras se acumulan en memoria y se vuelcan en segmentos inmutables (solo se agregan),
+        cada uno ordenado por usuario y tiempo y leído con memory-map. Leer un usuario que está en un
+        solo segmento devuelve vistas de ese segmento, sin copiar datos.
+        :param root: directorio de los segmentos.
+        :param flush_threshold: cantidad de sesiones en memoria que dispara un volcado a disco.
+        :param max_segments: cantidad de segmentos a partir de la cual un volcado compacta todo en uno
+            (ver compact). Con None los segmentos solo se unen llamando a compact(). Los volcados de
+            otras instancias no disparan la compactación de esta, así que conviene activarla en un
+            solo proceso por directorio.
+        """
+        self.root = root
+        self.flush_threshold = flush_threshold
+        self.max_segments = max_segments
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._buffer: Dict[str, list] = {name: [] for name in COLUMNS}
+        self._pending_rows: Dict[int, List[int]] = {}  # user_id -> posiciones en _buffer
+        self._refresh()
+
+    def _segment_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root) if name.startswith("segment_"))
+
+    def _refresh(self):
+        # Arma la lista de segmentos a partir del directorio, reutilizando los ya cargados, para ver
+        # los escritos desde otra instancia (p. ej. otro proceso). Un segmento compactado lista los
+        # segmentos que reemplaza: esos se descartan aunque sigan en disco o ya estuvieran cargados,
+        # así las sesiones nunca se cuentan dos veces mientras otro proceso compacta
+        while True:
+            loaded = {segment.name: segment for segment in self._segments}
+            segments, replaced = [], set()
+            try:
+                # Del más nuevo al más viejo: un segmento compactado siempre es posterior a los que
+                # reemplaza, así esos ni se cargan
+                for name in reversed(self._segment_names()):
+                    if name in replaced:
+                        continue
+                    segment = loaded.get(name) or _Segment(os.path.join(self.root, name))
+                    replaced |= segment.replaces
+                    segments.append(segment)
+            except FileNotFoundError:
+                # Un segmento reemplazado se borró mientras se listaba: se vuelve a listar
+                continue
+            self._segments = segments[::-1]
+            return
+
+    def append(self, user_id: int, session_id: int, timestamp: Union[datetime, int],
+               latitude: float, longitude: float):
+        with self._lock:
+            self._buffer["user_id"].append(user_id)
+            self._buffer["session_id"].append(session_id)
+            self._buffer["timestamp_us"].append(to_timestamp_us(timestamp))
+            self._buffer["latitude"].append(latitude)
+            self._buffer["longitude"].append(longitude)
+            self._pending_rows.setdefault(user_id, []).append(len(self._buffer["user_id"]) - 1)
+            if len(self._buffer["user_id"]) >= self.flush_threshold:
+                self._flush()
+
+    def append_many(self, user_ids, session_ids, timestamp_us, latitudes, longitudes):
+        """
+        Agrega un bloque de sesiones ya en columnas; se escribe directo como un segmento.
+        """
+        columns = {
+            "user_id": user_ids, "session_id": session_ids, "timestamp_us": timestamp_us,
+            "latitude": latitudes, "longitude": longitudes
+        }
+        with self._lock:
+            self._write_segment({name: np.asarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()})
+            self._compact_if_needed()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer["user_id"]:
+            return
+        columns = {name: np.asarray(self._buffer[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._buffer = {name: [] for name in COLUMNS}
+        self._pending_rows = {}
+        self._write_segment(columns)
+        self._compact_if_needed()
+
+    def _write_segment(self, columns: Dict[str, np.ndarray], replaces: Tuple[str, ...] = ()):
+        if len(columns["user_id"]) == 0:
+            return
+        order = np.lexsort((columns["timestamp_us"], columns["user_id"]))
+        users, starts = np.unique(columns["user_id"][order], return_index=True)
+        offsets = np.append(starts, len(order))
+
+        number = self._reserve_number()
+        tmp_path = os.path.join(self.root, f".tmp_{number:08d}_{os.getpid()}")
+
+        # Se escribe en un directorio temporal y se renombra, para que los lectores nunca vean un segmento a medias
+        os.makedirs(tmp_path)
+        for name in COLUMNS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), columns[name][order])
+        np.save(os.path.join(tmp_path, "users.npy"), users)
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        if replaces:
+            with open(os.path.join(tmp_path, "replaces.json"), "w") as f:
+                json.dump(sorted(replaces), f)
+        try:
+            while True:
+                try:
+                    # Un segmento nunca está vacío, así que el rename no reemplaza uno existente: falla
+                    os.rename(tmp_path, os.path.join(self.root, f"segment_{number:08d}"))
+                    break
+                except OSError as e:
+                    if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                        raise
+                # Otro escritor volcó con ese número entre el listado y la reserva: se reserva el siguiente
+                self._release_number(number)
+                number = self._reserve_number()
+        finally:
+            self._release_number(number)
+        self._refresh()
+
+    def _reserve_number(self) -> int:
+        # Número del próximo segmento, reservado creando con O_EXCL un archivo con ese número: dos
+        # escritores (hilos o procesos) nunca reservan el mismo, y ante un choque se prueba el siguiente
+        taken = [int(name.split("_")[1]) for name in os.listdir(self.root)
+                 if name.startswith(("segment_", ".reserved_"))]
+        number = max(taken, default=-1) + 1
+        while True:
+            try:
+                os.close(os.open(self._reservation_path(number), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return number
+            except FileExistsError:
+                number += 1
+
+    def _reservation_path(self, number: int) -> str:
+        return os.path.join(self.root, f".reserved_{number:08d}")
+
+    def _release_number(self, number: int):
+        try:
+            os.remove(self._reservation_path(number))
+        except FileNotFoundError:
+            pass
+
+    def _version(self, user_id: int) -> Tuple[int, int, int]:
+        # Debe llamarse con el lock tomado y después de _refresh
+        generation = max((int(seg.name.split("_")[1]) for seg in self._segments), default=-1)
+        return generation, len(self._segments), len(self._pending_rows.get(user_id, ()))
+
+    def version(self, user_id: int) -> Tuple[int, int, int]:
+        """
+        Versión del conjunto de sesiones de un usuario: (último segmento, cantidad de segmentos, sesiones
+        pendientes del usuario). Cambia con cada sesión nueva del usuario y con cada segmento nuevo
+        (volcado o compactación, también desde otro proceso), así que sirve como clave de cache de
+        resultados derivados. La cantidad de segmentos cubre el volcado de otro proceso que reservó su
+        número antes que el último segmento pero terminó de escribirlo después.
+        """
+        with self._lock:
+            self._refresh()
+            return self._version(user_id)
+
+    def snapshot(self, user_id: int) -> Tuple[Tuple[int, int, int], SessionColumns]:
+        """
+        (versión, sesiones) de un usuario leídas juntas: la versión corresponde exactamente a las
+        sesiones devueltas, aunque otra sesión llegue en el medio.
+        """
+        with self._lock:
+            self._refresh()
+            return self._version(user_id), self._columns(self._user_parts(user_id))
+
+    def users(self) -> np.ndarray:
+        """
+        Ids de todos los usuarios con sesiones (volcadas a disco o pendientes), ordenados.
+        """
+        with self._lock:
+            self._refresh()
+            parts = [segment.users for segment in self._segments]
+            parts.append(np.asarray(list(self._pending_rows), dtype=np.int64))
+        return np.unique(np.concatenate(parts))
+
+    def get(self, user_id: int, start: Optional[Union[datetime, int]] = None,
+            end: Optional[Union[datetime, int]] = None) -> SessionColumns:
+        """
+        Sesiones de un usuario ordenadas por tiempo, opcionalmente en [start, end).
+        Si todas están en un mismo segmento, las columnas son vistas del memory-map (sin copia).
+        """
+        with self._lock:
+            self._refresh()
+            parts = self._user_parts(user_id)
+        return self._columns(parts, start, end)
+
+    def _user_parts(self, user_id: int) -> List[Dict[str, np.ndarray]]:
+        # Debe llamarse con el lock tomado: vistas de cada segmento y copia de lo pendiente
+        parts = []
+        for segment in self._segments:
+            bounds = segment.user_range(user_id)
+            if bounds is not None:
+                parts.append({name: segment.columns[name][bounds[0]:bounds[1]] for name in COLUMNS})
+
+        pending = self._pending_rows.get(user_id)
+        if pending:
+            parts.append({
+                name: np.asarray([self._buffer[name][i] for i in pending], dtype=dtype)
+                for name, dtype in COLUMNS.items()
+            })
+        return parts
+
+    @staticmethod
+    def _columns(parts: List[Dict[str, np.ndarray]], start: Optional[Union[datetime, int]] = None,
+                 end: Optional[Union[datetime, int]] = None) -> SessionColumns:
+        if not parts:
+            return SessionColumns(*(np.empty(0, dtype=COLUMNS[name]) for name in SessionColumns._fields))
+
+        if len(parts) == 1:
+            columns = parts[0]
+        else:
+            merged = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+            order = np.argsort(merged["timestamp_us"], kind="stable")
+            columns = {name: merged[name][order] for name in COLUMNS}
+
+        ts = columns["timestamp_us"]
+        lo = 0 if start is None else np.searchsorted(ts, to_timestamp_us(start), side="left")
+        hi = len(ts) if end is None else np.searchsorted(ts, to_timestamp_us(end), side="left")
+        return SessionColumns(*(columns[name][lo:hi] for name in SessionColumns._fields))
+
+    def compact(self):
+        """
+        Une todos los segmentos (y lo pendiente en memoria) en uno solo, para que cada usuario
+        vuelva a leerse sin copias. El segmento nuevo registra los que reemplaza, así otros procesos
+        que todavía tienen cargados los anteriores los descartan en su próximo refresco; los
+        anteriores se borran recién después de escribir el nuevo. Con max_segments se llama sola
+        al volcar; si no, hay que llamarla periódicamente (desde un solo proceso por directorio).
+        """
+        with self._lock:
+            self._compact()
+
+    def _compact_if_needed(self):
+        # Debe llamarse con el lock tomado, después de un volcado
+        if self.max_segments is not None and len(self._segments) > self.max_segments:
+            self._compact()
+
+    def _compact(self):
+        # Debe llamarse con el lock tomado
+        self._refresh()
+        old = list(self._segments)
+        columns = {
+            name: np.concatenate([np.asarray(s.columns[name]) for s in old] +
+                                 [np.asarray(self._buffer[name], dtype=dtype)])
+            for name, dtype in COLUMNS.items()
+        }
+        # Se incluyen los que reemplazaban los anteriores, para un proceso que se saltó una compactación
+        replaces = set().union({s.name for s in old}, *(s.replaces for s in old))
+        self._buffer = {name: [] for name in COLUMNS}
+        self._pending_rows = {}
+        self._write_segment(columns, tuple(replaces))
+        for segment in old:
+            # Otra instancia que compactó los mismos segmentos puede haberlos borrado ya
+            shutil.rmtree(segment.path, ignore_errors=True)
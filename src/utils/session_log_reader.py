@@ -0,0 +1,219 @@
+import csv
+import hashlib
+import math
+import os
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from src.utils.lazy_imports import LazyModule
+
+# pyarrow es opcional: sin él los CSV se leen con el módulo csv y Parquet no está disponible
+pa = LazyModule("pyarrow")
+pa_csv = LazyModule("pyarrow.csv")
+pa_parquet = LazyModule("pyarrow.parquet")
+
+CSV = "csv"
+PARQUET = "parquet"
+
+DEFAULT_COLUMNS = {
+    "user_id": "user_id",
+    "datetime": "datetime",
+    "latitude": "latitude",
+    "longitude": "longitude"
+}
+
+# Una sesión decodificada: usuario (entero o hash del id), timestamp en microsegundos epoch UTC y coordenadas
+RECORD = np.dtype([("user", "<i8"), ("ts", "<i8"), ("lat", "<f8"), ("lon", "<f8")])
+
+# Bytes aproximados de una fila de CSV, para estimar filas a partir del tamaño del archivo
+_CSV_ROW_BYTES = 64
+
+
+def log_format(path: str, fmt: Optional[str] = None) -> str:
+    """
+    Formato del archivo: el pedido explícitamente o el de la extensión (.parquet/.pq o CSV).
+    """
+    if fmt is not None:
+        if fmt not in (CSV, PARQUET):
+            raise ValueError(f"Unknown log format {fmt!r}")
+        return fmt
+    return PARQUET if path.lower().endswith((".parquet", ".pq")) else CSV
+
+
+def _has_pyarrow() -> bool:
+    try:
+        pa.load()
+    except ImportError:
+        return False
+    return True
+
+
+def estimate_rows(path: str, fmt: Optional[str] = None) -> int:
+    """
+    Cantidad de filas del log: exacta para Parquet (metadata) y estimada por tamaño para CSV.
+    """
+    if log_format(path, fmt) == PARQUET:
+        return pa_parquet.ParquetFile(path).metadata.num_rows
+    return max(1, os.path.getsize(path) // _CSV_ROW_BYTES)
+
+
+def user_keys(values) -> np.ndarray:
+    """
+    Usuarios como int64: los ids enteros se usan tal cual y el resto se reemplaza por un hash
+    estable (blake2b de 8 bytes), igual en todos los bloques y procesos.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(np.int64, copy=False)
+    # Se hashea cada usuario distinto del bloque una sola vez
+    unique, inverse = np.unique(values.astype(str), return_inverse=True)
+    hashed = np.array([
+        int.from_bytes(hashlib.blake2b(u.encode(), digest_size=8).digest(), "little", signed=True)
+        for u in unique.tolist()
+    ], dtype=np.int64)
+    return hashed[inverse.reshape(-1)]
+
+
+def _parse_timestamp(value: str) -> float:
+    value = value.strip()
+    try:
+        return float(value) * 1e6
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return math.nan
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp() * 1e6
+
+
+def timestamp_micros(values) -> np.ndarray:
+    """
+    Timestamps como microsegundos epoch UTC (float64, NaN si no se pueden leer). Acepta datetime64,
+    números (segundos epoch) o textos ISO 8601 con o sin zona horaria (sin zona se asume UTC).
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        micros = values.astype("datetime64[us]")
+        return np.where(np.isnat(micros), np.nan, micros.astype(np.int64).astype(np.float64))
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(np.float64) * 1e6
+    text = values.astype(str)
+    try:
+        # Camino rápido para ISO 8601 sin zona horaria
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            return timestamp_micros(text.astype("datetime64[us]"))
+    except (ValueError, TypeError, DeprecationWarning, UserWarning):
+        return np.array([_parse_timestamp(v) for v in text.tolist()], dtype=np.float64)
+
+
+def _coordinates(values) -> np.ndarray:
+    # Coordenadas como float64; los valores que no son números (p. ej. una columna de texto de pyarrow) quedan NaN
+    values = np.asarray(values)
+    try:
+        return values.astype(np.float64)
+    except (ValueError, TypeError):
+        return np.array([_float_or_nan(v) for v in values.tolist()], dtype=np.float64)
+
+
+def to_records(users, timestamps, latitudes, longitudes) -> np.ndarray:
+    """
+    Arma un bloque de RECORD a partir de columnas, descartando las filas con timestamp o coordenadas inválidas.
+    """
+    micros = timestamp_micros(timestamps)
+    lat = _coordinates(latitudes)
+    lon = _coordinates(longitudes)
+    valid = np.isfinite(micros) & np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    users = np.asarray(users)
+    if users.dtype == object:
+        valid &= np.array([u is not None for u in users.tolist()], dtype=bool)
+    records = np.empty(int(valid.sum()), dtype=RECORD)
+    records["user"] = user_keys(users[valid])
+    records["ts"] = micros[valid].astype(np.int64)
+    records["lat"] = lat[valid]
+    records["lon"] = lon[valid]
+    return records
+
+
+def _arrow_records(batch, columns: Dict[str, str]) -> np.ndarray:
+    def values(key):
+        return batch.column(batch.schema.get_field_index(columns[key])).to_numpy(zero_copy_only=False)
+
+    return to_records(values("user_id"), values("datetime"), values("latitude"), values("longitude"))
+
+
+def _read_arrow(path: str, fmt: str, chunk_size: int, columns: Dict[str, str]) -> Iterator:
+    names = list(columns.values())
+    if fmt == PARQUET:
+        yield from pa_parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=names)
+        return
+    # El lector de CSV de pyarrow corta por bytes: el bloque se dimensiona para unas chunk_size filas
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=max(1 << 20, chunk_size * _CSV_ROW_BYTES)),
+        # Una fila con otra cantidad de columnas se descarta en lugar de cortar la lectura
+        parse_options=pa_csv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+        # Un usuario vacío queda null y la fila se descarta, igual que en el lector sin pyarrow
+        convert_options=pa_csv.ConvertOptions(include_columns=names, strings_can_be_null=True,
+                                              column_types={columns["user_id"]: pa.string()})
+    )
+    yield from reader
+
+
+def _read_csv(path: str, chunk_size: int, columns: Dict[str, str]) -> Iterator[List[List[str]]]:
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        missing = [name for name in columns.values() if name not in header]
+        if missing:
+            raise ValueError(f"Missing column(s) {', '.join(missing)} in {path}")
+        index = [header.index(columns[key]) for key in ("user_id", "datetime", "latitude", "longitude")]
+        rows = []
+        for row in reader:
+            rows.append([row[i] if i < len(row) else "" for i in index])
+            if len(rows) == chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def read_session_chunks(path: str, chunk_size: int = 200_000, fmt: Optional[str] = None,
+                        columns: Optional[Dict[str, str]] = None) -> Iterator[np.ndarray]:
+    """
+    Lee un log de sesiones (CSV o Parquet) en bloques de RECORD de hasta ~chunk_size filas, sin cargar
+    el archivo completo. Las filas inválidas (sin usuario, timestamp o coordenadas) se descartan.
+    :param columns: nombres de las columnas del archivo para "user_id", "datetime", "latitude" y "longitude"
+        (por defecto, esos mismos nombres).
+    """
+    fmt = log_format(path, fmt)
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    if fmt == PARQUET or _has_pyarrow():
+        for batch in _read_arrow(path, fmt, chunk_size, columns):
+            # Un bloque de CSV puede superar chunk_size: se reparte para respetar la cota de memoria
+            for start in range(0, batch.num_rows, chunk_size):
+                yield _arrow_records(batch.slice(start, chunk_size), columns)
+        return
+
+    for rows in _read_csv(path, chunk_size, columns):
+        users, timestamps, lats, lons = zip(*rows)
+        yield to_records(
+            np.array([u if u != "" else None for u in users], dtype=object),
+            np.array([_parse_timestamp(t) / 1e6 for t in timestamps], dtype=np.float64),
+            np.array([_float_or_nan(v) for v in lats], dtype=np.float64),
+            np.array([_float_or_nan(v) for v in lons], dtype=np.float64)
+        )
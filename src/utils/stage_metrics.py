@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# Límites superiores (segundos) de los buckets: de 50 µs a 30 s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Histograma de latencias con buckets fijos. Registrar una observación es una búsqueda
+        binaria y un incremento, sin guardar las muestras.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es el bucket +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def merge(self, counts, total: float, count: int):
+        for i, c in enumerate(counts):
+            self.counts[i] += c
+        self.total += total
+        self.count += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Cuantil aproximado: límite superior del bucket donde cae (None si no hay observaciones).
+        """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c > 0:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "route", "start")
+
+    def __init__(self, metrics, stage, route):
+        self.metrics = metrics
+        self.stage = stage
+        self.route = route
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.route)
+        return False
+
+
+class StageMetrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Histogramas de latencia por etapa (y opcionalmente por ruta), agregados en el proceso.
+        Pensado para el camino caliente: un span cuesta dos perf_counter y un lock sin contención.
+        """
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, Optional[str]], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, route: Optional[str] = None) -> _Span:
+        """
+        Context manager que mide el bloque y lo registra en el histograma de la etapa:
+
+            with stage_metrics.span("cluster.dbscan_fit"):
+                ...
+        """
+        return _Span(self, stage, route)
+
+    def observe(self, stage: str, seconds: float, route: Optional[str] = None):
+        key = (stage, route)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def drain(self) -> Dict[Tuple[str, Optional[str]], Tuple[list, float, int]]:
+        """
+        Retorna el estado de todos los histogramas y los vacía. Lo usan los procesos worker para
+        devolverle al proceso principal lo que midieron durante una tarea.
+        """
+        with self._lock:
+            state = {k: (h.counts, h.total, h.count) for k, h in self._histograms.items()}
+            self._histograms = {}
+        return state
+
+    def merge(self, state: Dict[Tuple[str, Optional[str]], Tuple[list, float, int]]):
+        with self._lock:
+            for key, (counts, total, count) in state.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram(self.buckets)
+                histogram.merge(counts, total, count)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Resumen legible por etapa: cantidad, promedio y cuantiles aproximados (en segundos).
+        """
+        with self._lock:
+            items = sorted(self._histograms.items(), key=lambda kv: (kv[0][0], kv[0][1] or ""))
+            result = {}
+            for (stage, route), h in items:
+                name = stage if route is None else f"{stage} {route}"
+                result[name] = {
+                    "count": h.count,
+                    "mean_s": h.total / h.count if h.count else None,
+                    "p50_s": h.quantile(0.5),
+                    "p95_s": h.quantile(0.95),
+                    "p99_s": h.quantile(0.99)
+                }
+            return result
+
+    def render_prometheus(self, name: str = "geovelocity_stage_duration_seconds") -> str:
+        """
+        Histogramas en formato de texto de Prometheus (buckets acumulados, _sum y _count).
+        """
+        lines = [
+            f"# HELP {name} Duración de cada etapa del camino caliente en segundos.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items(), key=lambda kv: (kv[0][0], kv[0][1] or ""))
+            for (stage, route), h in items:
+                labels = f'stage="{_escape(stage)}"'
+                if route is not None:
+                    labels += f',route="{_escape(route)}"'
+                cumulative = 0
+                for bound, c in zip(_bucket_labels(self.buckets), h.counts):
+                    cumulative += c
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {h.total!r}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _bucket_labels(buckets: Iterable[float]):
+    return [repr(float(b)) for b in buckets] + ["+Inf"]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registro del proceso: las utilidades y los servicios registran sus spans acá
+stage_metrics = StageMetrics()
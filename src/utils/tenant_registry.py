@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Union
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+
+DEFAULT_TENANT = "default"
+
+DEFAULT_CONFIG = {
+    "cluster": {
+        "eps_km": 20,
+        "min_samples": 3
+    },
+    "scoring": {
+        "max_allowed_distance_km": 2.0,
+        "relative_tolerance": 0.3,
+        "weights": dict(GeoScoringEvaluator.DEFAULT_WEIGHTS),
+        "early_exit": True,
+        "lookup_cell_km": None,
+        "lookup_approximate": True
+    }
+}
+
+
+class TenantProfile(NamedTuple):
+    tenant_id: str
+    config: Dict
+    analyzer: GeoClusterAnalyzer
+    evaluator: GeoScoringEvaluator
+
+    @property
+    def eps_km(self) -> float:
+        return self.analyzer.eps_km
+
+    @property
+    def min_samples(self) -> int:
+        return self.analyzer.min_samples
+
+
+def _merge(base: Dict, override: Dict) -> Dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def build_profile(tenant_id: str, config: Dict) -> TenantProfile:
+    """
+    Valida la configuración de un tenant y construye sus instancias. Los analizadores y evaluadores
+    no guardan estado entre llamadas, así que una misma instancia se comparte entre threads.
+    """
+    cluster = config["cluster"]
+    scoring = config["scoring"]
+    if cluster["eps_km"] <= 0:
+        raise ValueError(f"{tenant_id}: cluster.eps_km must be positive")
+    if int(cluster["min_samples"]) != cluster["min_samples"] or cluster["min_samples"] < 1:
+        raise ValueError(f"{tenant_id}: cluster.min_samples must be a positive integer")
+    if scoring["max_allowed_distance_km"] <= 0 or scoring["relative_tolerance"] <= 0:
+        raise ValueError(f"{tenant_id}: scoring distances and tolerances must be positive")
+    if scoring.get("lookup_cell_km") is not None and scoring["lookup_cell_km"] <= 0:
+        raise ValueError(f"{tenant_id}: scoring.lookup_cell_km must be positive or null")
+
+    analyzer = GeoClusterAnalyzer(eps_km=cluster["eps_km"], min_samples=int(cluster["min_samples"]))
+    evaluator = GeoScoringEvaluator(
+        max_allowed_distance_km=scoring["max_allowed_distance_km"],
+        relative_tolerance=scoring["relative_tolerance"],
+        weights=scoring["weights"],
+        early_exit=bool(scoring.get("early_exit", False)),
+        lookup_cell_km=scoring.get("lookup_cell_km"),
+        lookup_approximate=bool(scoring.get("lookup_approximate", True))
+    )
+    return TenantProfile(tenant_id, config, analyzer, evaluator)
+
+
+class TenantRegistry:
+    def __init__(self, path: Optional[str] = None, check_interval_s: float = 5.0):
+        """
+        Instancias de GeoClusterAnalyzer y GeoScoringEvaluator por tenant, creadas una vez por
+        versión de la configuración y reutilizadas en todas las requests.
+        :param path: archivo JSON con la configuración (None = solo el tenant "default" con los
+            valores por defecto). Formato:
+                {
+                    "default": {"cluster": {...}, "scoring": {...}},
+                    "tenants": {"<tenant_id>": {"cluster": {...}, "scoring": {...}}}
+                }
+            Cada tenant hereda de "default" lo que no defina, y "default" hereda de DEFAULT_CONFIG.
+        :param check_interval_s: cada cuánto se mira la fecha de modificación del archivo (desde get()).
+            Si cambió, se recarga; si la configuración nueva es inválida se siguen usando los
+            perfiles anteriores y el error queda en stats().
+        """
+        self.path = path
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, TenantProfile] = {}
+        self._mtime = None
+        self._next_check = 0.0
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.last_error = None
+        if not self.reload():
+            raise ValueError(f"Invalid tenant configuration: {self.last_error}")
+
+    def _read(self) -> Dict:
+        if self.path is None:
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def reload(self) -> bool:
+        """
+        Lee el archivo y reemplaza todos los perfiles de una vez. Retorna False si la configuración
+        es inválida (los perfiles anteriores quedan activos).
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns if self.path is not None else None
+                raw = self._read()
+                defaults = _merge(DEFAULT_CONFIG, raw.get("default", {}))
+                profiles = {DEFAULT_TENANT: build_profile(DEFAULT_TENANT, defaults)}
+                for tenant_id, override in raw.get("tenants", {}).items():
+                    profiles[tenant_id] = build_profile(tenant_id, _merge(defaults, override))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+
+            self._profiles = profiles
+            self._mtime = mtime
+            self.version = hashlib.blake2b(json.dumps(raw, sort_keys=True).encode(), digest_size=8).hexdigest()
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self.path is None or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval_s
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            # Se registra la fecha aunque la recarga falle, para no reintentar un archivo inválido en cada request
+            if not self.reload():
+                self._mtime = mtime
+
+    def get(self, tenant_id: Optional[str] = None) -> TenantProfile:
+        """
+        Perfil del tenant; los tenants sin configuración propia usan el perfil "default".
+        """
+        self._maybe_reload()
+        profiles = self._profiles
+        return profiles.get(tenant_id or DEFAULT_TENANT) or profiles[DEFAULT_TENANT]
+
+    def stats(self) -> Dict[str, Union[str, int, float, None, Dict]]:
+        profiles = self._profiles
+        return {
+            "path": self.path,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "tenants": {tenant_id: p.config for tenant_id, p in profiles.items()}
+        }
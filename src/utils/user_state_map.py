@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Union
+
+
+class UserStateMap:
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        """
+        Estado en memoria por clave (p. ej. (tenant, usuario)), acotado con LRU y TTL. El TTL cuenta
+        desde el último uso: un usuario inactivo libera su estado y, si vuelve, se reconstruye.
+        :param max_entries: cantidad máxima de estados retenidos (es un límite de entradas, no de bytes).
+        :param ttl_seconds: tiempo sin uso tras el cual se descarta un estado (None = sin TTL).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, state)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _touch(self, key: Hashable, state, now: float):
+        # Debe llamarse con el lock tomado
+        self._entries[key] = (now + self.ttl if self.ttl is not None else None, state)
+        self._entries.move_to_end(key)
+
+    def _lookup(self, key: Hashable, now: float):
+        # Debe llamarse con el lock tomado
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, state = entry
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._touch(key, state, now)
+        return state
+
+    def get(self, key: Hashable):
+        with self._lock:
+            return self._lookup(key, time.monotonic())
+
+    def get_or_create(self, key: Hashable, create: Callable[[], object]):
+        """
+        Estado de key, o el que devuelve create() si no había (create corre con el lock tomado,
+        así que debe ser barato).
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._lookup(key, now)
+            if state is None:
+                state = create()
+                self._touch(key, state, now)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return state
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry is not None else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Union[int, float, None]]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from typing import Dict, Tuple, Union
+import numpy as np
+from src.utils.geo_zone_index import PreparedZoneSet, shapely
+
+
+class ZoneLookupTable:
+    def __init__(self, zone_set: PreparedZoneSet, max_distance_km: float, cell_km: float = 0.2,
+                 approximate: bool = True):
+        """
+        Tabla precalculada celda -> zonas candidatas sobre una grilla regular en grados, para resolver
+        el score geográfico de la mayoría de los puntos con una búsqueda en lugar de distancias exactas.
+        Cada zona, expandida en max_distance_km, se rasteriza en celdas de cell_km de lado, y cada par
+        (celda, zona) se clasifica según la distancia del centro de la celda al borde del polígono:
+            - inside: la celda está completamente dentro del polígono (score geográfico 1, exacto)
+            - near: la celda está fuera del polígono y completamente dentro del rango; el score se toma
+              en el centro de la celda (solo con approximate=True)
+            - borde: el resto (la celda puede cruzar el polígono o el límite del rango)
+        Una celda con algún par de borde se marca como exacta: sus puntos se evalúan con Shapely.
+        Las distancias se miden igual que en GeoScoringEvaluator (grados planos × 111), así que el
+        error del score geográfico en celdas near es como mucho media diagonal de celda / max_distance_km.
+        :param zone_set: conjunto de zonas preparado.
+        :param max_distance_km: el max_allowed_distance_km del evaluador que va a usar la tabla.
+        :param cell_km: lado de la celda; más chico = menos error y más memoria.
+        :param approximate: False para que solo las celdas inside se resuelvan por tabla (sin error).
+        """
+        if cell_km <= 0:
+            raise ValueError("cell_km must be positive")
+        start = time.perf_counter()
+        self.max_distance_km = max_distance_km
+        self.cell_km = cell_km
+        self.approximate = approximate
+        self.cell_deg = cell_km / PreparedZoneSet.DEG_TO_KM
+        self.half_diagonal_km = cell_km * math.sqrt(2) / 2
+        self.max_geo_error = min(1.0, self.half_diagonal_km / max_distance_km) if approximate else 0.0
+
+        keys, zones, geo, exact = [], [], [], []
+        for z in range(len(zone_set)):
+            cell_keys, cell_geo, cell_exact = self._rasterize(zone_set.geometry(z), zone_set.bounds[z])
+            keys.append(cell_keys)
+            zones.append(np.full(len(cell_keys), z, dtype=np.int32))
+            geo.append(cell_geo)
+            exact.append(cell_exact)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        zones = np.concatenate(zones) if zones else np.empty(0, dtype=np.int32)
+        geo = np.concatenate(geo) if geo else np.empty(0, dtype=np.float32)
+        exact = np.concatenate(exact) if exact else np.empty(0, dtype=bool)
+
+        # Entradas agrupadas por celda y, dentro de cada celda, en el orden original de las zonas
+        order = np.lexsort((zones, keys))
+        keys, zones, geo, exact = keys[order], zones[order], geo[order], exact[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        starts = np.flatnonzero(first)
+        self.keys = keys[starts]
+        self.cell_exact = np.logical_or.reduceat(exact, starts) if len(starts) else np.empty(0, dtype=bool)
+
+        # Las celdas exactas no guardan entradas: sus puntos van directo a Shapely
+        keep = ~np.repeat(self.cell_exact, np.diff(np.append(starts, len(keys))))
+        self.entry_zone = zones[keep]
+        self.entry_geo = geo[keep]
+        counts = np.bincount(np.cumsum(first)[keep] - 1, minlength=len(self.keys))
+        self.offsets = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+        self.build_s = time.perf_counter() - start
+        self._stats_lock = threading.Lock()
+        self.table_points = 0
+        self.exact_points = 0
+        self.empty_points = 0
+
+    def _cell_index(self, values: np.ndarray) -> np.ndarray:
+        return np.floor(np.asarray(values, dtype=np.float64) / self.cell_deg).astype(np.int64)
+
+    @staticmethod
+    def _key(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+        return ix * (1 << 32) + (iy + (1 << 31))
+
+    def _rasterize(self, geom, bounds) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Se clasifica cada celda por la distancia de su centro al borde del polígono: dentro de la
+        # celda ningún punto está a más de media diagonal del centro, así que alcanza con comparar
+        # esa distancia contra la media diagonal (sin distancias polígono-rectángulo por celda)
+        margin = self.max_distance_km / PreparedZoneSet.DEG_TO_KM
+        minx, miny, maxx, maxy = bounds
+        ix, iy = np.meshgrid(np.arange(self._cell_index(minx - margin), self._cell_index(maxx + margin) + 1),
+                             np.arange(self._cell_index(miny - margin), self._cell_index(maxy + margin) + 1))
+        ix, iy = ix.ravel(), iy.ravel()
+        cx, cy = (ix + 0.5) * self.cell_deg, (iy + 0.5) * self.cell_deg
+
+        half_km = self.half_diagonal_km
+        center_inside = shapely.contains_xy(geom, cx, cy)
+        border_km = shapely.distance(shapely.boundary(geom), shapely.points(cx, cy)) * PreparedZoneSet.DEG_TO_KM
+
+        # Celdas sin ningún punto a menos de max_distance_km: no se guardan
+        candidate = center_inside | (border_km - half_km <= self.max_distance_km * (1 + 1e-9))
+        ix, iy, center_inside, border_km = ix[candidate], iy[candidate], center_inside[candidate], border_km[candidate]
+
+        inside = center_inside & (border_km >= half_km)
+        near = np.zeros(len(ix), dtype=bool)
+        if self.approximate:
+            near = ~center_inside & (border_km > half_km) & (border_km + half_km < self.max_distance_km)
+        geo = np.where(inside, 1.0, np.maximum(0.0, 1 - border_km / self.max_distance_km)).astype(np.float32)
+        return self._key(ix, iy), geo, ~(inside | near)
+
+    def lookup(self, lon: float, lat: float) -> Tuple[bool, np.ndarray, np.ndarray]:
+        """
+        Versión de resolve para un solo punto, sin arrays intermedios.
+        :return: (exact, zone_index, geo_score) de la celda del punto.
+        """
+        key = math.floor(lon / self.cell_deg) * (1 << 32) + math.floor(lat / self.cell_deg) + (1 << 31)
+        pos = int(np.searchsorted(self.keys, key))
+        if pos == len(self.keys) or self.keys[pos] != key:
+            with self._stats_lock:
+                self.empty_points += 1
+            return False, self.entry_zone[:0], self.entry_geo[:0]
+        if self.cell_exact[pos]:
+            with self._stats_lock:
+                self.exact_points += 1
+            return True, self.entry_zone[:0], self.entry_geo[:0]
+        with self._stats_lock:
+            self.table_points += 1
+        start, stop = self.offsets[pos], self.offsets[pos + 1]
+        return False, self.entry_zone[start:stop], self.entry_geo[start:stop]
+
+    def resolve(self, lons, lats) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Busca la celda de cada punto.
+        :return: (exact, point_index, zone_index, geo_score)
+            - exact: máscara de puntos en celdas de borde, que hay que evaluar con Shapely
+            - point_index, zone_index, geo_score: pares (punto, zona candidata) de los demás puntos,
+              con el score geográfico de la tabla. Los puntos sin pares no tienen zonas en rango.
+        """
+        keys = self._key(self._cell_index(lons), self._cell_index(lats))
+        pos = np.searchsorted(self.keys, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        in_table = pos < len(self.keys)
+        found[in_table] = self.keys[pos[in_table]] == keys[in_table]
+
+        exact = np.zeros(len(keys), dtype=bool)
+        exact[found] = self.cell_exact[pos[found]]
+        points = np.flatnonzero(found & ~exact)
+        starts = self.offsets[pos[points]]
+        counts = self.offsets[pos[points] + 1] - starts
+
+        point_index = np.repeat(points, counts)
+        # Índice de cada entrada: inicio de la celda + posición dentro de la celda
+        entry = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        with self._stats_lock:
+            self.table_points += len(points)
+            self.exact_points += int(exact.sum())
+            self.empty_points += int(len(keys) - found.sum())
+        return exact, point_index, self.entry_zone[entry].astype(np.int64), self.entry_geo[entry].astype(np.float64)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.keys.nbytes + self.offsets.nbytes + self.cell_exact.nbytes
+                + self.entry_zone.nbytes + self.entry_geo.nbytes)
+
+    def stats(self) -> Dict[str, Union[int, float, bool]]:
+        with self._stats_lock:
+            lookups = self.table_points + self.exact_points + self.empty_points
+            return {
+                "cell_km": self.cell_km,
+                "max_distance_km": self.max_distance_km,
+                "approximate": self.approximate,
+                "cells": len(self.keys),
+                "exact_cells": int(self.cell_exact.sum()),
+                "entries": len(self.entry_zone),
+                "bytes": self.nbytes,
+                "build_s": self.build_s,
+                # Cota del error del score geográfico; el del score total es esta cota × peso "geo"
+                "max_geo_error": self.max_geo_error,
+                "table_points": self.table_points,
+                "exact_points": self.exact_points,
+                "empty_points": self.empty_points,
+                "table_rate": (self.table_points + self.empty_points) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,168 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Dict, Hashable, Optional, Union
+import numpy as np
+from src.utils.geo_zone_index import PreparedZoneSet
+
+
+class ZoneSetCache:
+    def __init__(self, max_entries: int = 1024, max_vertices: Optional[int] = 5_000_000,
+                 max_bytes: Optional[int] = 512 * 2**20):
+        """
+        Cache LRU de PreparedZoneSet, para no reconstruir geometrías de zonas que no cambiaron.
+        :param max_entries: cantidad máxima de conjuntos de zonas en cache.
+        :param max_vertices: presupuesto total de vértices de polígonos en cache (None = sin límite).
+        :param max_bytes: presupuesto total de memoria de las estructuras derivadas de los conjuntos
+            (tablas de lookup), que crecen con el área de las zonas y no con sus vértices (None = sin límite).
+        """
+        self.max_entries = max_entries
+        self.max_vertices = max_vertices
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (vertices, signature, PreparedZoneSet)
+        self._bytes: Dict[Hashable, int] = {}  # key -> bytes de las estructuras derivadas del conjunto
+        self._lock = threading.Lock()
+        self.vertices = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.mismatches = 0
+
+    @staticmethod
+    def fingerprint(zones) -> str:
+        """
+        Hash del contenido de una lista de FrecuentsZone: ids, vértices y métricas.
+        Dos listas con el mismo contenido (y el mismo orden) comparten el fingerprint.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for z in zones:
+            h.update(repr((z.zone_id, z.metrics.velocity_mean_kmh, z.metrics.time_mean_hour,
+                           z.metrics.distance_mean_km, len(z.polygon))).encode())
+            h.update(np.asarray(z.polygon, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def columns_fingerprint(*arrays) -> str:
+        """
+        Hash de un conjunto de zonas en columnas (ids, offsets, coordenadas y métricas) sobre los bytes
+        de cada array, sin recorrer las zonas una por una.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for array in arrays:
+            h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()
+
+    def get(self, key: Hashable) -> Optional[PreparedZoneSet]:
+        """
+        Conjunto cacheado para key, o None si no está (no cuenta como miss).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_or_build(self, key: Hashable, build: Callable[[], PreparedZoneSet],
+                     signature: Optional[Hashable] = None) -> PreparedZoneSet:
+        """
+        Devuelve el conjunto de zonas cacheado para key, o lo construye con build() y lo guarda.
+        Si se pasa signature (p. ej. el fingerprint de las zonas) y la entrada cacheada se guardó con
+        otra, se reconstruye: una clave elegida por el cliente (zone_set_id) no garantiza que las zonas
+        sean las mismas.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (signature is None or entry[1] == signature):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self.mismatches += 1
+            self.misses += 1
+
+        # La construcción se hace fuera del lock; si dos requests construyen la misma clave, gana la última
+        zone_set = build()
+        vertices = sum(len(g.exterior.coords) for g in zone_set.geometries)
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (vertices, signature, zone_set)
+            self.vertices += vertices
+            self._bytes[key] = zone_set.derived_nbytes
+            self.bytes += self._bytes[key]
+            self._evict()
+        zone_set.on_derived = partial(self._derived_built, key)
+        return zone_set
+
+    def _derived_built(self, key: Hashable, zone_set: PreparedZoneSet):
+        # Un conjunto cacheado construyó una tabla: se actualiza su memoria y se respeta el presupuesto
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] is not zone_set:
+                return
+            nbytes = zone_set.derived_nbytes
+            self.bytes += nbytes - self._bytes[key]
+            self._bytes[key] = nbytes
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _remove(self, key: Hashable):
+        # Debe llamarse con el lock tomado
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.vertices -= entry[0]
+            self.bytes -= self._bytes.pop(key)
+        return entry
+
+    def _evict(self):
+        # Debe llamarse con el lock tomado; nunca desaloja la entrada recién agregada
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_vertices is not None and self.vertices > self.max_vertices)
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[PreparedZoneSet]:
+        """
+        Descarta la entrada de key (p. ej. una versión vieja de las zonas derivadas de un usuario).
+        """
+        with self._lock:
+            entry = self._remove(key)
+            return entry[2] if entry is not None else None
+
+    def items(self):
+        """
+        Copia de las entradas (clave, PreparedZoneSet), de la menos a la más usada recientemente.
+        """
+        with self._lock:
+            return [(key, zone_set) for key, (_, _, zone_set) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes.clear()
+            self.vertices = 0
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "vertices": self.vertices,
+                "max_entries": self.max_entries,
+                "max_vertices": self.max_vertices,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "mismatches": self.mismatches,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def make_sessions():
+    """
+    Sesiones sintéticas (lat, lon en grados) alrededor de algunas ciudades, con ruido y puntos repetidos.
+    """
+    centers = np.array([[-34.60, -58.38], [-31.42, -64.18], [-32.89, -68.83], [-24.78, -65.41]])
+
+    def make(n, seed=0, spread_deg=0.05, noise_fraction=0.1, duplicate_fraction=0.1):
+        rng = np.random.default_rng(seed)
+        points = centers[rng.integers(0, len(centers), n)] + rng.normal(0, spread_deg, (n, 2))
+        noise = rng.random(n) < noise_fraction
+        points[noise] = np.column_stack([rng.uniform(-40, -22, noise.sum()), rng.uniform(-70, -55, noise.sum())])
+        duplicates = np.flatnonzero(rng.random(n) < duplicate_fraction)
+        points[duplicates] = points[rng.integers(0, n, len(duplicates))]
+        return points
+
+    return make
+
+
+@pytest.fixture
+def make_zones():
+    """
+    Zonas frecuentes solapadas (envolventes convexas de puntos al azar) en un área chica, con métricas
+    a veces indefinidas, y sesiones al azar dentro y alrededor del área (lat, lon y métricas con NaN).
+    """
+    import shapely
+
+    def make(n_zones, n_sessions, seed=0, extent_deg=0.2):
+        rng = np.random.default_rng(seed)
+        zones = []
+        for zone_id in range(n_zones):
+            center = rng.uniform(0, extent_deg, 2) + [-58.5, -34.7]
+            points = center + rng.normal(0, extent_deg / 20, (int(rng.integers(3, 12)), 2))
+            metrics = {name: (None if rng.random() < 0.2 else float(rng.choice([0.0, *rng.uniform(1, 50, 3)])))
+                       for name in ("velocity_mean_kmh", "time_mean_hour", "distance_mean_km")}
+            hull = shapely.buffer(shapely.convex_hull(shapely.multipoints(points)), 0.002)
+            zones.append({"zone_id": zone_id, "geometry": hull, "metrics": metrics})
+
+        margin = extent_deg / 4
+        lons = rng.uniform(-58.5 - margin, -58.5 + extent_deg + margin, n_sessions)
+        lats = rng.uniform(-34.7 - margin, -34.7 + extent_deg + margin, n_sessions)
+        metrics = rng.uniform(0, 50, (3, n_sessions))
+        metrics[rng.random((3, n_sessions)) < 0.2] = np.nan
+        return zones, {"lat": lats, "lon": lons, "velocity_kmh": metrics[0], "time_diff_hour": metrics[1],
+                       "distance_km": metrics[2]}
+
+    return make
+
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from src.utils.binary_codec import (ARROW, JSON, MSGPACK, column, decode_tables, encode_table, ragged_coordinates,
+                                    request_format, response_format, timestamp_column)
+
+# msgpack y pyarrow son dependencias opcionales (extras msgpack y arrow)
+msgpack = pytest.importorskip("msgpack")
+pa = pytest.importorskip("pyarrow")
+
+
+def arrow_streams(*tables):
+    sink = pa.BufferOutputStream()
+    for table in tables:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_msgpack_round_trip_keeps_typed_arrays():
+    columns = {"score": np.array([0.5, 1.25]), "zone_val": np.array([3, -1]), "label": ["a", "b"]}
+    body = encode_table(columns, MSGPACK, {"status": "ok"})
+    payload = msgpack.unpackb(body, raw=False)
+    assert payload["status"] == "ok"
+
+    tables, meta = decode_tables(msgpack.packb({"sessions": payload["result"], "tenant_id": "acme"}),
+                                 MSGPACK, ("sessions",))
+    assert meta == {"tenant_id": "acme"}
+    sessions = tables["sessions"]
+    assert sessions["score"].dtype == np.float64 and sessions["score"].tolist() == [0.5, 1.25]
+    assert sessions["zone_val"].dtype == np.int64 and sessions["zone_val"].tolist() == [3, -1]
+    assert sessions["label"].tolist() == ["a", "b"]
+
+
+def test_arrow_round_trip_with_metadata_and_polygons():
+    columns = {"score": np.array([0.5, 1.25]), "zone_val": [3, None]}
+    table = pa.ipc.open_stream(encode_table(columns, ARROW, {"zone_set_id": "1:v1"})).read_all()
+    assert table.column("score").to_pylist() == [0.5, 1.25]
+    assert table.column("zone_val").to_pylist() == [3, None]
+    assert table.schema.metadata == {b"zone_set_id": b"1:v1"}
+
+    sessions = pa.table({"datetime": pa.array([0, 3_600_000_000], pa.timestamp("us", tz="UTC"))},
+                        metadata={"tenant_id": "acme"})
+    zones = pa.table({"zone_id": [1, 2], "polygon": [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]],
+                                                     [[2.0, 2.0], [3.0, 2.0], [3.0, 3.0]]]})
+    tables, meta = decode_tables(arrow_streams(sessions, zones), ARROW, ("sessions", "zones"))
+    assert meta == {"tenant_id": "acme"}
+    assert timestamp_column(tables["sessions"], "datetime").astype(np.int64).tolist() == [0, 3_600_000_000]
+    offsets, coords = ragged_coordinates(tables["zones"])
+    assert offsets.tolist() == [0, 3, 6]
+    assert coords.tolist() == [[0, 0], [1, 0], [1, 1], [2, 2], [3, 2], [3, 3]]
+
+
+@pytest.mark.parametrize("fmt, body", [
+    (MSGPACK, b"\xc1not msgpack"),
+    (MSGPACK, msgpack.packb([1, 2])),
+    (MSGPACK, msgpack.packb({"other": {}})),
+    (MSGPACK, msgpack.packb({"sessions": {"score": {"dtype": "<U4", "data": b"abcd"}}})),
+    (MSGPACK, msgpack.packb({"sessions": {"score": {"dtype": "<f8", "data": b"abc"}}})),
+    (ARROW, b"not arrow"),
+    (ARROW, arrow_streams(pa.table({"a": [1]}), pa.table({"b": [2]})))
+])
+def test_invalid_bodies_raise_value_error(fmt, body):
+    with pytest.raises(ValueError, match=f"Invalid {fmt} body"):
+        decode_tables(body, fmt, ("sessions",))
+
+
+def test_columns_are_validated():
+    table = {"lat": np.array([1.0, 2.0]), "grid": np.zeros((2, 2))}
+    assert column(table, "lat", np.float32, 2).dtype == np.float32
+    for name, n, message in [("lon", None, "Missing column"), ("lat", 3, "has 2 rows"), ("grid", None, "1-D")]:
+        with pytest.raises(ValueError, match=message):
+            column(table, name, np.float64, n)
+
+
+def test_format_negotiation_falls_back_to_the_request_format():
+    assert request_format(None) == JSON
+    assert request_format("text/plain") == JSON
+    assert request_format("application/x-msgpack; charset=binary") == MSGPACK
+
+    assert response_format(None, MSGPACK) == MSGPACK
+    assert response_format("*/*", ARROW) == ARROW
+    assert response_format("text/html, application/vnd.apache.arrow.stream;q=0.9", JSON) == ARROW
+    assert response_format("application/json, application/msgpack", MSGPACK) == JSON
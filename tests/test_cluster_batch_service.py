@@ -0,0 +1,49 @@
+import numpy as np
+from src.services.cluster_batch_service import ClusterBatchRunner
+from src.services.cluster_service import categorize_clusters
+from src.utils.cluster_categories import categorize_labels, category_counts, main_cluster
+
+EPS_KM = 20
+MIN_SAMPLES = 3
+
+
+def test_chunked_batch_matches_categorize_clusters(make_sessions):
+    groups = []
+    for user_id in range(7):
+        points = make_sessions(5 + 9 * user_id, seed=user_id, noise_fraction=0.3)
+        groups.append((user_id, {"session_id": np.arange(len(points)) + 1000 * user_id,
+                                 "latitude": points[:, 0], "longitude": points[:, 1]}))
+    # Un usuario con todas sus sesiones como ruido y otro con menos sesiones que min_samples
+    groups.append((7, [{"session_id": i, "latitude": -40 + 5 * i, "longitude": -70 + 5 * i} for i in range(3)]))
+    groups.append((8, [{"session_id": 0, "latitude": -34.6, "longitude": -58.4}]))
+
+    runner = ClusterBatchRunner(eps_km=EPS_KM, min_samples=MIN_SAMPLES, max_workers=1, chunk_size=3)
+    results = {r["user_id"]: r for r in runner.run(groups)}
+
+    assert sorted(results) == list(range(9))
+    assert results[8]["status"] == "error"
+    for user_id, sessions in groups[:-1]:
+        if isinstance(sessions, dict):
+            ids, lat, lon = sessions["session_id"], sessions["latitude"], sessions["longitude"]
+        else:
+            ids, lat, lon = ([s[k] for s in sessions] for k in ("session_id", "latitude", "longitude"))
+        expected = categorize_clusters(ids, lat, lon, EPS_KM, MIN_SAMPLES)
+        result = results[user_id]
+        assert result["status"] == "ok"
+        assert result["result"] == {
+            "session_id": [r["session_id"] for r in expected],
+            "cluster_id": [r["cluster_id"] for r in expected],
+            "cluster_category": [r["cluster_category"] for r in expected]
+        }
+    assert set(results[7]["result"]["cluster_category"]) == {"ruido"}
+    assert runner.metrics()["users"] == 9
+
+
+def test_main_cluster_ties_go_to_first_seen():
+    labels = np.array([-1, 2, 0, 2, 0, 1, -1])
+    assert main_cluster(labels) == 2
+    assert categorize_labels(labels).tolist() == ["ruido", "principal", "secundario", "principal",
+                                                  "secundario", "secundario", "ruido"]
+    assert category_counts(labels) == {"principal": 2, "secundario": 3, "ruido": 2}
+    assert main_cluster(np.array([-1, -1])) is None
+    assert category_counts(np.array([-1, -1])) == {"principal": 0, "secundario": 0, "ruido": 2}
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from src.models.schemas import ClusterSessionInput, SessionInput
+from src.services import cluster_service, history_service, zone_service
+from src.services.executors import shutdown_executors
+from src.services.tenant_service import get_tenant_profile
+from src.services.user_state_service import user_states
+from src.utils.session_history_store import SessionHistoryStore
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def history_store(tmp_path, monkeypatch):
+    store = SessionHistoryStore(str(tmp_path))
+    monkeypatch.setattr(history_service, "history_store", store)
+    cluster_service.cluster_result_cache.clear()
+    yield store
+    shutdown_executors()
+
+
+def record(user_id, session_ids):
+    for session_id in session_ids:
+        history_service.record_session(SessionInput(
+            user_id=user_id, session_id=session_id, datetime=START + timedelta(hours=session_id),
+            latitude=-34.6 + session_id * 1e-4, longitude=-58.4
+        ))
+
+
+def categorize(user_id):
+    return asyncio.run(cluster_service.categorize_clusters_cached(user_id))
+
+
+def session_ids(result):
+    return sorted(int(r["session_id"]) for r in result)
+
+
+def test_results_follow_recorded_sessions(history_store):
+    cache = cluster_service.cluster_result_cache
+    hits, misses = cache.hits, cache.misses
+    # Las sesiones todavía pendientes en memoria también se clusterizan
+    record(1, range(5))
+    assert session_ids(categorize(1)) == list(range(5))
+    assert session_ids(categorize(1)) == list(range(5))
+    assert (cache.hits - hits, cache.misses - misses) == (1, 1)
+
+    # Una sesión nueva invalida el resultado del usuario
+    record(1, [5])
+    assert session_ids(categorize(1)) == list(range(6))
+    assert cache.misses - misses == 2
+
+
+def test_segments_written_by_another_instance_change_the_result(history_store):
+    record(1, range(4))
+    history_store.flush()
+    assert session_ids(categorize(1)) == list(range(4))
+
+    # Otro proceso vuelca sesiones del usuario sin pasar por record_session (sin invalidate)
+    other = SessionHistoryStore(history_store.root)
+    for session_id in (4, 5):
+        other.append(1, session_id, START + timedelta(hours=session_id), -34.6, -58.4)
+    other.flush()
+    assert session_ids(categorize(1)) == list(range(6))
+
+    other.compact()
+    assert session_ids(categorize(1)) == list(range(6))
+
+
+def test_user_without_history_gets_simulated_sessions(history_store):
+    hits = cluster_service.cluster_result_cache.hits
+    assert session_ids(categorize(7)) == [1, 2, 3, 4]
+    categorize(7)
+    assert cluster_service.cluster_result_cache.hits - hits == 1
+
+
+def test_missing_incremental_state_is_rebuilt_from_history(history_store):
+    key = (get_tenant_profile(None).tenant_id, 3)
+    record(3, range(20))
+    # Sin estado en memoria (desalojo o reinicio): la sesión nueva cae en el cluster del historial, no en ruido
+    user_states.pop(key)
+    result = cluster_service.categorize_new_session(ClusterSessionInput(
+        user_id=3, session_id=20, latitude=-34.6 + 20e-4, longitude=-58.4))
+    assert result["cluster_category"] == "principal"
+
+    # Las zonas derivadas usan el mismo estado: el historial y la sesión nueva
+    assert user_states.get(key).clusters.n == 21
+    assert zone_service.derive_zones(3)[1] == 21
+
+
+def test_recorded_session_is_not_added_twice(history_store):
+    key = (get_tenant_profile(None).tenant_id, 4)
+    user_states.pop(key)
+    record(4, range(5))
+    new_session = SessionInput(user_id=4, session_id=5, datetime=START + timedelta(hours=5),
+                               latitude=-34.6, longitude=-58.4)
+    history_service.record_session(new_session)
+
+    result = cluster_service.categorize_recorded_session(new_session)
+    assert result["session_id"] == "5"
+    assert user_states.get(key).clusters.n == len(history_store.get(4)) == 6
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+
+
+@pytest.mark.parametrize("seed,eps_km,min_samples,chunk_pairs", [
+    (0, 5, 3, 2_000_000),
+    (1, 5, 3, 50),
+    (2, 2, 5, 1),
+    (3, 30, 4, 500),
+    (4, 0.5, 2, 100),
+])
+def test_large_mode_matches_dbscan(make_sessions, seed, eps_km, min_samples, chunk_pairs):
+    # Con muchos puntos repetidos los pesos de la deduplicación deciden qué puntos son núcleo
+    coords_rad = np.radians(make_sessions(1500, seed=seed, duplicate_fraction=0.3))
+    direct = GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples, large_input_threshold=None)
+    large = GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples, chunk_pairs=chunk_pairs)
+
+    np.testing.assert_array_equal(large.fit_labels_large(coords_rad), direct.fit_labels_radians(coords_rad))
+
+
+def test_threshold_selects_large_mode(make_sessions):
+    coords_rad = np.radians(make_sessions(300, seed=5))
+    direct = GeoClusterAnalyzer(eps_km=5, min_samples=3, large_input_threshold=None)
+    large = GeoClusterAnalyzer(eps_km=5, min_samples=3, large_input_threshold=300, chunk_pairs=64)
+
+    np.testing.assert_array_equal(large.fit_labels_radians(coords_rad), direct.fit_labels_radians(coords_rad))
+
+
+def test_only_duplicates_form_a_cluster():
+    # Un único punto repetido min_samples veces es un cluster; repetido menos veces es ruido
+    coords_rad = np.radians([[-34.6, -58.4]] * 3 + [[-31.4, -64.2]] * 2)
+    analyzer = GeoClusterAnalyzer(eps_km=1, min_samples=3)
+    assert analyzer.fit_labels_large(coords_rad).tolist() == [0, 0, 0, -1, -1]
+
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.geo_incremental_cluster import IncrementalGeoClusterState
+
+
+def batch_labels(points, eps_km, min_samples):
+    analyzer = GeoClusterAnalyzer(eps_km=eps_km, min_samples=min_samples, large_input_threshold=None)
+    return analyzer.fit_labels_radians(np.radians(points))
+
+
+@pytest.mark.parametrize("seed,eps_km,min_samples", [(0, 5, 3), (1, 2, 4), (2, 20, 3), (3, 0.5, 2)])
+def test_incremental_labels_match_batch_dbscan(make_sessions, seed, eps_km, min_samples):
+    points = make_sessions(400, seed=seed)
+    # Sin verificaciones periódicas: las etiquetas tienen que coincidir solo con la actualización incremental
+    state = IncrementalGeoClusterState(eps_km=eps_km, min_samples=min_samples, verify_every=None)
+    for i, (lat, lon) in enumerate(points.tolist()):
+        state.add_session({"session_id": i, "latitude": lat, "longitude": lon})
+        if i % 50 == 0 and i + 1 >= min_samples:
+            np.testing.assert_array_equal(state.labels(), batch_labels(points[:i + 1], eps_km, min_samples))
+
+    np.testing.assert_array_equal(state.labels(), batch_labels(points, eps_km, min_samples))
+
+
+def test_results_match_analyze_sessions(make_sessions):
+    points = make_sessions(200, seed=4)
+    sessions = [{"session_id": i, "latitude": lat, "longitude": lon} for i, (lat, lon) in enumerate(points.tolist())]
+    state = IncrementalGeoClusterState(eps_km=5, min_samples=3, verify_every=None)
+    for session in sessions:
+        state.add_session(session)
+
+    expected = GeoClusterAnalyzer(eps_km=5, min_samples=3).analyze_sessions(sessions)
+    assert state.results() == [{**r, "session_id": str(r["session_id"])} for r in expected]
+
+
+def test_reconfigure_matches_batch_with_new_parameters(make_sessions):
+    points = make_sessions(300, seed=5)
+    state = IncrementalGeoClusterState(eps_km=5, min_samples=3, verify_every=None)
+    for i, (lat, lon) in enumerate(points.tolist()):
+        state.add_session({"session_id": i, "latitude": lat, "longitude": lon})
+
+    state.reconfigure(eps_km=1, min_samples=5)
+    np.testing.assert_array_equal(state.labels(), batch_labels(points, 1, 5))
+
+
+def test_verify_reports_no_mismatches(make_sessions):
+    points = make_sessions(300, seed=6)
+    state = IncrementalGeoClusterState(eps_km=5, min_samples=3, verify_every=100)
+    for i, (lat, lon) in enumerate(points.tolist()):
+        state.add_session({"session_id": i, "latitude": lat, "longitude": lon})
+    assert state.verifications == 3
+    assert state.mismatches == 0
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+
+
+def session_dicts(sessions):
+    """
+    Columnas de sesiones como dicts para evaluate_session (NaN pasa a None).
+    """
+    keys = list(sessions)
+    return [
+        {key: (None if np.isnan(value) else float(value)) for key, value in zip(keys, row)}
+        for row in zip(*(sessions[key] for key in keys))
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [100_000, 97])
+@pytest.mark.parametrize("seed", range(4))
+def test_batch_scoring_matches_linear_scan(make_zones, seed, chunk_size):
+    zones, sessions = make_zones(40, 1500, seed=seed)
+    evaluator = GeoScoringEvaluator()
+    zone_set = evaluator.prepare_zones(zones)
+
+    result = evaluator.evaluate_sessions(sessions["lat"], sessions["lon"], sessions["velocity_kmh"],
+                                         sessions["time_diff_hour"], sessions["distance_km"], zone_set,
+                                         chunk_size=chunk_size)
+    for i, session in enumerate(session_dicts(sessions)):
+        expected = evaluator.evaluate_session(session, zones)
+        assert evaluator.evaluate_session(session, zone_set) == expected
+        assert result["score"][i] == expected["score"]
+        zone_index = int(result["zone_index"][i])
+        assert (zone_set.zone_ids[zone_index] if zone_index >= 0 else None) == expected["zone_val"]
+        assert result["zone_match"][i] == expected["zone_match"]
+
+
+@pytest.mark.parametrize("min_candidates", [0, 8])
+@pytest.mark.parametrize("seed,max_km", [(0, 2.0), (1, 0.5), (2, 10.0)])
+def test_early_exit_matches_exhaustive(make_zones, seed, max_km, min_candidates):
+    zones, sessions = make_zones(40, 500, seed=seed)
+    exhaustive = GeoScoringEvaluator(max_allowed_distance_km=max_km)
+    early = GeoScoringEvaluator(max_allowed_distance_km=max_km, early_exit=True,
+                                early_exit_min_candidates=min_candidates)
+    zone_set = early.prepare_zones(zones)
+
+    for session in session_dicts(sessions):
+        # Mismo score y misma zona (con los mismos desempates) que recorriendo la lista completa
+        assert early.evaluate_session(session, zone_set) == exhaustive.evaluate_session(session, zones)
+
+
+def test_early_exit_with_custom_weights(make_zones):
+    zones, sessions = make_zones(30, 300, seed=3)
+    weights = {"geo": 0.4, "velocity": 0.3, "time": 0.0, "distance": 0.3}
+    exhaustive = GeoScoringEvaluator(weights=weights)
+    early = GeoScoringEvaluator(weights=weights, early_exit=True, early_exit_min_candidates=0)
+    zone_set = early.prepare_zones(zones)
+
+    for session in session_dicts(sessions):
+        assert early.evaluate_session(session, zone_set) == exhaustive.evaluate_session(session, zones)
+
+
+def test_exact_lookup_matches_exhaustive(make_zones):
+    zones, sessions = make_zones(40, 2000, seed=4)
+    exhaustive = GeoScoringEvaluator()
+    lookup = GeoScoringEvaluator(lookup_cell_km=0.1, lookup_approximate=False)
+    zone_set = lookup.prepare_zones(zones)
+
+    for session in session_dicts(sessions):
+        assert lookup.evaluate_session(session, zone_set) == exhaustive.evaluate_session(session, zones)
+
+    columns = [sessions[key] for key in ("lat", "lon", "velocity_kmh", "time_diff_hour", "distance_km")]
+    expected = exhaustive.evaluate_sessions(*columns, zone_set)
+    result = lookup.evaluate_sessions(*columns, zone_set)
+    for key in ("score", "zone_index", "zone_match"):
+        np.testing.assert_array_equal(result[key], expected[key])
+    # La tabla resolvió parte de los puntos sin Shapely
+    assert lookup.lookup_table(zone_set).stats()["table_points"] > 0
+
+
+@pytest.mark.parametrize("cell_km", [0.05, 0.3])
+def test_approximate_lookup_error_is_bounded(make_zones, cell_km):
+    zones, sessions = make_zones(40, 2000, seed=5)
+    exhaustive = GeoScoringEvaluator()
+    lookup = GeoScoringEvaluator(lookup_cell_km=cell_km)
+    zone_set = lookup.prepare_zones(zones)
+    # Margen para el score geográfico guardado en float32
+    bound = lookup.w_geo * lookup.lookup_table(zone_set).max_geo_error + 1e-6
+
+    for session in session_dicts(sessions):
+        assert lookup.evaluate_session(session, zone_set)["score"] == pytest.approx(
+            exhaustive.evaluate_session(session, zones)["score"], abs=bound)
+
+    columns = [sessions[key] for key in ("lat", "lon", "velocity_kmh", "time_diff_hour", "distance_km")]
+    expected = exhaustive.evaluate_sessions(*columns, zone_set)["score"]
+    np.testing.assert_allclose(lookup.evaluate_sessions(*columns, zone_set)["score"], expected, rtol=0, atol=bound)
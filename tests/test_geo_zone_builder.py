@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.geo_metrics_utils import GeoMetricsUtils
+from src.utils.geo_zone_builder import GeoZoneBuilder, IncrementalZoneState
+
+EPS_KM, MIN_SAMPLES = 5, 3
+
+
+def history(make_sessions, n, seed):
+    points = make_sessions(n, seed=seed)
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    seconds = np.cumsum(rng.integers(60, 3 * 24 * 3600, n))
+    datetimes = [start + timedelta(seconds=int(s)) for s in seconds]
+    timestamp_us = np.array([int(d.timestamp()) * 1_000_000 for d in datetimes], dtype=np.int64)
+    return points, datetimes, timestamp_us
+
+
+def batch_zones(builder, points, timestamp_us):
+    labels = GeoClusterAnalyzer(eps_km=EPS_KM, min_samples=MIN_SAMPLES,
+                                large_input_threshold=None).fit_labels_radians(np.radians(points))
+    return builder.build_zones(timestamp_us / 1e6, points[:, 0], points[:, 1], labels)
+
+
+def assert_same_zones(actual, expected):
+    assert [z["zone_id"] for z in actual] == [z["zone_id"] for z in expected]
+    for a, e in zip(actual, expected):
+        # Los polígonos pueden diferir en el orden de los vértices: se compara la geometría
+        assert a["geometry"].symmetric_difference(e["geometry"]).area <= 1e-9 * e["geometry"].area
+        assert a["metrics"].keys() == e["metrics"].keys()
+        for name, value in e["metrics"].items():
+            if value is None:
+                assert a["metrics"][name] is None
+            else:
+                assert a["metrics"][name] == pytest.approx(value)
+
+
+@pytest.mark.parametrize("concave_ratio", [None, 0.3])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_session_by_session_matches_build_zones(make_sessions, seed, concave_ratio):
+    points, datetimes, timestamp_us = history(make_sessions, 250, seed)
+    builder = GeoZoneBuilder(buffer_km=0.5, concave_ratio=concave_ratio)
+    state = IncrementalZoneState(builder, eps_km=EPS_KM, min_samples=MIN_SAMPLES)
+
+    for i, ((lat, lon), dt) in enumerate(zip(points.tolist(), datetimes)):
+        zones = state.add_session({"session_id": i, "datetime": dt, "latitude": lat, "longitude": lon})
+        if i % 25 == 24:
+            assert_same_zones(zones, batch_zones(builder, points[:i + 1], timestamp_us[:i + 1]))
+
+    assert_same_zones(state.zones(), batch_zones(builder, points, timestamp_us))
+    # Los clusters que solo sumaron sesiones no se reconstruyen en cada llamada
+    if concave_ratio is None:
+        assert state.polygons_rebuilt < len(points)
+
+
+@pytest.mark.parametrize("blocks", [[300], [10, 200, 3, 87], [1] * 40 + [260]])
+def test_bulk_add_sessions_matches_build_zones(make_sessions, blocks):
+    points, _, timestamp_us = history(make_sessions, sum(blocks), 2)
+    builder = GeoZoneBuilder(buffer_km=0.5)
+    state = IncrementalZoneState(builder, eps_km=EPS_KM, min_samples=MIN_SAMPLES)
+
+    start = 0
+    for size in blocks:
+        end = start + size
+        state.add_sessions(np.arange(start, end), timestamp_us[start:end], points[start:end, 0], points[start:end, 1])
+        state.zones()
+        start = end
+
+    assert_same_zones(state.zones(), batch_zones(builder, points, timestamp_us))
+
+
+def test_naive_datetimes_are_utc(make_sessions):
+    points, datetimes, _ = history(make_sessions, 30, 3)
+    builder = GeoZoneBuilder()
+    aware = IncrementalZoneState(builder, eps_km=EPS_KM, min_samples=MIN_SAMPLES)
+    naive = IncrementalZoneState(builder, eps_km=EPS_KM, min_samples=MIN_SAMPLES)
+    for i, ((lat, lon), dt) in enumerate(zip(points.tolist(), datetimes)):
+        aware.add_session({"session_id": i, "datetime": dt, "latitude": lat, "longitude": lon})
+        naive.add_session({"session_id": i, "datetime": dt.replace(tzinfo=None), "latitude": lat, "longitude": lon})
+
+    assert_same_zones(naive.zones(), aware.zones())
+
+
+
+def test_sessions_without_timestamp_only_join_clusters(make_sessions):
+    points, _, timestamp_us = history(make_sessions, 120, 4)
+    builder = GeoZoneBuilder(buffer_km=0.5)
+    state = IncrementalZoneState(builder, eps_km=EPS_KM, min_samples=MIN_SAMPLES)
+    timed = np.arange(len(points)) % 3 != 0
+    for i in range(len(points)):
+        state.add_sessions([i], timestamp_us[[i]] if timed[i] else None, points[[i], 0], points[[i], 1])
+    zones = state.zones()
+
+    # Las envolventes incluyen todas las sesiones
+    expected = batch_zones(builder, points, timestamp_us)
+    assert [z["zone_id"] for z in zones] == [z["zone_id"] for z in expected]
+    for zone, e in zip(zones, expected):
+        assert zone["geometry"].symmetric_difference(e["geometry"]).area <= 1e-9 * e["geometry"].area
+
+    # Las métricas solo salen de los pares entre sesiones con fecha consecutivas
+    pairs = GeoMetricsUtils.compare_session_arrays(timestamp_us[timed] / 1e6, points[timed, 0], points[timed, 1])
+    velocity, hours, distance = (np.concatenate([[np.nan], pairs[name]])
+                                 for name in ("velocity_kmh", "time_diff_hour", "distance_km"))
+    labels = state.clusters.labels()[timed]
+    metrics = builder.zone_metrics(velocity, hours, distance, labels)
+    for zone in zones:
+        assert zone["metrics"] == pytest.approx(metrics[zone["zone_id"]])
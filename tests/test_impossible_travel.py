@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from src.utils.impossible_travel import ImpossibleTravelDetector
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+BUENOS_AIRES = (-34.60, -58.38)
+MADRID = (40.42, -3.70)
+
+
+def session(session_id, hours, place, user_id=1):
+    return {"user_id": user_id, "session_id": session_id, "datetime": START + timedelta(hours=hours),
+            "latitude": place[0], "longitude": place[1]}
+
+
+def test_sessions_older_than_the_window_are_not_compared():
+    detector = ImpossibleTravelDetector(window_hours=24, max_sessions=8)
+    detector.check(session(1, 0, MADRID))
+    detector.check(session(2, 20, BUENOS_AIRES))
+
+    # Madrid quedó a 25 h, fuera de la ventana: solo se compara con Buenos Aires
+    result = detector.check(session(3, 25, BUENOS_AIRES))
+    assert result["compared_sessions"] == 1
+    assert result["against_session_id"] == 2
+    assert not result["impossible_travel"]
+
+    # La ventana se mide hacia ambos lados: una sesión atrasada sí se compara con Madrid
+    late = detector.check(session(4, 2, BUENOS_AIRES))
+    assert late["compared_sessions"] == 3
+    assert late["against_session_id"] == 1
+    assert late["impossible_travel"]
+
+    # Sin sesiones en la ventana no hay con qué comparar
+    alone = detector.check(session(5, 100, MADRID))
+    assert alone["compared_sessions"] == 0
+    assert alone["max_velocity_kmh"] == 0.0
+    assert alone["against_session_id"] is None
+
+
+def test_ring_buffer_keeps_only_the_last_sessions():
+    # Madrid → Buenos Aires en 20 h es posible (unos 500 km/h)
+    detector = ImpossibleTravelDetector(window_hours=24, max_sessions=3)
+    detector.check(session(1, 0, MADRID))
+    for session_id in range(2, 5):
+        detector.check(session(session_id, 18 + session_id, BUENOS_AIRES))
+
+    # Madrid sigue dentro de la ventana pero la cuarta sesión la pisó en el ring buffer
+    result = detector.check(session(5, 23, BUENOS_AIRES))
+    assert result["compared_sessions"] == 3
+    assert result["against_session_id"] in (2, 3, 4)
+
+    interleaved = detector.check(session(6, 23.5, MADRID))
+    assert interleaved["compared_sessions"] == 3
+    assert interleaved["against_session_id"] == 5
+    assert interleaved["impossible_travel"]
+    assert detector.stats()["flagged"] == 1
@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from src.utils import last_session_store
+from src.utils.last_session_store import InMemoryLastSessionStore, SQLiteLastSessionStore
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Reloj controlado para los dos almacenes (monotonic en memoria, time en SQLite)
+    now = SimpleNamespace(value=1_000.0)
+    monkeypatch.setattr(last_session_store, "time", SimpleNamespace(monotonic=lambda: now.value,
+                                                                    time=lambda: now.value))
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(ttl_seconds=None, **kwargs):
+        if request.param == "memory":
+            store = InMemoryLastSessionStore(ttl_seconds=ttl_seconds, **kwargs)
+        else:
+            store = SQLiteLastSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=ttl_seconds)
+        stores.append(store)
+        return store
+
+    make.shared_file = request.param == "sqlite"
+    yield make
+    for store in stores:
+        if isinstance(store, SQLiteLastSessionStore):
+            store.close()
+
+
+def session(session_id, user_id=1):
+    return {"user_id": user_id, "session_id": session_id, "datetime": START + timedelta(hours=session_id),
+            "latitude": -34.6, "longitude": -58.4 + session_id / 100}
+
+
+def test_swap_returns_the_previous_session(make_store):
+    store = make_store()
+    assert store.swap(1, session(0)) is None
+    assert store.swap(1, session(1))["session_id"] == 0
+    assert store.get(1)["session_id"] == 1
+    assert store.get(2) is None
+    assert store.stats()["hits"] == 2
+    assert store.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(make_store, clock):
+    store = make_store(ttl_seconds=60)
+    store.swap(1, session(0))
+    clock.value += 59
+    assert store.get(1)["session_id"] == 0
+
+    # El TTL cuenta desde la última escritura
+    store.swap(1, session(1))
+    clock.value += 59
+    assert store.swap(1, session(2))["session_id"] == 1
+    clock.value += 60
+    assert store.get(1) is None
+    assert store.swap(1, session(3)) is None
+    assert store.stats()["evictions"] == 1
+
+
+def test_concurrent_swaps_see_every_session_once(make_store):
+    # Con SQLite, los threads usan conexiones distintas al mismo archivo, como procesos distintos
+    stores = [make_store() for _ in range(4 if make_store.shared_file else 1)]
+    n_threads, per_thread = 8, 50
+    returned = [[] for _ in range(n_threads)]
+
+    def worker(t):
+        store = stores[t % len(stores)]
+        for i in range(per_thread):
+            previous = store.swap(1, session(t * per_thread + i))
+            returned[t].append(previous["session_id"] if previous is not None else None)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Cada sesión es la anterior de exactamente un swap, salvo la última, que queda guardada
+    previous = [s for r in returned for s in r]
+    assert previous.count(None) == 1
+    seen = [s for s in previous if s is not None] + [stores[0].get(1)["session_id"]]
+    assert sorted(seen) == list(range(n_threads * per_thread))
+
+
+def test_in_memory_lru_eviction(clock):
+    store = InMemoryLastSessionStore(max_entries=4, ttl_seconds=None, n_shards=1)
+    for user_id in range(4):
+        store.swap(user_id, session(0, user_id))
+    # Usar el usuario 0 lo vuelve el más reciente: se desaloja el 1
+    store.get(0)
+    store.swap(4, session(0, 4))
+    assert len(store) == 4
+    assert store.get(1) is None
+    assert all(store.get(user_id) is not None for user_id in (0, 2, 3, 4))
+    assert store.stats()["evictions"] == 1
+
+
+def test_in_memory_rejects_fewer_entries_than_shards():
+    with pytest.raises(ValueError):
+        InMemoryLastSessionStore(max_entries=8, n_shards=16)
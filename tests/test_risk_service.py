@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from src.models.schemas import FrecuentsZone, SessionInput
+from src.services import history_service, risk_service, velocity_service, zone_service
+from src.services.executors import ExecutorBusy, compute_executor, shutdown_executors
+from src.services.scoring_service import zone_set_cache
+from src.services.tenant_service import get_tenant_profile
+from src.services.user_state_service import user_states, zone_builder
+from src.utils.geo_cluster_analyzer import GeoClusterAnalyzer
+from src.utils.last_session_store import InMemoryLastSessionStore
+from src.utils.session_history_store import SessionHistoryStore
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def history_store(tmp_path, monkeypatch):
+    store = SessionHistoryStore(str(tmp_path))
+    last_sessions = InMemoryLastSessionStore()
+    monkeypatch.setattr(history_service, "history_store", store)
+    monkeypatch.setattr(velocity_service, "last_session_store", last_sessions)
+    monkeypatch.setattr(risk_service, "last_session_store", last_sessions)
+    user_states.pop((get_tenant_profile(None).tenant_id, 1))
+    zone_set_cache.clear()
+    yield store
+    shutdown_executors()
+
+
+def session(session_id, user_id=1):
+    rng = np.random.default_rng(session_id)
+    return SessionInput(user_id=user_id, session_id=session_id, datetime=START + timedelta(hours=session_id),
+                        latitude=-34.6 + rng.normal(0, 0.01), longitude=-58.4 + rng.normal(0, 0.01))
+
+
+def assess(new_session, **kwargs):
+    return asyncio.run(risk_service.assess_session(new_session, **kwargs))
+
+
+def test_rejected_requests_do_not_record_the_session(history_store, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(compute_executor, "in_flight", compute_executor.max_workers + compute_executor.max_queue)
+        with pytest.raises(ExecutorBusy):
+            assess(session(0))
+
+    with pytest.raises(ValueError):
+        assess(session(0), zone_set_id="unknown")
+
+    # Un polígono inválido falla en la preparación de zonas, que corre antes de registrar la sesión
+    invalid = FrecuentsZone(zone_id=1, polygon=[[-58.4, -34.6], [-58.3, -34.6]],
+                            metrics={"velocity_mean_kmh": 1, "time_mean_hour": 1, "distance_mean_km": 1})
+    with pytest.raises(ValueError):
+        assess(session(0), zones=[invalid])
+
+    assert len(history_store.get(1)) == 0
+    # El primer login aceptado no tiene sesión anterior con la que comparar
+    assert assess(session(0))["velocity"] is None
+
+
+def test_derived_zones_keep_one_cache_entry_per_user(history_store):
+    min_samples = get_tenant_profile(None).min_samples
+    # Sin zonas hasta que el historial previo al login alcanza para un cluster
+    sources = [assess(session(session_id))["zone_source"] for session_id in range(12)]
+    assert sources == [None] * min_samples + ["derived"] * (12 - min_samples)
+    derived = [key for key, _ in zone_set_cache.items() if key[0] == "derived"]
+    assert len(derived) == 1
+
+
+def test_derived_zones_match_the_full_history(history_store):
+    for session_id in range(30):
+        assess(session(session_id))
+    incremental = zone_service.get_user_zones(1)
+
+    # Un estado desalojado se reconstruye de una vez desde el historial guardado
+    profile = get_tenant_profile(None)
+    user_states.pop((profile.tenant_id, 1))
+    rebuilt = zone_service.get_user_zones(1)
+
+    history = history_store.get(1)
+    labels = GeoClusterAnalyzer(eps_km=profile.eps_km, min_samples=profile.min_samples,
+                                large_input_threshold=None).fit_labels_radians(
+        np.radians(np.column_stack([history.latitude, history.longitude]).astype(np.float64)))
+    batch = zone_builder.to_payload(zone_builder.build_zones(
+        history.timestamp_us / 1e6, history.latitude, history.longitude, labels))
+
+    for zones in (incremental, rebuilt):
+        assert [z["zone_id"] for z in zones] == [z["zone_id"] for z in batch]
+        for z, expected in zip(zones, batch):
+            assert z["metrics"] == pytest.approx(expected["metrics"])
+
+
+def test_established_user_is_not_noise_after_eviction(history_store):
+    for session_id in range(10):
+        assess(session(session_id))
+    # Sin estado en memoria, la puesta al día lo reconstruye desde el historial antes de registrar el login
+    user_states.pop((get_tenant_profile(None).tenant_id, 1))
+    result = assess(session(10))
+    assert result["cluster"]["cluster_category"] == "principal"
+    assert "outside_clusters" not in result["reasons"]
+    assert {"zones", "cluster_sync", "velocity", "cluster", "scoring", "total"} <= set(result["timings_ms"])
+    assert user_states.get((get_tenant_profile(None).tenant_id, 1)).clusters.n == len(history_store.get(1)) == 11
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from src.utils.binary_codec import ARROW, MSGPACK
+
+# msgpack y pyarrow son dependencias opcionales (extras msgpack y arrow)
+msgpack = pytest.importorskip("msgpack")
+pa = pytest.importorskip("pyarrow")
+
+# Una zona cuadrada (vértices lon, lat) y dos sesiones: una adentro y otra lejos de cualquier zona
+ZONE = {"zone_id": 7, "polygon": [[-58.4, -34.6], [-58.3, -34.6], [-58.3, -34.5], [-58.4, -34.5]],
+        "metrics": {"velocity_mean_kmh": 30.0, "time_mean_hour": 2.0, "distance_mean_km": 10.0}}
+SESSIONS = {"from_id": [1, 2], "to_id": [2, 3], "lat_new": [-34.55, -30.0], "lon_new": [-58.35, -60.0],
+            "velocity_kmh": [30.0, 30.0], "time_diff_hour": [2.0, 2.0], "distance_km": [10.0, 10.0]}
+ZONE_COLUMNS = {"zone_id": [7], "polygon": [ZONE["polygon"]], **{k: [v] for k, v in ZONE["metrics"].items()}}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def json_body():
+    sessions = [dict(zip(SESSIONS, row)) for row in zip(*SESSIONS.values())]
+    return {"sessions": sessions, "zones": [ZONE]}
+
+
+def msgpack_body():
+    return msgpack.packb({"sessions": SESSIONS, "zones": ZONE_COLUMNS})
+
+
+def arrow_body():
+    sink = pa.BufferOutputStream()
+    for columns in (SESSIONS, ZONE_COLUMNS):
+        table = pa.table(columns)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def read_response(response):
+    fmt = response.headers["content-type"].split(";")[0]
+    if fmt == MSGPACK:
+        result = msgpack.unpackb(response.content, raw=False)["result"]
+        return {k: (np.frombuffer(v["data"], v["dtype"]).tolist() if isinstance(v, dict) else v)
+                for k, v in result.items()}
+    if fmt == ARROW:
+        return pa.ipc.open_stream(response.content).read_all().to_pydict()
+    return response.json()
+
+
+def post(client, content_type, body, accept=None):
+    headers = {"content-type": content_type}
+    if accept:
+        headers["accept"] = accept
+    if content_type == "application/json":
+        return client.post("/geo/score-batch", json=body, headers=headers)
+    return client.post("/geo/score-batch", content=body, headers=headers)
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/json", json_body()),
+    (MSGPACK, msgpack_body()),
+    (ARROW, arrow_body())
+])
+@pytest.mark.parametrize("accept, response_type", [
+    (None, None),
+    ("*/*", None),
+    ("application/json", "application/json"),
+    (MSGPACK, MSGPACK),
+    ("text/html, " + ARROW, ARROW)
+])
+def test_formats_agree_and_map_missing_zones(client, content_type, body, accept, response_type):
+    response = post(client, content_type, body, accept)
+    assert response.status_code == 200
+    # Sin Accept (o con */*) la respuesta sale en el formato de la request
+    response_type = response_type or content_type
+    assert response.headers["content-type"].startswith(response_type)
+
+    result = read_response(response)
+    assert result["from_id"] == [1, 2]
+    assert result["zone_match"] == [True, False]
+    # zone_val: None en JSON y -1 en los formatos binarios cuando la sesión no cae en ninguna zona
+    assert result["zone_val"] == [7, None if response_type == "application/json" else -1]
+
+
+@pytest.mark.parametrize("content_type, body", [
+    (MSGPACK, b"\xc1"),
+    (MSGPACK, msgpack.packb({"sessions": SESSIONS})),
+    (MSGPACK, msgpack.packb({"sessions": {**SESSIONS, "lat_new": [1.0]}, "zones": ZONE_COLUMNS})),
+    (ARROW, b"not arrow"),
+    (ARROW, arrow_body()[:40])
+])
+def test_bad_binary_bodies_return_400(client, content_type, body):
+    response = post(client, content_type, body)
+    assert response.status_code == 400
+    assert response.headers["content-type"].startswith("application/json")
@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from src.utils.session_history_store import SessionHistoryStore, to_timestamp_us
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def append(store, user_id, session_ids):
+    for session_id in session_ids:
+        store.append(user_id, session_id, START + timedelta(hours=session_id), -34.6, -58.4 + session_id / 1000)
+
+
+def test_pending_and_flushed_sessions_are_read_in_order(tmp_path):
+    store = SessionHistoryStore(str(tmp_path))
+    append(store, 1, [3, 1])
+    store.flush()
+    append(store, 1, [2, 5])
+    append(store, 2, [4])
+
+    assert store.get(1).session_id.tolist() == [1, 2, 3, 5]
+    assert store.get(1, start=START + timedelta(hours=2), end=START + timedelta(hours=5)).session_id.tolist() == [2, 3]
+    assert store.users().tolist() == [1, 2]
+
+
+def test_compaction_is_seen_by_other_instances_without_duplicates(tmp_path):
+    writer = SessionHistoryStore(str(tmp_path))
+    reader = SessionHistoryStore(str(tmp_path))
+    append(writer, 1, range(0, 5))
+    writer.flush()
+    append(writer, 1, range(5, 8))
+    writer.flush()
+    # El lector ya tiene cargados los dos segmentos que se van a compactar
+    assert len(reader.get(1)) == 8
+
+    append(writer, 1, range(8, 10))
+    writer.compact()
+    assert reader.get(1).session_id.tolist() == list(range(10))
+
+    # Otro proceso que se saltó una compactación tampoco cuenta dos veces
+    append(reader, 1, range(10, 13))
+    reader.flush()
+    writer.compact()
+    reader.compact()
+    for store in (writer, reader, SessionHistoryStore(str(tmp_path))):
+        assert store.get(1).session_id.tolist() == list(range(13))
+
+
+def test_snapshot_version_matches_the_sessions_returned(tmp_path):
+    store = SessionHistoryStore(str(tmp_path))
+    other = SessionHistoryStore(str(tmp_path))
+    append(store, 1, [0, 1])
+    version, sessions = store.snapshot(1)
+    assert version == store.version(1)
+    assert len(sessions) == 2
+
+    # Cambia con cada sesión del usuario, pendiente o volcada, y con los segmentos de otra instancia
+    versions = {version}
+    append(store, 1, [2])
+    versions.add(store.version(1))
+    store.flush()
+    versions.add(store.version(1))
+    append(other, 2, [0])
+    other.flush()
+    versions.add(store.version(1))
+    assert len(versions) == 4
+
+    # Las sesiones de otro usuario pendientes en memoria no cambian la versión
+    version = store.version(1)
+    append(store, 2, [1])
+    assert store.version(1) == version
+    assert np.array_equal(store.snapshot(1)[1].session_id, [0, 1, 2])
+
+
+def test_concurrent_writers_never_share_a_segment(tmp_path):
+    stores = [SessionHistoryStore(str(tmp_path)) for _ in range(4)]
+
+    def write(user_id):
+        for block in range(10):
+            append(stores[user_id], user_id, range(block * 3, block * 3 + 3))
+            stores[user_id].flush()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(write, range(4)))
+
+    names = [name for name in os.listdir(tmp_path) if not name.startswith(".")]
+    assert len(names) == 40
+    reader = SessionHistoryStore(str(tmp_path))
+    for user_id in range(4):
+        assert reader.get(user_id).session_id.tolist() == list(range(30))
+
+
+def test_write_retries_when_the_reserved_number_is_taken(tmp_path, monkeypatch):
+    store = SessionHistoryStore(str(tmp_path))
+    append(store, 1, [0])
+    store.flush()
+
+    # Un número reservado por otro escritor se saltea; uno ya volcado (reserva vieja) se reintenta
+    open(tmp_path / ".reserved_00000001", "w").close()
+    reserve = store._reserve_number
+    numbers = iter([0])
+    monkeypatch.setattr(store, "_reserve_number", lambda: next(numbers, None) or reserve())
+    append(store, 1, [1])
+    store.flush()
+
+    assert sorted(os.listdir(tmp_path)) == [".reserved_00000001", "segment_00000000", "segment_00000002"]
+    assert store.get(1).session_id.tolist() == [0, 1]
+
+
+def test_flush_compacts_above_max_segments(tmp_path):
+    store = SessionHistoryStore(str(tmp_path), max_segments=2)
+    segments = []
+    for session_id in range(5):
+        append(store, 1, [session_id])
+        store.flush()
+        segments.append(len(os.listdir(tmp_path)))
+    store.append_many([1], [5], [to_timestamp_us(START + timedelta(hours=5))], [-34.6], [-58.4])
+    segments.append(len(os.listdir(tmp_path)))
+
+    assert segments == [1, 2, 1, 2, 1, 2]
+    assert SessionHistoryStore(str(tmp_path)).get(1).session_id.tolist() == list(range(6))
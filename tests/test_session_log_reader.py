@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from src.utils import session_log_reader
+from src.utils.session_log_reader import read_session_chunks, user_keys
+
+ROWS = [
+    ("alice", "2024-01-01T00:00:00", "-34.60", "-58.38"),
+    ("bob", "2024-01-01T01:00:00+00:00", "-31.42", "-64.18"),
+    ("", "2024-01-01T02:00:00", "-34.60", "-58.38"),            # sin usuario
+    ("alice", "not a date", "-34.60", "-58.38"),                # timestamp inválido
+    ("bob", "2024-01-01T03:00:00", "-134.60", "-58.38"),        # latitud fuera de rango
+    ("alice", "2024-01-01T04:00:00", "abc", "-58.38"),          # coordenada no numérica
+    ("carol", "1704081600", "-32.89", "-68.83"),                # segundos epoch
+    ("alice", "2024-01-01T06:00:00Z", "-34.61", "-58.39"),
+    ("bob", "2024-01-01T07:00:00", "-31.43", "-64.19")
+]
+VALID = [0, 1, 6, 7, 8]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "sessions.csv"
+    # Dos filas más sin coordenadas: una con las celdas vacías y otra cortada
+    lines = (["user_id,datetime,latitude,longitude"] + [",".join(row) for row in ROWS]
+             + ["dave,2024-01-01T08:00:00,,", "erin,2024-01-01T09:00:00"])
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def read_all(path, chunk_size):
+    chunks = list(read_session_chunks(path, chunk_size=chunk_size))
+    return chunks, np.concatenate(chunks)
+
+
+def test_csv_fallback_drops_invalid_rows(log_path, monkeypatch):
+    monkeypatch.setattr(session_log_reader, "_has_pyarrow", lambda: False)
+    chunks, records = read_all(log_path, chunk_size=4)
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert records["user"].tolist() == user_keys([ROWS[i][0] for i in VALID]).tolist()
+    assert records["lat"].tolist() == [float(ROWS[i][2]) for i in VALID]
+    assert records["ts"].tolist() == [1704067200000000, 1704070800000000, 1704081600000000,
+                                      1704088800000000, 1704092400000000]
+
+
+def test_user_keys_are_stable_across_chunks(log_path, monkeypatch):
+    monkeypatch.setattr(session_log_reader, "_has_pyarrow", lambda: False)
+    _, one_chunk = read_all(log_path, chunk_size=100)
+    _, small_chunks = read_all(log_path, chunk_size=1)
+    assert np.array_equal(one_chunk, small_chunks)
+
+    # El hash no depende de qué otros usuarios haya en el bloque
+    alice = user_keys(["alice"])[0]
+    assert user_keys(["zed", "alice", "bob"])[1] == alice
+    assert int((one_chunk["user"] == alice).sum()) == 2
+    assert user_keys(np.array([5, 7])).tolist() == [5, 7]
+
+
+def test_csv_fallback_matches_pyarrow_reader(log_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    _, arrow = read_all(log_path, chunk_size=3)
+    monkeypatch.setattr(session_log_reader, "_has_pyarrow", lambda: False)
+    _, fallback = read_all(log_path, chunk_size=3)
+    assert np.array_equal(arrow, fallback)
@@ -0,0 +1,86 @@
+import pytest
+from src.models.schemas import FrecuentsZone, MetricsZone
+from src.services import scoring_service
+from src.utils.geo_scoring_evaluator import GeoScoringEvaluator
+from src.utils.geo_zone_index import PreparedZoneSet
+from src.utils.zone_set_cache import ZoneSetCache
+
+
+def test_lookup_tables_count_toward_byte_budget(make_zones):
+    zones, _ = make_zones(20, 0)
+    evaluator = GeoScoringEvaluator(lookup_cell_km=0.1)
+    table_bytes = evaluator.lookup_table(PreparedZoneSet(zones)).nbytes
+    cache = ZoneSetCache(max_bytes=int(table_bytes * 1.5))
+
+    first = cache.get_or_build("a", lambda: PreparedZoneSet(zones))
+    evaluator.lookup_table(first)
+    assert cache.stats()["bytes"] == table_bytes
+
+    # La segunda tabla supera el presupuesto: se desaloja el conjunto usado hace más tiempo
+    second = cache.get_or_build("b", lambda: PreparedZoneSet(zones))
+    assert cache.get("a") is first
+    evaluator.lookup_table(second)
+    stats = cache.stats()
+    assert cache.get("a") is None
+    assert cache.get("b") is second
+    assert stats["bytes"] == table_bytes
+    assert stats["evictions"] == 1
+
+
+def test_pop_and_rebuild_release_bytes(make_zones):
+    zones, _ = make_zones(10, 0)
+    evaluator = GeoScoringEvaluator(lookup_cell_km=0.1)
+    cache = ZoneSetCache()
+
+    zone_set = cache.get_or_build("a", lambda: PreparedZoneSet(zones), signature="v1")
+    evaluator.lookup_table(zone_set)
+    assert cache.stats()["bytes"] > 0
+
+    # Otra firma reemplaza el conjunto; la tabla del reemplazado ya no cuenta aunque se siga construyendo
+    rebuilt = cache.get_or_build("a", lambda: PreparedZoneSet(zones), signature="v2")
+    GeoScoringEvaluator(lookup_cell_km=0.2).lookup_table(zone_set)
+    assert cache.stats()["bytes"] == 0
+    evaluator.lookup_table(rebuilt)
+    assert cache.stats()["bytes"] == rebuilt.derived_nbytes
+
+    assert cache.pop("a") is rebuilt
+    assert cache.stats()["bytes"] == 0
+    assert cache.stats()["vertices"] == 0
+
+
+def square(zone_id, velocity, offset=0.0):
+    polygon = [[-58.4 + offset, -34.6], [-58.3, -34.6], [-58.3, -34.5], [-58.4, -34.5], [-58.4 + offset, -34.6]]
+    return FrecuentsZone(zone_id=zone_id, polygon=polygon, metrics=MetricsZone(
+        velocity_mean_kmh=velocity, time_mean_hour=2.0, distance_mean_km=10.0))
+
+
+def as_columns(zones):
+    return {
+        "zone_id": [z.zone_id for z in zones],
+        "polygon": [z.polygon for z in zones],
+        "velocity_mean_kmh": [z.metrics.velocity_mean_kmh for z in zones],
+        "time_mean_hour": [z.metrics.time_mean_hour for z in zones],
+        "distance_mean_km": [z.metrics.distance_mean_km for z in zones]
+    }
+
+
+@pytest.mark.parametrize("get_zone_set, convert", [
+    (scoring_service.get_zone_set, lambda zones: zones),
+    (scoring_service.get_zone_set_from_columns, as_columns)
+])
+def test_zone_set_id_detects_content_changes(monkeypatch, get_zone_set, convert):
+    # Misma cantidad de zonas y de vértices bajo el mismo zone_set_id: solo el contenido cambia
+    cache = ZoneSetCache()
+    monkeypatch.setattr(scoring_service, "zone_set_cache", cache)
+
+    first = get_zone_set(convert([square(1, 50.0)]), "1:v1")
+    assert get_zone_set(convert([square(1, 50.0)]), "1:v1") is first
+
+    changed_metrics = get_zone_set(convert([square(1, 80.0)]), "1:v1")
+    assert changed_metrics is not first
+    assert changed_metrics.velocity_means[0] == 80.0
+
+    changed_vertices = get_zone_set(convert([square(1, 80.0, offset=0.01)]), "1:v1")
+    assert changed_vertices is not changed_metrics
+    assert cache.stats()["mismatches"] == 2
+    assert cache.stats()["entries"] == 1